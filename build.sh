@@ -0,0 +1,20 @@
+#!/usr/bin/env bash
+# Render build command: ./build.sh
+#
+# Web service start command: gunicorn smartinvesthub.wsgi
+#   gunicorn.conf.py preloads the app and runs gthread workers. Set API_ONLY=True in the
+#   web service's environment: it leaves out the admin, static files and sessions.
+#   The admin is then served by a second web service with the same start command and
+#   API_ONLY unset.
+# Background tasks run inline unless a worker service runs `python manage.py run_tasks`
+# with TASK_WORKER=True set on both services.
+#
+# These steps run without API_ONLY: collectstatic needs the staticfiles app and
+# migrate the admin's tables.
+set -o errexit
+
+pip install -r requirements.txt
+python manage.py collectstatic --no-input
+python manage.py migrate
+# Cache tables (the replica's sticky-read marks)
+python manage.py createcachetable
@@ -1,12 +1,54 @@
 from django.contrib import admin
 from django.contrib import messages
 from django import forms
-from .models import UserProfile, Product, Wallet, Referral, UserProduct, Transaction, Recharge, Withdrawal, ExchangeReward, Deposit
+from django.db.models import Value
+from django.db.models.functions import Coalesce, NullIf
+from django.utils import timezone
+from .models import UserProfile, Product, Wallet, Referral, UserProduct, Transaction, Recharge, Withdrawal, ExchangeReward, Deposit, StatementEntry, ArchivedRecord, MonthlySummary, Task
+from .paginators import EstimatedCountPaginator
+from .reconciliation import complete_entry, entry_problem
+
+
+# Searches match prefixes (__startswith) so they can use the columns' indexes. On PostgreSQL
+# that makes them case-sensitive: a case-insensitive prefix would need an UPPER() expression
+# index per column, auth_user's included. The search box says so.
+USERNAME_SEARCH_HELP = 'Start of the username (case-sensitive)'
+
+
+class EstimatedCountAdminMixin:
+    """For tables too big to COUNT(*) on every page load.
+
+    Page counts come from EstimatedCountPaginator, and the unfiltered total
+    next to the search box ("N total") is not computed at all.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class PhoneNumberColumnMixin:
+    """Phone number column computed in the changelist query instead of per row.
+
+    The first non-empty value among `phone_number_sources` wins, so listing a
+    page costs one query rather than a transaction and profile lookup per row.
+    """
+    phone_number_sources = ('transaction__phone_number', 'user__profile__phone_number')
+
+    def get_queryset(self, request):
+        sources = [NullIf(source, Value('')) for source in self.phone_number_sources]
+        return super().get_queryset(request).annotate(display_phone_number=Coalesce(*sources))
+
+    def get_phone_number(self, obj):
+        return obj.display_phone_number or 'Not set'
+    get_phone_number.short_description = 'Phone Number'
+    get_phone_number.admin_order_field = 'display_phone_number'
+
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'phone_number')
-    search_fields = ('user__username', 'phone_number')
+    list_select_related = ('user',)
+    search_fields = ('user__username__startswith', 'phone_number__startswith')
+    search_help_text = 'Start of the username or phone number (case-sensitive)'
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -16,23 +58,34 @@ class ProductAdmin(admin.ModelAdmin):
 @admin.register(Wallet)
 class WalletAdmin(admin.ModelAdmin):
     list_display = ('user', 'balance', 'income', 'has_recharged', 'last_income_update')
-    search_fields = ('user__username',)
+    list_select_related = ('user',)
+    search_fields = ('user__username__startswith',)
+    search_help_text = USERNAME_SEARCH_HELP
 
 @admin.register(Referral)
 class ReferralAdmin(admin.ModelAdmin):
-    list_display = ('user', 'referral_code', 'referrals_count', 'vip_level')
-    search_fields = ('user__username', 'referral_code')
+    list_display = ('user', 'referral_code', 'referrals_count', 'vip_level', 'recharged_invitees', 'bonus_earned')
+    list_select_related = ('user',)
+    search_fields = ('user__username__startswith', 'referral_code__startswith')
+    search_help_text = 'Start of the username or referral code (case-sensitive)'
 
 @admin.register(UserProduct)
-class UserProductAdmin(admin.ModelAdmin):
+class UserProductAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'product', 'purchase_date', 'cycles_completed', 'active')
-    search_fields = ('user__username', 'product__name')
+    list_select_related = ('user', 'product')
+    search_fields = ('user__username__startswith', 'product__name')
+    search_help_text = 'Start of the username (case-sensitive), or any part of the product name'
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(EstimatedCountAdminMixin, PhoneNumberColumnMixin, admin.ModelAdmin):
     list_display = ('user', 'amount', 'get_phone_number', 'airtel_transaction_id', 'status', 'transaction_type', 'timestamp')
     list_filter = ('transaction_type', 'status')
-    search_fields = ('user__username', 'airtel_transaction_id', 'phone_number')
+    list_select_related = ('user',)
+    # Prefix lookups can use the indexes on these columns; a bare field name searches with LIKE '%x%'
+    search_fields = ('user__username__startswith', 'airtel_transaction_id__startswith', 'phone_number__startswith')
+    search_help_text = 'Start of the username, Airtel transaction ID or phone number (case-sensitive)'
+    date_hierarchy = 'timestamp'
+    phone_number_sources = ('phone_number', 'user__profile__phone_number')
 
     class TransactionAdminForm(forms.ModelForm):
         class Meta:
@@ -59,16 +112,6 @@ class TransactionAdmin(admin.ModelAdmin):
 
     form = TransactionAdminForm
 
-    def get_phone_number(self, obj):
-        """Return the phone number from Transaction or UserProfile if available."""
-        if obj.phone_number:
-            return obj.phone_number
-        try:
-            return obj.user.profile.phone_number or 'Not set'
-        except UserProfile.DoesNotExist:
-            return 'Not set'
-    get_phone_number.short_description = 'Phone Number'
-
     # Optional action to assist with verification (manual trigger)
     def verify_transaction(self, request, queryset):
         for transaction in queryset.filter(status='PENDING', transaction_type='RECHARGE'):
@@ -97,20 +140,13 @@ class TransactionAdmin(admin.ModelAdmin):
     actions = ['verify_transaction']  # Replace the old action with this one
 
 @admin.register(Recharge)
-class RechargeAdmin(admin.ModelAdmin):
+class RechargeAdmin(EstimatedCountAdminMixin, PhoneNumberColumnMixin, admin.ModelAdmin):
     list_display = ('user', 'amount', 'date', 'status', 'username', 'get_phone_number', 'get_airtel_transaction_id')
     list_filter = ('status',)
-    search_fields = ('user__username', 'username')
-
-    def get_phone_number(self, obj):
-        try:
-            transaction = obj.transaction
-            if transaction and transaction.phone_number:
-                return transaction.phone_number
-            return obj.user.profile.phone_number or 'Not set'
-        except (Transaction.DoesNotExist, UserProfile.DoesNotExist):
-            return 'Not set'
-    get_phone_number.short_description = 'Phone Number'
+    list_select_related = ('user', 'transaction')
+    search_fields = ('user__username__startswith', 'username__startswith')
+    search_help_text = USERNAME_SEARCH_HELP
+    date_hierarchy = 'date'
 
     def get_airtel_transaction_id(self, obj):
         try:
@@ -134,20 +170,13 @@ class RechargeAdmin(admin.ModelAdmin):
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 @admin.register(Withdrawal)
-class WithdrawalAdmin(admin.ModelAdmin):
+class WithdrawalAdmin(PhoneNumberColumnMixin, admin.ModelAdmin):
     list_display = ('user', 'amount', 'date', 'status', 'get_phone_number')
     list_filter = ('status',)
-    search_fields = ('user__username',)
-
-    def get_phone_number(self, obj):
-        try:
-            transaction = obj.transaction
-            if transaction and transaction.phone_number:
-                return transaction.phone_number
-            return obj.user.profile.phone_number or 'Not set'
-        except (Transaction.DoesNotExist, UserProfile.DoesNotExist):
-            return 'Not set'
-    get_phone_number.short_description = 'Phone Number'
+    list_select_related = ('user',)
+    search_fields = ('user__username__startswith',)
+    search_help_text = USERNAME_SEARCH_HELP
+    date_hierarchy = 'date'
 
     def save_model(self, request, obj, form, change):
         if 'status' in form.changed_data and obj.status == 'Approved' and obj.transaction:
@@ -158,22 +187,77 @@ class WithdrawalAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 @admin.register(Deposit)
-class DepositAdmin(admin.ModelAdmin):
+class DepositAdmin(PhoneNumberColumnMixin, admin.ModelAdmin):
     list_display = ('user', 'amount', 'date', 'status', 'get_phone_number')
     list_filter = ('status',)
-    search_fields = ('user__username',)
-
-    def get_phone_number(self, obj):
-        try:
-            transaction = obj.transaction
-            if transaction and transaction.phone_number:
-                return transaction.phone_number
-            return obj.user.profile.phone_number or 'Not set'
-        except (Transaction.DoesNotExist, UserProfile.DoesNotExist):
-            return 'Not set'
-    get_phone_number.short_description = 'Phone Number'
+    list_select_related = ('user',)
+    search_fields = ('user__username__startswith',)
+    search_help_text = USERNAME_SEARCH_HELP
+    date_hierarchy = 'date'
 
 @admin.register(ExchangeReward)
 class ExchangeRewardAdmin(admin.ModelAdmin):
     list_display = ('user', 'amount', 'date', 'type')
-    search_fields = ('user__username',)
\ No newline at end of file
+    list_select_related = ('user',)
+    search_fields = ('user__username__startswith',)
+    search_help_text = USERNAME_SEARCH_HELP
+    date_hierarchy = 'date'
+
+@admin.register(StatementEntry)
+class StatementEntryAdmin(admin.ModelAdmin):
+    list_display = ('receipt', 'amount', 'phone_number', 'paid_at', 'status', 'recharge')
+    list_filter = ('status',)
+    list_select_related = ('recharge',)
+    search_fields = ('receipt__startswith', 'phone_number__startswith')
+    search_help_text = 'Start of the receipt or phone number (case-sensitive)'
+    raw_id_fields = ('recharge',)
+    filter_horizontal = ('candidates',)
+
+    # Queued lines are resolved by picking the right recharge and running this action
+    def complete_assigned_recharge(self, request, queryset):
+        completed = 0
+        for entry in queryset.filter(status='Queued').select_related('recharge__transaction'):
+            problem = entry_problem(entry)
+            if problem is None and complete_entry(entry):
+                completed += 1
+            else:
+                self.message_user(
+                    request,
+                    f"Statement line {entry.receipt} {problem or 'was not completed: its recharge is no longer pending'}.",
+                    level='error'
+                )
+        if completed:
+            self.message_user(request, f"Completed {completed} recharges from statement lines.", level='info')
+    complete_assigned_recharge.short_description = "Complete the assigned recharge"
+    actions = ['complete_assigned_recharge']
+
+@admin.register(ArchivedRecord)
+class ArchivedRecordAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
+    list_display = ('kind', 'source_id', 'user', 'occurred_at', 'archived_at')
+    list_filter = ('kind', 'month')
+    list_select_related = ('user',)
+    search_fields = ('user__username__startswith',)
+    search_help_text = USERNAME_SEARCH_HELP
+    raw_id_fields = ('user',)
+
+@admin.register(MonthlySummary)
+class MonthlySummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'month', 'transaction_type', 'status', 'count', 'total_amount', 'total_fee')
+    list_filter = ('transaction_type', 'status', 'month')
+    list_select_related = ('user',)
+    search_fields = ('user__username__startswith',)
+    search_help_text = USERNAME_SEARCH_HELP
+    raw_id_fields = ('user',)
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'updated_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('last_error', 'created_at', 'updated_at')
+
+    # Dead tasks are not retried automatically; fix the cause, then requeue them here
+    def requeue(self, request, queryset):
+        updated = queryset.filter(status='Dead').update(status='Queued', attempts=0, run_at=timezone.now(), locked_by='', locked_at=None)
+        self.message_user(request, f"Requeued {updated} dead tasks.", messages.SUCCESS)
+    requeue.short_description = "Requeue selected dead tasks"
+    actions = ['requeue']
@@ -6,4 +6,5 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
+        import core.checks  # Register the deploy checks
         import core.signals  # Import the signals module
\ No newline at end of file
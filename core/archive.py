@@ -0,0 +1,189 @@
+# core/archive.py
+import gzip
+import heapq
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from operator import itemgetter
+
+from django.db.models import Sum
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .fastpath import row_mapper
+from .models import Transaction, Recharge, Withdrawal, ExchangeReward, Deposit, ArchivedRecord, MonthlySummary
+from .serializers import TransactionSerializer, RechargeSerializer, WithdrawalSerializer, ExchangeRewardSerializer, DepositSerializer
+from .sharding import atomic_for
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+# Only settled rows move; anything still pending may be completed or reconciled later.
+# REJECTED is what the admin approval view sets, although it is not one of Transaction's choices.
+FINAL_STATUSES = ('COMPLETED', 'FAILED', 'REJECTED')
+
+# kind -> (model, serializer, date field, select_related)
+CHILDREN = {
+    'recharge': (Recharge, RechargeSerializer, 'date', ('transaction', 'user__profile')),
+    'withdrawal': (Withdrawal, WithdrawalSerializer, 'date', ()),
+    'exchange_reward': (ExchangeReward, ExchangeRewardSerializer, 'date', ()),
+    'deposit': (Deposit, DepositSerializer, 'date', ()),
+}
+
+
+def month_start(value):
+    value = value.astimezone(dt_timezone.utc)
+    return date(value.year, value.month, 1)
+
+
+def months_ago(today, months):
+    """First day of the UTC month `months` before the one containing `today`."""
+    index = today.year * 12 + today.month - 1 - months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _payloads(serializer_class, rows):
+    # Rendered and parsed back, so cold rows come out exactly as the hot ones do
+    return json.loads(JSONRenderer().render(serializer_class(rows, many=True).data))
+
+
+def archivable_transactions(cutoff):
+    """Settled transactions older than `cutoff`.
+
+    A withdrawal is settled by its transaction alone: approving or rejecting it
+    from the admin dashboard leaves the Withdrawal row 'Pending' for good.
+    Recharges and deposits are settled by their own status as well.
+    """
+    return (
+        Transaction.objects.filter(timestamp__lt=cutoff, status__in=FINAL_STATUSES)
+        .exclude(recharge__status='Pending')
+        .exclude(deposit__status='Processing')
+        .order_by('id')
+    )
+
+
+def _records(kind, occurred, serializer_class, rows):
+    return [
+        ArchivedRecord(user_id=row.user_id, kind=kind, source_id=row.pk, occurred_at=getattr(row, occurred),
+                       month=month_start(getattr(row, occurred)), payload=payload)
+        for row, payload in zip(rows, _payloads(serializer_class, rows))
+    ]
+
+
+def _add_to_summaries(transactions):
+    buckets = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    for tx in transactions:
+        bucket = buckets[(tx.user_id, month_start(tx.timestamp), tx.transaction_type, tx.status)]
+        bucket[0] += 1
+        bucket[1] += tx.amount
+        bucket[2] += tx.fee or 0
+
+    existing = {}
+    for summary in MonthlySummary.objects.select_for_update().filter(
+        user_id__in={key[0] for key in buckets}, month__in={key[1] for key in buckets}
+    ):
+        existing[(summary.user_id, summary.month, summary.transaction_type, summary.status)] = summary
+
+    to_update, to_create = [], []
+    for key, (count, amount, fee) in buckets.items():
+        summary = existing.get(key)
+        if summary is None:
+            user_id, month, transaction_type, status = key
+            to_create.append(MonthlySummary(user_id=user_id, month=month, transaction_type=transaction_type, status=status,
+                                            count=count, total_amount=amount, total_fee=fee))
+        else:
+            summary.count += count
+            summary.total_amount += amount
+            summary.total_fee += fee
+            to_update.append(summary)
+    MonthlySummary.objects.bulk_update(to_update, ['count', 'total_amount', 'total_fee'])
+    MonthlySummary.objects.bulk_create(to_create)
+
+
+def archive_batch(transaction_ids, cutoff):
+    """Move one batch of transactions and their children into the cold tables. Returns the records."""
+    with atomic_for(Transaction):
+        list(Transaction.objects.select_for_update().filter(id__in=transaction_ids).values_list('id', flat=True))
+        # Re-check under the lock in case a row changed since the batch was picked
+        transactions = list(archivable_transactions(cutoff).filter(id__in=transaction_ids))
+        transaction_ids = [tx.pk for tx in transactions]
+        records = _records('transaction', 'timestamp', TransactionSerializer, transactions)
+        children = {}
+        for kind, (model, serializer_class, occurred, related) in CHILDREN.items():
+            rows = list(model.objects.filter(transaction_id__in=transaction_ids).select_related(*related).order_by('id'))
+            children[kind] = (model, [row.pk for row in rows])
+            records.extend(_records(kind, occurred, serializer_class, rows))
+
+        ArchivedRecord.objects.bulk_create(records, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        _add_to_summaries(transactions)
+
+        # Children first: Recharge/Withdrawal would otherwise be kept with a NULL transaction
+        for model, ids in children.values():
+            model.objects.filter(id__in=ids).delete()
+        Transaction.objects.filter(id__in=transaction_ids).delete()
+    return records
+
+
+def export_records(records, directory):
+    """Append records to gzip JSONL files, one per month: archive-YYYY-MM.jsonl.gz."""
+    by_month = defaultdict(list)
+    for record in records:
+        by_month[record.month].append(record)
+    for month, month_records in by_month.items():
+        path = os.path.join(directory, f'archive-{month:%Y-%m}.jsonl.gz')
+        # Appending adds a gzip member; readers decompress concatenated members transparently
+        with gzip.open(path, 'at', encoding='utf-8') as handle:
+            for record in month_records:
+                handle.write(json.dumps({
+                    'kind': record.kind,
+                    'source_id': record.source_id,
+                    'user_id': record.user_id,
+                    'occurred_at': record.occurred_at.isoformat(),
+                    'payload': record.payload,
+                }, separators=(',', ':')) + '\n')
+
+
+def archive_before(cutoff, export_dir=None, batch_size=BATCH_SIZE, dry_run=False):
+    """Archive every settled transaction older than `cutoff`. Returns (transactions, records) moved."""
+    queryset = archivable_transactions(cutoff)
+    if dry_run:
+        return queryset.count(), None
+    moved_transactions = moved_records = 0
+    last_id = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        records = archive_batch(ids, cutoff)
+        if export_dir:
+            export_records(records, export_dir)
+        moved_transactions += sum(1 for record in records if record.kind == 'transaction')
+        moved_records += len(records)
+        last_id = ids[-1]
+        logger.info("Archived %s transactions (%s records) up to id %s", len(ids), len(records), last_id)
+    return moved_transactions, moved_records
+
+
+def archived_totals(transaction_type, status, using=None):
+    """Sum of archived transaction amounts, to add to totals computed over the hot table."""
+    return MonthlySummary.objects.using(using).filter(transaction_type=transaction_type, status=status).aggregate(total=Sum('total_amount'))['total'] or 0
+
+
+class ArchivedHistoryMixin:
+    """Merge the user's archived rows of `archive_kind` into a newest-first history list.
+
+    Rows still pending at archive time stay hot, so hot and cold rows can
+    interleave; both sides are already sorted and are merged by date.
+    """
+    archive_kind = None
+    archive_date_field = 'date'
+
+    def list(self, request, *args, **kwargs):
+        # Hot rows come from values() tuples through the serializer's row mapper
+        hot = row_mapper(self.get_serializer_class()).keyed_rows(self.filter_queryset(self.get_queryset()), self.archive_date_field)
+        cold = ArchivedRecord.objects.filter(user=request.user, kind=self.archive_kind).order_by('-occurred_at', '-source_id').values_list('occurred_at', 'payload')
+        return Response([payload for _, payload in heapq.merge(hot, cold.iterator(), key=itemgetter(0), reverse=True)])
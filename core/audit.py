@@ -0,0 +1,121 @@
+# core/audit.py
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from itertools import repeat
+
+from django.db import connections
+from django.db.models import DecimalField, F, Max, Min, Sum
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce
+
+from .models import ArchivedRecord, Wallet, Transaction, UserProduct, MonthlySummary, Withdrawal
+
+CHUNK_SIZE = 10000
+
+ZERO = Decimal('0.00')
+
+# What settling a transaction does to the wallet, by (type, status): (field, sign).
+LEDGER = {
+    ('RECHARGE', 'COMPLETED'): ('balance', 1),
+    ('EXCHANGE_REWARD', 'COMPLETED'): ('balance', 1),
+    # AdminApproveTransactionView refunds a rejected withdrawal's net amount to the
+    # balance, although requesting it debited nothing
+    ('WITHDRAWAL', 'REJECTED'): ('balance', 1),
+}
+
+
+def user_ranges(database, chunk_size=CHUNK_SIZE):
+    """Split the wallets' user ids into [low, high) ranges of `chunk_size` ids."""
+    bounds = Wallet.objects.using(database).aggregate(low=Min('user_id'), high=Max('user_id'))
+    if bounds['low'] is None:
+        return []
+    return [(low, min(low + chunk_size, bounds['high'] + 1)) for low in range(bounds['low'], bounds['high'] + 1, chunk_size)]
+
+
+def expected_totals(database, low, high):
+    """Balance and income each user in [low, high) should have, from their history.
+
+    balance = completed recharges + completed rewards + withdrawals rejected from
+              the dashboard - product purchases
+    income  = daily income accrued on holdings - approved withdrawals (with fees)
+
+    This follows what the code does to wallets rather than what the statuses
+    suggest: income is debited by Withdrawal.save when the withdrawal itself is
+    Approved, so one only approved from the dashboard (transaction COMPLETED,
+    withdrawal still Pending) costs nothing. Approving one without an Airtel
+    transaction id debits nothing either; those show as drift.
+
+    Archived transactions count through their monthly summaries, archived
+    withdrawals through their payloads. Holdings bought before their price was
+    recorded are priced at the product's current price.
+    """
+    in_range = {'user_id__gte': low, 'user_id__lt': high}
+    expected = defaultdict(lambda: {'balance': ZERO, 'income': ZERO})
+    types, statuses = {key[0] for key in LEDGER}, {key[1] for key in LEDGER}
+    ledgers = (
+        Transaction.objects.using(database).filter(**in_range, status__in=statuses, transaction_type__in=types)
+        .values('user_id', 'transaction_type', 'status').order_by().annotate(total=Sum('amount')),
+        MonthlySummary.objects.using(database).filter(**in_range, status__in=statuses, transaction_type__in=types)
+        .values('user_id', 'transaction_type', 'status').order_by().annotate(total=Sum('total_amount')),
+    )
+    for rows in ledgers:
+        for row in rows:
+            if (row['transaction_type'], row['status']) in LEDGER:
+                field, sign = LEDGER[row['transaction_type'], row['status']]
+                expected[row['user_id']][field] += sign * row['total']
+
+    # Withdrawals cost the requested amount, i.e. net amount plus fee
+    withdrawals = (
+        Withdrawal.objects.using(database).filter(**in_range, status='Approved')
+        .values('user_id').order_by().annotate(total=Sum('requested_amount')),
+        ArchivedRecord.objects.using(database).filter(**in_range, kind='withdrawal', payload__status='Approved')
+        .values('user_id').order_by().annotate(total=Sum(Cast(KT('payload__requested_amount'), DecimalField(max_digits=14, decimal_places=2)))),
+    )
+    for rows in withdrawals:
+        for row in rows:
+            expected[row['user_id']]['income'] -= row['total']
+
+    holdings = (
+        UserProduct.objects.using(database).filter(**in_range).values('user_id').order_by()
+        .annotate(spent=Sum(Coalesce('price', 'product__price')), earned=Sum(F('cycles_completed') * F('product__daily_income'), output_field=DecimalField(max_digits=20, decimal_places=2)))
+    )
+    for row in holdings:
+        expected[row['user_id']]['balance'] -= row['spent']
+        expected[row['user_id']]['income'] += row['earned'] or ZERO
+    return expected
+
+
+def audit_range(database, low, high):
+    """Compare the wallets of users in [low, high) with their history.
+
+    Returns (wallets audited, drift rows); a drift row is
+    (user_id, balance, expected balance, income, expected income).
+    """
+    expected = expected_totals(database, low, high)
+    audited, drift = 0, []
+    wallets = Wallet.objects.using(database).filter(user_id__gte=low, user_id__lt=high).order_by('user_id')
+    for user_id, balance, income in wallets.values_list('user_id', 'balance', 'income').iterator():
+        audited += 1
+        totals = expected.get(user_id) or {'balance': ZERO, 'income': ZERO}
+        if balance != totals['balance'] or income != totals['income']:
+            drift.append((user_id, balance, totals['balance'], income, totals['income']))
+    return audited, drift
+
+
+def audit_wallets(database, workers=1, chunk_size=CHUNK_SIZE):
+    """Audit every wallet, yielding audit_range() results chunk by chunk in user id order.
+
+    With several workers the chunks run in forked processes, each on its own
+    database connection; the queries only read, so `database` may be a replica.
+    """
+    ranges = user_ranges(database, chunk_size)
+    if workers <= 1:
+        for low, high in ranges:
+            yield audit_range(database, low, high)
+        return
+    # Children must open their own connections instead of sharing the parent's sockets
+    connections.close_all()
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        yield from pool.map(audit_range, repeat(database), [low for low, _ in ranges], [high for _, high in ranges])
@@ -0,0 +1,127 @@
+# core/authentication.py
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .sharding import pin
+
+# Only these fields are cached; anything else (e.g. the password hash) stays deferred
+SNAPSHOT_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+
+
+class TokenLRU:
+    """Bounded, thread-safe token -> user snapshot map with per-entry expiry."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            snapshot, expires_at = entry
+            if time.monotonic() >= expires_at:
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return snapshot
+
+    def set(self, key, snapshot):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (snapshot, time.monotonic() + self.ttl)
+            self._keys_by_user.setdefault(snapshot['id'], set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def discard(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._discard(key)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._keys_by_user.get(entry[0]['id'])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_user[entry[0]['id']]
+
+
+_local = TokenLRU(settings.AUTH_TOKEN_LOCAL_CACHE_SIZE, settings.AUTH_TOKEN_LOCAL_CACHE_TTL)
+
+
+def _cache_key(key):
+    return f'auth-token:{key}'
+
+
+def _user_from_snapshot(snapshot):
+    # from_db marks the instance as loaded, so a stray save() only writes the cached fields.
+    # It expects values in the model's field order, and the alias the row was read from,
+    # which the routers use for the user's related lookups.
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in snapshot]
+    return User.from_db(snapshot.get('db', 'default'), fields, [snapshot[field] for field in fields])
+
+
+def invalidate_token(key):
+    if key:
+        _local.discard(key)
+        cache.delete(_cache_key(key))
+
+
+def invalidate_user(user_id):
+    """Drop cached snapshots for every token of the user (logout, deactivation, password change)."""
+    _local.discard_user(user_id)
+    keys = list(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+    if keys:
+        cache.delete_many([_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that serves repeat requests from a user snapshot cache.
+
+    Lookups go to the in-process LRU first, then the shared cache, and only then
+    to the authtoken/auth_user join. The local LRU has a short TTL because other
+    processes cannot invalidate it.
+    """
+
+    def authenticate_credentials(self, key):
+        snapshot = _local.get(key)
+        if snapshot is None:
+            snapshot = cache.get(_cache_key(key))
+            if snapshot is None:
+                try:
+                    token = self.get_model().objects.select_related('user').get(key=key)
+                except self.get_model().DoesNotExist:
+                    raise exceptions.AuthenticationFailed(_('Invalid token.'))
+                snapshot = {field: getattr(token.user, field) for field in SNAPSHOT_FIELDS}
+                snapshot['db'] = token.user._state.db
+                cache.set(_cache_key(key), snapshot, settings.AUTH_TOKEN_CACHE_TTL)
+            _local.set(key, snapshot)
+
+        if not snapshot['is_active']:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        user = _user_from_snapshot(snapshot)
+        # The user's wallet, history and holdings live on their shard
+        pin(user.pk)
+        token = self.get_model()(key=key, user=user)
+        return (user, token)
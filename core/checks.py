@@ -0,0 +1,24 @@
+# core/checks.py
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Backends whose add()/incr() are atomic across processes and hosts
+SHARED_CACHE_BACKENDS = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES['default']['BACKEND']
+    if backend in SHARED_CACHE_BACKENDS:
+        return []
+    return [Warning(
+        f'The default cache ({backend}) is not shared atomically between processes.',
+        hint='Throttle buckets and idempotency claims live in the default cache: with several '
+             'workers, set CACHE_BACKEND to django.core.cache.backends.redis.RedisCache or a '
+             'Memcached backend, or requests can get past the rate limits and run twice.',
+        id='core.W001',
+    )]
@@ -0,0 +1,85 @@
+# core/conditional.py
+import functools
+import weakref
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import UserProfile
+
+
+class _PendingBumps:
+    """The users whose data_version the current transaction will bump when it commits."""
+
+    def __init__(self):
+        self.user_ids = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        _bump(self.user_ids)
+
+
+def _bump(user_ids):
+    UserProfile.objects.filter(user_id__in=user_ids).update(data_version=F('data_version') + 1, data_changed_at=timezone.now())
+
+
+def bump_data_version(*user_ids, using=None):
+    """Invalidate the users' cached wallet/history responses.
+
+    Inside a transaction on `using` (the database the change was written to), each
+    user is bumped once, with one UPDATE, after it commits: a request saving a
+    wallet, a transaction and a recharge costs one write instead of three. Outside
+    one, the bump is immediate.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        _bump(user_ids)
+        return
+    # Only the on_commit queue holds the pending bumps; a rollback drops them and with
+    # them the weak reference, so the next bump starts over
+    ref = getattr(connection, '_pending_data_version_bumps', None)
+    pending = ref() if ref is not None else None
+    if pending is None or pending.done:
+        pending = _PendingBumps()
+        connection._pending_data_version_bumps = weakref.ref(pending)
+        transaction.on_commit(pending, using=using)
+    pending.user_ids.update(user_ids)
+
+
+def user_data_conditional(view_method):
+    """Answer GETs with 304 Not Modified while the user's data_version is unchanged.
+
+    The ETag and Last-Modified come from one lookup on the user's profile; a match
+    returns before the view runs its queries or serializers. Users without a
+    profile are served normally.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        version = UserProfile.objects.filter(user_id=request.user.pk).values_list('data_version', 'data_changed_at').first()
+        if version is None:
+            return view_method(self, request, *args, **kwargs)
+
+        data_version, changed_at = version
+        # The renderer is part of the tag: the browsable API and JSON differ for the same data
+        etag = f'"{request.user.pk}-{data_version}-{request.accepted_renderer.format}"'
+        last_modified = int(changed_at.timestamp())
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Per-user data: shared caches must not reuse it, and clients should revalidate
+        patch_vary_headers(response, ('Authorization',))
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return wrapper
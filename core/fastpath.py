@@ -0,0 +1,132 @@
+# core/fastpath.py
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import fields, relations, serializers
+
+
+def _identity(value, tz):
+    return value
+
+
+def _str(value, tz):
+    return None if value is None else str(value)
+
+
+def _int(value, tz):
+    return None if value is None else int(value)
+
+
+def _bool(value, tz):
+    return None if value is None else bool(value)
+
+
+def _decimal(places):
+    exponent = Decimal(1).scaleb(-places)
+
+    def convert(value, tz):
+        # Same as DecimalField with COERCE_DECIMAL_TO_STRING: fixed point, and None stays None
+        # (serializers skip the field's to_representation for None)
+        if value is None:
+            return None
+        return '{:f}'.format(value.quantize(exponent))
+    return convert
+
+
+def _datetime(value, tz):
+    if not value:
+        return None
+    if tz is not None and timezone.is_aware(value):
+        value = value.astimezone(tz)
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _converter(field):
+    if isinstance(field, fields.DateTimeField):
+        if getattr(field, 'format', fields.api_settings.DATETIME_FORMAT) != fields.ISO_8601:
+            raise ImproperlyConfigured(f'{field.field_name}: only ISO 8601 datetimes are supported')
+        return _datetime
+    if isinstance(field, fields.DecimalField):
+        if not fields.api_settings.COERCE_DECIMAL_TO_STRING or field.localize or field.normalize_output:
+            raise ImproperlyConfigured(f'{field.field_name}: only plain string decimals are supported')
+        return _decimal(field.decimal_places)
+    if isinstance(field, fields.ChoiceField):
+        return _identity  # Model choices are stored as their own keys
+    if isinstance(field, fields.CharField):
+        return _str
+    if isinstance(field, fields.IntegerField):
+        return _int
+    if isinstance(field, fields.BooleanField):
+        return _bool
+    if isinstance(field, fields.ReadOnlyField):
+        return _identity
+    raise ImproperlyConfigured(f'{field.field_name}: {type(field).__name__} has no fast-path mapper')
+
+
+class RowMapper:
+    """Builds a serializer's output from `values_list()` tuples instead of model instances.
+
+    The plan is compiled once from the serializer's fields: each output key reads
+    one column through a converter that reproduces the DRF field's representation.
+    Nested serializers become nested dicts, or None when their foreign key is NULL.
+    """
+
+    def __init__(self, serializer_class):
+        self.columns = []
+        self.plan = self._compile(serializer_class(), '')
+
+    def _column(self, name):
+        self.columns.append(name)
+        return len(self.columns) - 1
+
+    def _compile(self, serializer, prefix):
+        plan = []
+        for key, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            source = prefix + '__'.join(field.source_attrs)
+            if isinstance(field, serializers.ModelSerializer):
+                # The related primary key tells a missing row from a present one
+                presence = self._column(f'{source}__pk')
+                plan.append((key, presence, self._compile(field, f'{source}__')))
+            elif isinstance(field, relations.PrimaryKeyRelatedField):
+                plan.append((key, self._column(f'{source}_id'), _identity))
+            else:
+                plan.append((key, self._column(source), _converter(field)))
+        return plan
+
+    def _build(self, plan, row, tz):
+        data = {}
+        for key, index, convert in plan:
+            if isinstance(convert, list):
+                data[key] = None if row[index] is None else self._build(convert, row, tz)
+            else:
+                data[key] = convert(row[index], tz)
+        return data
+
+    def _tz(self):
+        return timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def rows(self, queryset):
+        tz = self._tz()
+        return [self._build(self.plan, row, tz) for row in queryset.values_list(*self.columns)]
+
+    def keyed_rows(self, queryset, key_column):
+        """Like rows(), but paired with the raw value of `key_column` (e.g. for merging by date)."""
+        tz = self._tz()
+        # values_list() collapses repeated names, so reuse the column when it is already selected
+        if key_column in self.columns:
+            index = self.columns.index(key_column)
+            return [(row[index], self._build(self.plan, row, tz)) for row in queryset.values_list(*self.columns)]
+        return [(row[-1], self._build(self.plan, row, tz)) for row in queryset.values_list(*self.columns, key_column)]
+
+
+@lru_cache(maxsize=None)
+def row_mapper(serializer_class):
+    return RowMapper(serializer_class)
@@ -0,0 +1,89 @@
+# core/fees.py
+from bisect import bisect_right
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import lru_cache
+
+from django.conf import settings
+
+CENT = Decimal('0.01')
+
+# Amount columns are DecimalField(max_digits=10, decimal_places=2)
+MAX_CENTS = 10 ** 10 - 1
+
+
+class InvalidAmount(ValueError):
+    pass
+
+
+def to_cents(value):
+    """Parse a KSh amount into integer cents, rounding half up to the cent.
+
+    Numbers and numeric strings are shillings alike: JSON 500 and "500" are the
+    same amount. Booleans, NaN/infinity and amounts too large to store are rejected.
+    """
+    if isinstance(value, bool):
+        raise InvalidAmount(f'Invalid amount: {value!r}')
+    try:
+        amount = Decimal(str(value).strip())
+        if not amount.is_finite():
+            raise InvalidAmount(f'Invalid amount: {value!r}')
+        # quantize() raises InvalidOperation when the result exceeds the context precision
+        cents = int(amount.quantize(CENT, rounding=ROUND_HALF_UP) * 100)
+    except (InvalidOperation, TypeError, ValueError):
+        raise InvalidAmount(f'Invalid amount: {value!r}')
+    if abs(cents) > MAX_CENTS:
+        raise InvalidAmount(f'Amount out of range: {value!r}')
+    return cents
+
+
+def from_cents(cents):
+    return (Decimal(cents) / 100).quantize(CENT)
+
+
+class FeeSchedule:
+    """A tiered percentage fee schedule compiled into a sorted table of integer cents.
+
+    Each tier applies from its `from` amount (inclusive) up to the next tier's,
+    charging `percent` of the amount clamped to [`min_fee`, `max_fee`]. The fee
+    never exceeds the amount itself.
+    """
+
+    def __init__(self, tiers):
+        compiled = []
+        for tier in tiers:
+            percent = Decimal(str(tier.get('percent', '0')))
+            compiled.append((
+                to_cents(tier['from']),
+                # Basis points, so the fee is integer arithmetic: cents * bp / 10000
+                int((percent * 100).to_integral_value(rounding=ROUND_HALF_UP)),
+                to_cents(tier['min_fee']) if tier.get('min_fee') is not None else 0,
+                to_cents(tier['max_fee']) if tier.get('max_fee') is not None else None,
+            ))
+        compiled.sort()
+        self.tiers = compiled
+        self.bounds = [tier[0] for tier in compiled]
+
+    def fee_cents(self, amount_cents):
+        index = bisect_right(self.bounds, amount_cents) - 1
+        if index < 0 or amount_cents <= 0:
+            return 0
+        _, basis_points, min_fee, max_fee = self.tiers[index]
+        fee = (amount_cents * basis_points + 5000) // 10000
+        fee = max(fee, min_fee)
+        if max_fee is not None:
+            fee = min(fee, max_fee)
+        return min(fee, amount_cents)
+
+    def quote(self, amount):
+        """Return (amount, fee, net_amount) as Decimals for a requested withdrawal amount in KSh."""
+        return self.quote_cents(to_cents(amount))
+
+    def quote_cents(self, amount_cents):
+        """quote() for an amount already in integer cents."""
+        fee = self.fee_cents(amount_cents)
+        return from_cents(amount_cents), from_cents(fee), from_cents(amount_cents - fee)
+
+
+@lru_cache(maxsize=1)
+def get_fee_schedule():
+    return FeeSchedule(settings.WITHDRAWAL_FEE_TIERS)
@@ -0,0 +1,50 @@
+# core/hashing.py
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+class HashingPool:
+    """Bounded executor for CPU-bound password hashing.
+
+    At most `workers` hashes run at once and at most `queue_limit` more may wait;
+    anything beyond that is refused immediately so callers can shed load with a
+    503 instead of piling up behind the hashers. PBKDF2 releases the GIL, so
+    threads hash in parallel.
+    """
+
+    def __init__(self, workers, queue_limit):
+        self.workers = workers
+        self.capacity = workers + queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _acquire(self):
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise PoolSaturated()
+            self._pending += 1
+
+    def _release(self, *args):
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args):
+        self._acquire()
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+
+hashing_pool = HashingPool(settings.HASHING_POOL_WORKERS, settings.HASHING_POOL_QUEUE_LIMIT)
@@ -0,0 +1,148 @@
+# core/idempotency.py
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http.request import RawPostDataException
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+IN_FLIGHT = 'in_flight'
+DONE = 'done'
+
+# Requests in flight in this process, so local duplicates wait on an event instead of polling
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+_renewer = None
+
+
+def _digest(*parts):
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        hasher.update(part if isinstance(part, bytes) else str(part).encode())
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+
+def _fingerprint(request):
+    try:
+        body = request.body
+    except RawPostDataException:
+        # The body stream was already consumed by the parser; fall back to the parsed data
+        body = json.dumps(request.data, sort_keys=True, default=str)
+    return _digest(request.method, request.path, body)
+
+
+def _replay(entry):
+    response = Response(entry['data'], status=entry['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _wait_for(cache_key):
+    """Wait for the request holding `cache_key` to finish and return its stored entry."""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    with _in_flight_lock:
+        event = _in_flight.get(cache_key)
+    if event is not None:
+        event.wait(settings.IDEMPOTENCY_WAIT_SECONDS)
+    while True:
+        entry = cache.get(cache_key)
+        if entry is None or entry['state'] == DONE or time.monotonic() >= deadline:
+            return entry
+        # Held by another worker process: poll the shared cache
+        time.sleep(0.05)
+
+
+def _renew_claims():
+    """Keep this process's claims alive while their handlers run, however long they take.
+
+    A claim outlives its process by at most IDEMPOTENCY_CLAIM_SECONDS, so a crashed
+    worker doesn't hold its keys for long. Touching under the lock means a claim is
+    never renewed after its handler stored the response.
+    """
+    while True:
+        time.sleep(settings.IDEMPOTENCY_CLAIM_SECONDS / 3)
+        with _in_flight_lock:
+            for cache_key in _in_flight:
+                cache.touch(cache_key, settings.IDEMPOTENCY_CLAIM_SECONDS)
+
+
+def _start_renewer():
+    global _renewer
+    if _renewer is None:
+        _renewer = threading.Thread(target=_renew_claims, name='idempotency-renewer', daemon=True)
+        _renewer.start()
+
+
+def idempotent(view_method):
+    """Make a POST handler safe to retry with an `Idempotency-Key` header.
+
+    The first request with a key runs normally and its response is stored with the
+    request fingerprint. Retries with the same key and body get the stored response
+    without running the handler again; concurrent duplicates wait for the first one.
+    Requests without the header are not affected.
+
+    Claims and responses live in the default cache, which must be shared by every
+    worker (Redis or Memcached, see core.checks) for retries that land elsewhere.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': 'Idempotency-Key must be at most 255 characters'}, status=400)
+
+        cache_key = f'idempotency:{request.user.pk}:{_digest(request.path, key)}'
+        fingerprint = _fingerprint(request)
+        claim = {'state': IN_FLIGHT, 'fingerprint': fingerprint}
+
+        event = threading.Event()
+        with _in_flight_lock:
+            claimed = cache.add(cache_key, claim, settings.IDEMPOTENCY_CLAIM_SECONDS)
+            if claimed:
+                _in_flight[cache_key] = event
+                _start_renewer()
+
+        if not claimed:
+            entry = cache.get(cache_key)
+            if entry is not None and entry['fingerprint'] != fingerprint:
+                return Response({'error': 'Idempotency-Key was already used with a different request'}, status=422)
+            if entry is not None and entry['state'] == IN_FLIGHT:
+                entry = _wait_for(cache_key)
+            if entry is None:
+                # The first request failed and released the key; this retry may run it again
+                return wrapper(self, request, *args, **kwargs)
+            if entry['state'] != DONE:
+                return Response({'error': 'A request with this Idempotency-Key is still being processed'}, status=409)
+            logger.info("Replaying idempotent response for %s on %s", request.user.username, request.path)
+            return _replay(entry)
+
+        response = None
+        try:
+            response = view_method(self, request, *args, **kwargs)
+            return response
+        finally:
+            # Stop renewing before storing, so the renewer can't cut the stored TTL short
+            with _in_flight_lock:
+                _in_flight.pop(cache_key, None)
+            if response is not None and response.status_code < 500 and hasattr(response, 'data'):
+                cache.set(cache_key, {
+                    'state': DONE,
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'data': response.data,
+                }, settings.IDEMPOTENCY_KEY_TTL)
+            else:
+                # Server errors and exceptions are not cached so the client can retry them
+                cache.delete(cache_key)
+            event.set()
+    return wrapper
@@ -0,0 +1,141 @@
+# core/log.py
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from logging.handlers import QueueHandler, QueueListener
+
+# Set per request by core.middleware.RequestIDMiddleware
+request_id = ContextVar('request_id', default=None)
+
+# Log arguments that are safe to format later on the listener thread
+PLAIN_TYPES = (str, int, float, Decimal, bool, type(None))
+
+
+class RequestIDFilter(logging.Filter):
+    """Stamp records with the current request ID while still on the request's thread."""
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+def parse_sampling(spec):
+    """'core.views=0.1,core.idempotency=0.5' -> {'core.views': 0.1, 'core.idempotency': 0.5}"""
+    rates = {}
+    for part in (spec or '').split(','):
+        name, _, rate = part.partition('=')
+        if name.strip() and rate.strip():
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of INFO/DEBUG records per logger; warnings and errors always pass.
+
+    A rate applies to its logger and all children; the longest matching name wins.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = parse_sampling(rates) if isinstance(rates, str) else dict(rates or {})
+        self._resolved = {}
+
+    def rate_for(self, name):
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            candidate = name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition('.')[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request ID and any traceback."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, dt_timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class BackgroundStreamHandler(QueueHandler):
+    """Hand records to a queue; a listener thread formats and writes them to stdout.
+
+    Unlike the stock QueueHandler, records are not formatted on the caller's
+    thread: message arguments are rendered by the listener, so a request only
+    pays for an enqueue. The listener is started lazily per process, which keeps
+    it alive across gunicorn's fork.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.stream = stream
+        self.target = None
+        self.listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        # The formatter belongs to the stream handler on the listener side
+        super().setFormatter(fmt)
+        if self.target is not None:
+            self.target.setFormatter(fmt)
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # A forked worker starts with its own queue rather than records the parent never wrote
+            self.queue = queue.SimpleQueue()
+            self.target = logging.StreamHandler(self.stream or sys.stdout)
+            self.target.setFormatter(self.formatter)
+            self.listener = QueueListener(self.queue, self.target, respect_handler_level=False)
+            self.listener.start()
+            self._pid = os.getpid()
+            atexit.register(self.listener.stop)
+
+    def prepare(self, record):
+        # Tracebacks must be captured now, while the frames still exist; the message is formatted later
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        # Objects such as model instances are rendered here, so the listener never touches the ORM
+        if isinstance(record.args, tuple):
+            record.args = tuple(arg if isinstance(arg, PLAIN_TYPES) else str(arg) for arg in record.args)
+        return record
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        super().emit(record)
@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.archive import archive_before, months_ago, BATCH_SIZE
+from core.sharding import on_shard, shard_aliases
+
+
+class Command(BaseCommand):
+    help = 'Move settled transactions older than N months, with their recharges, withdrawals, rewards and deposits, to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, required=True, help='Keep this many whole months (plus the current one) in the hot tables')
+        parser.add_argument('--export-dir', help='Also append the archived rows to gzip JSONL files per month in this directory')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many transactions would be archived')
+
+    def handle(self, *args, **options):
+        if options['months'] < 1:
+            raise CommandError('--months must be at least 1')
+        export_dir = options['export_dir']
+        if export_dir and not os.path.isdir(export_dir):
+            raise CommandError(f'Export directory does not exist: {export_dir}')
+
+        cutoff = months_ago(timezone.now(), options['months'])
+        transactions = records = 0
+        # One shard at a time: each shard archives its own users' rows
+        for alias in shard_aliases() or [None]:
+            with on_shard(alias):
+                moved_transactions, moved_records = archive_before(cutoff, export_dir, options['batch_size'], options['dry_run'])
+            transactions += moved_transactions
+            records += moved_records or 0
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'[dry run] Would archive {transactions} transactions from before {cutoff:%Y-%m-%d}'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Archived {transactions} transactions ({records} records) from before {cutoff:%Y-%m-%d}'))
@@ -0,0 +1,50 @@
+import csv
+import os
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.audit import audit_wallets, CHUNK_SIZE
+from core.routers import REPLICA_ALIAS, replica_enabled
+from core.sharding import shard_aliases
+
+
+class Command(BaseCommand):
+    help = 'Recompute every wallet\'s balance and income from its history and report the users whose wallet has drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', help='Database alias to read from (default: every shard when sharded, else the replica when configured)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Processes auditing chunks in parallel')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='User ids per chunk')
+        parser.add_argument('--output', help='Write the CSV drift report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        databases = [options['database']] if options['database'] else shard_aliases() or [REPLICA_ALIAS if replica_enabled() else 'default']
+        for database in databases:
+            if database not in connections:
+                raise CommandError(f'Unknown database: {database}')
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--workers and --chunk-size must be at least 1')
+
+        started = time.monotonic()
+        audited = drifting = 0
+        balance_drift = income_drift = 0
+        with open(options['output'], 'w', newline='') if options['output'] else nullcontext(self.stdout) as handle:
+            writer = csv.writer(handle, lineterminator='\n')
+            writer.writerow(['user_id', 'balance', 'expected_balance', 'balance_drift', 'income', 'expected_income', 'income_drift'])
+            for database in databases:
+                for chunk_audited, drift in audit_wallets(database, options['workers'], options['chunk_size']):
+                    audited += chunk_audited
+                    drifting += len(drift)
+                    for user_id, balance, expected_balance, income, expected_income in drift:
+                        balance_drift += balance - expected_balance
+                        income_drift += income - expected_income
+                        writer.writerow([user_id, balance, expected_balance, balance - expected_balance, income, expected_income, income - expected_income])
+
+        # The report may be on stdout, so the summary goes to stderr
+        self.stderr.write(self.style.SUCCESS(
+            f'Audited {audited} wallets on {", ".join(databases)} in {time.monotonic() - started:.1f}s: {drifting} drifting, '
+            f'net balance drift {balance_drift} KSh, net income drift {income_drift} KSh'
+        ))
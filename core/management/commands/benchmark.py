@@ -0,0 +1,86 @@
+import json
+import statistics
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+
+class Command(BaseCommand):
+    help = 'Time authenticated API requests through the full middleware stack'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='API paths to GET, e.g. /api/wallets/')
+        parser.add_argument('--username', required=True, help='User whose token the requests use')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--login-storm', type=int, default=0, metavar='THREADS',
+                            help='Hammer a login endpoint from this many threads while timing the paths')
+        parser.add_argument('--storm-path', default='/api/async/login/')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['username']}")
+        token, _ = Token.objects.get_or_create(user=user)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}', HTTP_HOST='localhost')
+
+        stop = threading.Event()
+        storm_results = Counter()
+        storm_threads = [
+            threading.Thread(target=self.storm, args=(options['storm_path'], index, stop, storm_results), daemon=True)
+            for index in range(options['login_storm'])
+        ]
+        for thread in storm_threads:
+            thread.start()
+
+        try:
+            self.time_paths(client, options)
+        finally:
+            stop.set()
+            for thread in storm_threads:
+                thread.join()
+        if storm_threads:
+            codes = ', '.join(f'{code}: {count}' for code, count in sorted(storm_results.items()))
+            self.stdout.write(f"login storm on {options['storm_path']} from {len(storm_threads)} threads -> {codes}")
+
+    def storm(self, path, index, stop, results):
+        # Distinct client IPs and usernames, like a distributed credential-stuffing run,
+        # so the storm is not simply throttled away
+        client = Client(HTTP_HOST='localhost')
+        attempt = 0
+        while not stop.is_set():
+            attempt += 1
+            response = client.post(
+                path,
+                json.dumps({'username': f'storm-{index}-{attempt}', 'password': 'wrong-password'}),
+                content_type='application/json',
+                HTTP_X_FORWARDED_FOR=f'10.{index % 256}.{attempt // 256 % 256}.{attempt % 256}',
+            )
+            results[response.status_code] += 1
+
+    def time_paths(self, client, options):
+        for path in options['paths']:
+            for _ in range(options['warmup']):
+                client.get(path)
+            timings = []
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(options['requests']):
+                    start = time.perf_counter()
+                    response = client.get(path)
+                    timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"{path} [{response.status_code}] n={len(timings)} "
+                f"mean={statistics.mean(timings):.2f}ms p50={timings[len(timings) // 2]:.2f}ms "
+                f"p99={timings[int(len(timings) * 0.99) - 1]:.2f}ms "
+                f"queries/request={len(queries) / len(timings):.2f} "
+                f"set-cookie={'yes' if response.cookies else 'no'}"
+            )
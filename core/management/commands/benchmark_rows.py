@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from core.fastpath import row_mapper
+from core.models import Recharge, Transaction, Withdrawal, ExchangeReward
+from core.serializers import RechargeSerializer, TransactionSerializer, WithdrawalSerializer, ExchangeRewardSerializer
+
+# name -> (queryset, serializer, select_related giving the DRF path its best case)
+SCENARIOS = {
+    'recharges': (lambda: Recharge.objects.order_by('-date'), RechargeSerializer, ('transaction', 'user__profile')),
+    'transactions': (lambda: Transaction.objects.order_by('-timestamp'), TransactionSerializer, ()),
+    'withdrawals': (lambda: Withdrawal.objects.order_by('-date'), WithdrawalSerializer, ()),
+    'rewards': (lambda: ExchangeReward.objects.order_by('-date'), ExchangeRewardSerializer, ()),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare rows per second of DRF serializers and the values() row mappers, checking the JSON is identical'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', choices=[[]] + list(SCENARIOS), help='Default: all')
+        parser.add_argument('--rows', type=int, default=1000, help='Rows per run')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        for name in options['scenarios'] or SCENARIOS:
+            make_queryset, serializer_class, related = SCENARIOS[name]
+            queryset = make_queryset()[:options['rows']]
+
+            def drf():
+                return renderer.render(serializer_class(queryset.select_related(*related), many=True).data)
+
+            def fast():
+                return renderer.render(row_mapper(serializer_class).rows(queryset))
+
+            expected, actual = drf(), fast()
+            if expected != actual:
+                raise CommandError(f'{name}: row mapper output differs from {serializer_class.__name__}')
+            count = len(row_mapper(serializer_class).rows(queryset))
+            if not count:
+                self.stdout.write(f'{name}: no rows, skipped')
+                continue
+
+            drf_rate, fast_rate = (count / self.best_of(run, options['repeat']) for run in (drf, fast))
+            self.stdout.write(
+                f'{name}: {count} rows, {len(expected)} bytes, identical output; '
+                f'DRF {drf_rate:,.0f} rows/s, fast path {fast_rate:,.0f} rows/s ({fast_rate / drf_rate:.1f}x)'
+            )
+
+    def best_of(self, run, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
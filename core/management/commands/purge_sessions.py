@@ -0,0 +1,40 @@
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Delete sessions left behind by API logins, keeping staff (admin) sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Delete every session, including staff ones')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many sessions would be deleted')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        staff_ids = set() if options['all'] else {str(pk) for pk in User.objects.filter(is_staff=True).values_list('pk', flat=True)}
+
+        to_delete = []
+        kept = 0
+        deleted = 0
+        for session in Session.objects.only('session_key', 'session_data').iterator(chunk_size=batch_size):
+            if staff_ids and session.get_decoded().get('_auth_user_id') in staff_ids:
+                kept += 1
+                continue
+            to_delete.append(session.session_key)
+            if len(to_delete) >= batch_size:
+                deleted += self.delete(to_delete, options['dry_run'])
+                to_delete = []
+        deleted += self.delete(to_delete, options['dry_run'])
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(f'{prefix}Deleted {deleted} sessions, kept {kept} staff sessions'))
+
+    def delete(self, keys, dry_run):
+        if not keys:
+            return 0
+        if dry_run:
+            return len(keys)
+        Session.objects.filter(session_key__in=keys).delete()
+        return len(keys)
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.reconciliation import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Match an Airtel Money / M-Pesa statement (CSV export or pasted SMS text) against pending recharges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Statement file to import')
+        parser.add_argument('--format', choices=['auto', 'csv', 'sms'], default='auto')
+        parser.add_argument('--window-hours', type=int, default=72, help='How long after a recharge request a payment may arrive')
+        parser.add_argument('--dry-run', action='store_true', help='Report matches without writing anything')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8-sig') as statement:
+                text = statement.read()
+        except OSError as e:
+            raise CommandError(f"Could not read statement: {e}")
+
+        result = reconcile(
+            text,
+            fmt=options['format'],
+            window=timedelta(hours=options['window_hours']),
+            dry_run=options['dry_run'],
+        )
+        summary = result.summary()
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Matched {summary['matched']} recharges ({summary['matched_amount']} KSh), "
+            f"queued {summary['queued']} for review, skipped {summary['duplicates']} duplicates"
+        ))
+        for line, candidate_ids in result.queued:
+            candidates = ', '.join(str(pk) for pk in candidate_ids) or 'none'
+            self.stdout.write(f"  queued {line.receipt}: {line.amount} KSh from {line.phone_number or 'unknown'} (candidates: {candidates})")
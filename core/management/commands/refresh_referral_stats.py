@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.referrals import refresh_referral_stats, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed invitee stats (counts by VIP level, recharged invitees, bonus earned) of every referral'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Referrals recomputed per batch')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        started = time.monotonic()
+        checked, changed = refresh_referral_stats(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} referrals in {time.monotonic() - started:.1f}s: corrected the stats of {changed}'))
@@ -0,0 +1,30 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sharding import REFERENCE_MODELS, shard_aliases
+
+
+class Command(BaseCommand):
+    help = 'Copy users, profiles and products from the directory database to every shard, inserting or updating rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not shard_aliases():
+            raise CommandError('Sharding is off: set SHARD_DATABASE_URLS')
+        batch_size = options['batch_size']
+        for label in sorted(REFERENCE_MODELS):
+            model = apps.get_model(label)
+            fields = [field.attname for field in model._meta.concrete_fields if not field.primary_key]
+            copied = 0
+            last_pk = 0
+            while True:
+                rows = list(model._base_manager.using('default').filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+                if not rows:
+                    break
+                for alias in shard_aliases():
+                    model._base_manager.using(alias).bulk_create(rows, update_conflicts=True, unique_fields=['pk'], update_fields=fields)
+                copied += len(rows)
+                last_pk = rows[-1].pk
+            self.stdout.write(self.style.SUCCESS(f'Copied {copied} {model._meta.verbose_name_plural} to {len(shard_aliases())} shards'))
@@ -0,0 +1,47 @@
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from core.models import Task
+from core.tasks import claim, run, reclaim_stale
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks from the database (referral bonuses and other side effects); set TASK_WORKER=True on the web service when this runs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run every due task, then exit')
+        parser.add_argument('--batch-size', type=int, default=10, help='Tasks claimed per round')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--worker-id', default=f'{socket.gethostname()}:{os.getpid()}')
+        parser.add_argument('--keep-done-days', type=int, default=7, help='Delete finished tasks older than this')
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id']
+        succeeded = failed = 0
+        self.stdout.write(f'Task worker {worker_id} started')
+        try:
+            while True:
+                close_old_connections()
+                requeued, dead = reclaim_stale()
+                if requeued or dead:
+                    self.stdout.write(f'Reclaimed expired leases: {requeued} requeued, {dead} dead')
+                tasks = claim(worker_id, options['batch_size'])
+                for task_row in tasks:
+                    if run(task_row, worker_id):
+                        succeeded += 1
+                    else:
+                        failed += 1
+                if not tasks:
+                    if options['once']:
+                        break
+                    Task.objects.filter(status='Done', updated_at__lt=timezone.now() - timedelta(days=options['keep_done_days'])).delete()
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Task worker {worker_id} stopped: {succeeded} succeeded, {failed} failed'))
@@ -0,0 +1,292 @@
+import io
+import random
+import time
+from array import array
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction as db_transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.fees import get_fee_schedule
+from core.referrals import refresh_batch, STATS_FIELDS, BATCH_SIZE as REFERRAL_BATCH_SIZE
+from core.models import (
+    UserProfile, Product, Wallet, Referral, UserProduct, Transaction, Recharge, Withdrawal, ExchangeReward, maturity_date,
+)
+
+# Created when the database has no products yet
+DEFAULT_PRODUCTS = [
+    {'name': 'Bronze', 'cost': 0, 'price': 1200, 'daily_income': 70, 'return_rate': 210, 'total_income': 2100, 'cycles': 30},
+    {'name': 'Silver', 'cost': 0, 'price': 3800, 'daily_income': 250, 'return_rate': 223, 'total_income': 7750, 'cycles': 31},
+    {'name': 'Gold', 'cost': 0, 'price': 8000, 'daily_income': 530, 'return_rate': 236, 'total_income': 17490, 'cycles': 33},
+]
+
+SIGNUP_BONUS = Decimal('200.00')
+REFERRAL_BONUS = Decimal('200.00')
+RECHARGE_AMOUNTS = [Decimal(amount) for amount in (500, 1000, 1500, 2000, 3000, 5000, 10000)]
+
+Invitee = Referral.invitees.through
+
+# Columns written per table, in tuple order. Child rows end with their transaction's
+# index in the chunk, which becomes its id once the chunk's ids are reserved.
+COLUMNS = {
+    User: ('id', 'password', 'is_superuser', 'username', 'first_name', 'last_name', 'email', 'is_staff', 'is_active', 'date_joined'),
+    UserProfile: ('user_id', 'phone_number', 'data_version', 'data_changed_at'),
+    # Stats columns start at zero and are filled in by refresh_batch() once all users exist
+    Referral: ('id', 'user_id', 'referral_code', 'referrals_count', 'vip_level',
+               'vip0_invitees', 'vip1_invitees', 'vip2_invitees', 'vip3_invitees', 'recharged_invitees', 'bonus_earned'),
+    Invitee: ('referral_id', 'user_id'),
+    Wallet: ('user_id', 'balance', 'income', 'last_income_update', 'has_recharged'),
+    UserProduct: ('user_id', 'product_id', 'purchase_date', 'cycles_completed', 'active', 'matures_at', 'price'),
+    Transaction: ('id', 'user_id', 'amount', 'phone_number', 'airtel_transaction_id', 'timestamp', 'status', 'transaction_type', 'fee'),
+    ExchangeReward: ('user_id', 'amount', 'date', 'type', 'transaction_id'),
+    Recharge: ('user_id', 'amount', 'date', 'status', 'phone_number', 'username', 'transaction_id'),
+    Withdrawal: ('user_id', 'requested_amount', 'amount', 'date', 'status', 'phone_number', 'transaction_id'),
+}
+CHILDREN = (ExchangeReward, Recharge, Withdrawal)
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def insert_rows(model, rows):
+    """Write plain tuples straight to the model's table, bypassing the ORM's per-value compilation.
+
+    PostgreSQL (psycopg2) gets a COPY; other backends a single executemany.
+    """
+    if not rows:
+        return
+    fields = [model._meta.get_field(name) for name in COLUMNS[model]]
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql' and hasattr(cursor.cursor, 'copy_expert'):
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write('\t'.join(map(_copy_value, row)) + '\n')
+            buffer.seek(0)
+            cursor.cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN', buffer)
+            return
+        adapters = [
+            connection.ops.adapt_datetimefield_value if isinstance(field, models.DateTimeField)
+            else connection.ops.adapt_decimalfield_value if isinstance(field, models.DecimalField)
+            else None
+            for field in fields
+        ]
+        if any(adapters):
+            rows = [tuple(value if adapt is None else adapt(value) for adapt, value in zip(adapters, row)) for row in rows]
+        placeholders = ', '.join(['%s'] * len(fields))
+        cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', rows)
+
+
+def invite_tree(count, referred_share, rng):
+    """Inviter index (or -1) for each of `count` users, in signup order.
+
+    Each referred user picks an earlier user with probability proportional to
+    that user's invitees plus one (preferential attachment). Most users invite
+    nobody while a few invite thousands, as in real referral programmes.
+    """
+    parents = array('q', [-1]) * count
+    # Every user once, plus once more per invitee
+    pool = array('q')
+    for index in range(count):
+        if pool and rng.random() < referred_share:
+            parent = pool[rng.randrange(len(pool))]
+            parents[index] = parent
+            pool.append(parent)
+        pool.append(index)
+    return parents
+
+
+class Command(BaseCommand):
+    help = 'Generate users with referrals, wallets, holdings and years of payment history for profiling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, required=True)
+        parser.add_argument('--seed', type=int, default=1, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--years', type=float, default=2, help='How far back signups and history go')
+        parser.add_argument('--referred-share', type=float, default=0.6, help='Fraction of users who signed up with a referral code')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Users generated and committed per transaction')
+        parser.add_argument('--password', default='seed-password', help='Password of every generated user')
+
+    def handle(self, *args, **options):
+        count = options['users']
+        if count < 1 or options['chunk_size'] < 1:
+            raise CommandError('--users and --chunk-size must be at least 1')
+        self.seed = options['seed']
+        self.prefix = f'seed{self.seed}-'
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(f'Users from seed {self.seed} already exist; pick another --seed')
+
+        self.rng = random.Random(self.seed)
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=365 * options['years'])
+        self.count = count
+        self.products = list(Product.objects.order_by('price'))
+        if not self.products:
+            self.products = Product.objects.bulk_create([Product(**fields) for fields in DEFAULT_PRODUCTS])
+        self.fees = get_fee_schedule()
+        # One hash for everyone: hashing per user would dominate the run
+        self.password = make_password(options['password'])
+        self.serial = 0
+        self.next_ids = {}
+
+        self.parents = invite_tree(count, options['referred_share'], self.rng)
+        self.invitee_counts = array('q', [0]) * count
+        for parent in self.parents:
+            if parent >= 0:
+                self.invitee_counts[parent] += 1
+        self.user_ids = array('q', [0]) * count
+        self.referral_ids = array('q', [0]) * count
+
+        started = time.monotonic()
+        rows = 0
+        for low in range(0, count, options['chunk_size']):
+            high = min(low + options['chunk_size'], count)
+            with db_transaction.atomic():
+                rows += self.seed_users(low, high)
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{high}/{count} users, {rows} rows, {rows / elapsed:.0f} rows/s')
+        # Invitees may come in later chunks than their inviter, so stats wait for the last one
+        for low in range(0, count, REFERRAL_BATCH_SIZE):
+            refresh_batch(list(Referral.objects.filter(id__in=list(self.referral_ids[low:low + REFERRAL_BATCH_SIZE])).only('id', 'user_id', *STATS_FIELDS)))
+        self.stdout.write(self.style.SUCCESS(f'Seeded {count} users ({rows} rows) in {time.monotonic() - started:.1f}s'))
+
+    def reserve_ids(self, model, count):
+        """Primary keys for `count` new rows, so related rows can reference them without RETURNING."""
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                               [model._meta.db_table, model._meta.pk.column, count])
+                return [row[0] for row in cursor.fetchall()]
+        # SQLite's AUTOINCREMENT carries on from the highest id written explicitly
+        if model not in self.next_ids:
+            self.next_ids[model] = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        first = self.next_ids[model]
+        self.next_ids[model] += count
+        return range(first, first + count)
+
+    def next_serial(self):
+        self.serial += 1
+        return self.serial
+
+    def between(self, earliest, latest):
+        return earliest + (latest - earliest) * self.rng.random()
+
+    def seed_users(self, low, high):
+        rng = self.rng
+        span = self.now - self.start
+        self.rows = {model: [] for model in COLUMNS}
+
+        for index, user_id, referral_id in zip(range(low, high), self.reserve_ids(User, high - low), self.reserve_ids(Referral, high - low)):
+            self.user_ids[index] = user_id
+            self.referral_ids[index] = referral_id
+        for index in range(low, high):
+            user_id, username = self.user_ids[index], f'{self.prefix}{index}'
+            joined = self.start + span * ((index + rng.random()) / self.count)
+            phone_number = f'07{rng.randrange(10 ** 8):08d}'
+            invited = self.invitee_counts[index]
+            self.rows[User].append((user_id, self.password, False, username, '', '', f'{username}@example.com', False, True, joined))
+            self.rows[UserProfile].append((user_id, phone_number, 0, self.now))
+            # Explicit codes: the random default could collide across millions of rows.
+            # VIP levels as Referral.increment_referrals assigns them.
+            self.rows[Referral].append((self.referral_ids[index], user_id, f'S{self.seed % 1000:03d}{index:08x}', invited,
+                                        'VIP1' if invited >= 5 else 'VIP0', 0, 0, 0, 0, 0, 0))
+            if self.parents[index] >= 0:
+                self.rows[Invitee].append((self.referral_ids[self.parents[index]], user_id))
+            self.history(index, user_id, username, joined, phone_number)
+
+        transaction_ids = self.reserve_ids(Transaction, len(self.rows[Transaction]))
+        self.rows[Transaction] = [(transaction_id,) + row for transaction_id, row in zip(transaction_ids, self.rows[Transaction])]
+        for model in CHILDREN:
+            self.rows[model] = [row[:-1] + (transaction_ids[row[-1]],) for row in self.rows[model]]
+        for model, rows in self.rows.items():
+            insert_rows(model, rows)
+        return sum(len(rows) for rows in self.rows.values())
+
+    def transaction(self, user_id, amount, transaction_type, status, when, phone_number=None, airtel_transaction_id=None, fee=Decimal('0.00')):
+        """Queue a transaction row; returns its index in the chunk for the child row to reference."""
+        self.rows[Transaction].append((user_id, amount, phone_number, airtel_transaction_id, when, status, transaction_type, fee))
+        return len(self.rows[Transaction]) - 1
+
+    def reward(self, user_id, amount, kind, when):
+        transaction = self.transaction(user_id, amount, 'EXCHANGE_REWARD', 'COMPLETED', when)
+        self.rows[ExchangeReward].append((user_id, amount, when, kind, transaction))
+
+    def history(self, index, user_id, username, joined, phone_number):
+        """Queue one user's rewards, recharges, holdings, withdrawals and wallet.
+
+        The wallet totals follow from the generated history, so a fresh dataset
+        passes `manage.py audit_wallets` with no drift.
+        """
+        rng = self.rng
+        balance = SIGNUP_BONUS + REFERRAL_BONUS * self.invitee_counts[index]
+        income = Decimal('0.00')
+
+        self.reward(user_id, SIGNUP_BONUS, 'New User Bonus', joined)
+        parent = self.parents[index]
+        if parent >= 0:
+            self.reward(self.user_ids[parent], REFERRAL_BONUS, 'Referral Bonus', joined)
+
+        # Pareto-distributed: over half never recharge, a few recharge dozens of times
+        has_recharged = False
+        for _ in range(min(int(rng.paretovariate(1.2)) - 1, 60)):
+            amount = rng.choice(RECHARGE_AMOUNTS)
+            when = self.between(joined, self.now)
+            roll = rng.random()
+            if roll < 0.93:
+                statuses = ('COMPLETED', 'Completed')
+                balance += amount
+                has_recharged = True
+            elif roll < 0.97:
+                statuses = ('AWAITING_VERIFICATION', 'Pending')
+            else:
+                statuses = ('FAILED', 'Failed')
+            transaction = self.transaction(user_id, amount, 'RECHARGE', statuses[0], when, phone_number,
+                                           f'SD{self.seed}R{self.next_serial():010d}')
+            self.rows[Recharge].append((user_id, amount, when, statuses[1], phone_number, username, transaction))
+
+        # Holdings at every stage, from just bought to long matured
+        held = False
+        while rng.random() < 0.8:
+            affordable = [product for product in self.products if product.price <= balance]
+            if not affordable:
+                break
+            product = rng.choice(affordable)
+            balance -= product.price
+            purchased = self.between(joined, self.now)
+            # Income is credited on the days the user opens the app, so some days are missed
+            elapsed = (self.now.date() - purchased.date()).days
+            cycles_completed = int(min(elapsed, product.cycles) * rng.uniform(0.7, 1.0))
+            matures_at = maturity_date(purchased, product.cycles)
+            income += product.daily_income * cycles_completed
+            held = True
+            self.rows[UserProduct].append((user_id, product.pk, purchased, cycles_completed,
+                                           cycles_completed < product.cycles and matures_at > self.now, matures_at, product.price))
+
+        for _ in range(10):
+            if income < 100 or rng.random() < 0.4:
+                break
+            amount, fee, net_amount = self.fees.quote(Decimal(int(income * Decimal(rng.uniform(0.2, 0.9))) // 10 * 10))
+            when = self.between(joined, self.now)
+            roll = rng.random()
+            if roll < 0.85:
+                statuses = ('COMPLETED', 'Approved')
+                income -= amount
+            elif roll < 0.95:
+                statuses = ('PENDING', 'Pending')
+            else:
+                statuses = ('FAILED', 'Rejected')
+            airtel_transaction_id = f'SD{self.seed}W{self.next_serial():010d}' if statuses[0] == 'COMPLETED' else None
+            transaction = self.transaction(user_id, net_amount, 'WITHDRAWAL', statuses[0], when, phone_number, airtel_transaction_id, fee)
+            self.rows[Withdrawal].append((user_id, amount, net_amount, when, statuses[1], phone_number, transaction))
+
+        last_income_update = self.now - timedelta(hours=rng.uniform(0, 72)) if held else None
+        self.rows[Wallet].append((user_id, balance, income, last_income_update, has_recharged))
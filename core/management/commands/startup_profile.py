@@ -0,0 +1,116 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+# Run in a fresh interpreter: load the WSGI app the way gunicorn does, then serve one request.
+# Timings go to a file, as stdout is shared with the log listener thread.
+CHILD = r'''
+import io, json, sys, time
+started = time.perf_counter()
+from smartinvesthub.wsgi import application
+loaded = time.perf_counter()
+status = []
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '', 'SERVER_NAME': 'localhost',
+    'SERVER_PORT': '80', 'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1', 'SERVER_PROTOCOL': 'HTTP/1.1',
+    'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+    'wsgi.version': (1, 0), 'wsgi.multithread': False, 'wsgi.multiprocess': True, 'wsgi.run_once': False,
+}
+if sys.argv[3]:
+    environ['HTTP_AUTHORIZATION'] = 'Token ' + sys.argv[3]
+response = application(environ, lambda line, headers, exc_info=None: status.append(line))
+b''.join(response)
+response.close()
+done = time.perf_counter()
+with open(sys.argv[2], 'w') as handle:
+    json.dump({'load': loaded - started, 'request': done - loaded, 'status': status[0], 'modules': len(sys.modules)}, handle)
+'''
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+def package(module):
+    """Group key for a module: django.contrib apps and other django subpackages by their own name."""
+    parts = module.split('.')
+    if parts[0] == 'django':
+        return '.'.join(parts[:3] if len(parts) > 2 and parts[1] == 'contrib' else parts[:2])
+    return parts[0]
+
+
+class Command(BaseCommand):
+    help = 'Profile a cold start of the web process: import times (python -X importtime), WSGI load and first request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/products/', help='Path of the first request')
+        parser.add_argument('--user', help='Authenticate the request with this user\'s API token (default: the first active user)')
+        parser.add_argument('--anonymous', action='store_true', help='Send the request without a token, for public paths')
+        parser.add_argument('--runs', type=int, default=3, help='Cold starts to run; timings are their median')
+        parser.add_argument('--top', type=int, default=15, help='Packages and modules to list')
+        parser.add_argument('--api-only', choices=['True', 'False'], help='Override API_ONLY for the profiled process')
+        parser.add_argument('--warm-up', choices=['True', 'False'], help='Override WSGI_WARM_UP for the profiled process')
+        parser.add_argument('--raw', help='Also write the last run\'s raw -X importtime output to this file')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1')
+        env = dict(os.environ)
+        for option, variable in (('api_only', 'API_ONLY'), ('warm_up', 'WSGI_WARM_UP')):
+            if options[option]:
+                env[variable] = options[option]
+
+        token = '' if options['anonymous'] else self.token(options['user'])
+
+        runs = []
+        for _ in range(options['runs']):
+            with tempfile.NamedTemporaryFile('r', suffix='.json') as output:
+                result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD, options['path'], output.name, token], env=env, capture_output=True, text=True)
+                if result.returncode:
+                    raise CommandError(f'Profiled process failed:\n{result.stderr[-2000:]}')
+                runs.append((json.load(output), result.stderr))
+        timings, raw = runs[-1]
+        if options['raw']:
+            with open(options['raw'], 'w') as handle:
+                handle.write(raw)
+
+        by_package = defaultdict(int)
+        modules = []
+        for line in raw.splitlines():
+            match = IMPORT_LINE.match(line)
+            if match:
+                self_us, module = int(match[1]), match[4]
+                by_package[package(module)] += self_us
+                modules.append((self_us, int(match[2]), module))
+
+        load = statistics.median(run['load'] for run, _ in runs) * 1000
+        request = statistics.median(run['request'] for run, _ in runs) * 1000
+        self.stdout.write(
+            f'Cold start, median of {len(runs)} (API_ONLY={env.get("API_ONLY", "False")}, WSGI_WARM_UP={env.get("WSGI_WARM_UP", "True")}):\n'
+            f'  load WSGI app   {load:8.1f} ms  ({timings["modules"]} modules, {sum(by_package.values()) / 1000:.1f} ms importing)\n'
+            f'  first request   {request:8.1f} ms  GET {options["path"]} -> {timings["status"]}\n'
+            f'  total           {load + request:8.1f} ms'
+        )
+        if not timings['status'].startswith('2'):
+            self.stderr.write(f'The first request got {timings["status"]}, so it did not run the view: pick another --path or --user')
+        self.stdout.write('\nImport time by package (self, ms):')
+        for name, total in sorted(by_package.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {total / 1000:8.1f}  {name}')
+        self.stdout.write('\nSlowest modules (self ms, cumulative ms):')
+        for self_us, cumulative_us, module in sorted(modules, reverse=True)[:options['top']]:
+            self.stdout.write(f'  {self_us / 1000:8.1f} {cumulative_us / 1000:8.1f}  {module}')
+
+    def token(self, username):
+        """The API token the profiled request sends, created as a login would if the user has none."""
+        users = User.objects.filter(is_active=True)
+        user = users.filter(username=username).first() if username else users.order_by('pk').first()
+        if user is None:
+            raise CommandError(f'No active user {username!r}' if username else 'No users to authenticate as: create one, or pass --anonymous with a public --path')
+        return Token.objects.get_or_create(user=user)[0].key
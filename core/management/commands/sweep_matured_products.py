@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import UserProduct
+from core.sharding import fan_out
+
+
+class Command(BaseCommand):
+    help = 'Deactivate every holding past its maturity date (purchase date + product cycles) in one update'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many holdings would be retired')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+
+        def matured(alias):
+            # Served by the partial index on matures_at over active holdings
+            return UserProduct.objects.using(alias).filter(active=True, matures_at__lte=now)
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'[dry run] Would retire {sum(fan_out(lambda alias: matured(alias).count()))} matured holdings'))
+            return
+        retired = sum(fan_out(lambda alias: matured(alias).update(active=False)))
+        self.stdout.write(self.style.SUCCESS(f'Retired {retired} matured holdings'))
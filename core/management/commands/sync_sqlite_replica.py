@@ -0,0 +1,32 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.routers import REPLICA_ALIAS
+
+
+class Command(BaseCommand):
+    help = 'Copy the SQLite primary into the SQLite replica file, emulating replication for local testing'
+
+    def handle(self, *args, **options):
+        if REPLICA_ALIAS not in settings.DATABASES:
+            raise CommandError('No replica configured; set DATABASE_REPLICA_URL')
+        primary = settings.DATABASES['default']
+        replica = settings.DATABASES[REPLICA_ALIAS]
+        for alias, db in (('default', primary), (REPLICA_ALIAS, replica)):
+            if db['ENGINE'] != 'django.db.backends.sqlite3':
+                raise CommandError(f'{alias} is not a SQLite database')
+        if str(primary['NAME']) == str(replica['NAME']):
+            raise CommandError('The replica must be a different file from the primary')
+
+        # The online backup API gives a consistent snapshot even while the primary is in use
+        source = sqlite3.connect(str(primary['NAME']))
+        target = sqlite3.connect(str(replica['NAME']))
+        try:
+            with target:
+                source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f"Copied {primary['NAME']} to {replica['NAME']}"))
@@ -0,0 +1,107 @@
+# core/middleware.py
+import re
+import uuid
+
+from django.contrib.auth import middleware as auth_middleware
+from django.contrib.messages import middleware as messages_middleware
+from django.contrib.sessions import middleware as sessions_middleware
+from django.middleware import csrf
+
+from .log import request_id
+from .routers import mark_write
+from .sharding import on_shard
+
+# API clients authenticate with tokens; sessions, CSRF and messages only serve the admin
+API_PREFIX = '/api/'
+
+
+def is_api_request(request):
+    return request.path_info.startswith(API_PREFIX)
+
+
+class SessionMiddleware(sessions_middleware.SessionMiddleware):
+    def process_request(self, request):
+        if not is_api_request(request):
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        if is_api_request(request):
+            return response
+        return super().process_response(request, response)
+
+
+class CsrfViewMiddleware(csrf.CsrfViewMiddleware):
+    def process_request(self, request):
+        if not is_api_request(request):
+            super().process_request(request)
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if is_api_request(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+    def process_response(self, request, response):
+        if is_api_request(request):
+            return response
+        return super().process_response(request, response)
+
+
+class AuthenticationMiddleware(auth_middleware.AuthenticationMiddleware):
+    def process_request(self, request):
+        if not is_api_request(request):
+            super().process_request(request)
+
+
+class MessageMiddleware(messages_middleware.MessageMiddleware):
+    def process_request(self, request):
+        if not is_api_request(request):
+            super().process_request(request)
+
+
+# Request IDs passed in by a proxy or client are kept only if they look like IDs
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class RequestIDMiddleware:
+    """Tag the request's log records with an ID and echo it in the X-Request-ID header."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        incoming = request.META.get('HTTP_X_REQUEST_ID', '')
+        value = incoming if REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+        token = request_id.set(value)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id.reset(token)
+        response['X-Request-ID'] = value
+        return response
+
+
+class ShardPinMiddleware:
+    """Give each request a fresh shard pin, so one user's pin never outlives their request on this thread."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with on_shard(None):
+            return self.get_response(request)
+
+
+class ReplicaStickinessMiddleware:
+    """After a user's unsafe request, keep their reads on the primary for a short window."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            # DRF copies the token-authenticated user onto the Django request
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                mark_write(user.pk)
+        return response
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-19 15:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_alter_referral_referral_code'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='referral',
+            name='referral_code',
+            field=models.CharField(default='a87986358710', max_length=12, unique=True),
+        ),
+        migrations.CreateModel(
+            name='StatementEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('receipt', models.CharField(help_text='Provider transaction ID from the statement', max_length=100, unique=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('phone_number', models.CharField(blank=True, max_length=15, null=True)),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('raw_line', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('Queued', 'Queued'), ('Matched', 'Matched'), ('Ignored', 'Ignored')], default='Queued', max_length=20)),
+                ('date', models.DateTimeField(auto_now_add=True)),
+                ('candidates', models.ManyToManyField(blank=True, related_name='candidate_statement_entries', to='core.recharge')),
+                ('recharge', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='statement_entries', to='core.recharge')),
+            ],
+        ),
+    ]
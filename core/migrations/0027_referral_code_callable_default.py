@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-19 15:17
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_statemententry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='referral',
+            name='referral_code',
+            field=models.CharField(default=core.models.generate_referral_code, max_length=12, unique=True),
+        ),
+    ]
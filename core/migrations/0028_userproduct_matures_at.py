@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-19 15:21
+
+from datetime import datetime, time, timedelta, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_matures_at(apps, schema_editor):
+    # Frozen copy of core.models.maturity_date as of this migration: the day after the
+    # last paid cycle, at UTC midnight
+    UserProduct = apps.get_model('core', 'UserProduct')
+    batch = []
+    for holding in UserProduct.objects.select_related('product').only('id', 'purchase_date', 'product__cycles').iterator(chunk_size=2000):
+        day = holding.purchase_date.astimezone(timezone.utc).date() + timedelta(days=holding.product.cycles + 1)
+        holding.matures_at = datetime.combine(day, time.min, tzinfo=timezone.utc)
+        batch.append(holding)
+        if len(batch) >= 2000:
+            UserProduct.objects.bulk_update(batch, ['matures_at'])
+            batch = []
+    if batch:
+        UserProduct.objects.bulk_update(batch, ['matures_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_referral_code_callable_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userproduct',
+            name='matures_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_matures_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='userproduct',
+            index=models.Index(condition=models.Q(('active', True)), fields=['matures_at'], name='userproduct_active_maturity'),
+        ),
+    ]
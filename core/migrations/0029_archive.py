@@ -0,0 +1,49 @@
+# Generated by Django 5.2 on 2026-10-19 15:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_userproduct_matures_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('transaction', 'Transaction'), ('recharge', 'Recharge'), ('withdrawal', 'Withdrawal'), ('exchange_reward', 'Exchange Reward'), ('deposit', 'Deposit')], max_length=20)),
+                ('source_id', models.BigIntegerField(help_text='Primary key the row had in its hot table')),
+                ('occurred_at', models.DateTimeField()),
+                ('month', models.DateField(help_text='First day of the UTC month the row belongs to')),
+                ('payload', models.JSONField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_records', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'kind', '-occurred_at'], name='archivedrecord_user_history')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'source_id'), name='archivedrecord_unique_source')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('transaction_type', models.CharField(choices=[('RECHARGE', 'Recharge'), ('WITHDRAWAL', 'Withdrawal'), ('DEPOSIT', 'Deposit'), ('EXCHANGE_REWARD', 'Exchange Reward')], max_length=20)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('AWAITING_VERIFICATION', 'Awaiting Verification'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')], max_length=25)),
+                ('count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_fee', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'month', 'transaction_type', 'status'), name='monthlysummary_unique_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-19 15:27
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='data_changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='data_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-19 15:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_task'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deposit',
+            name='date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='exchangereward',
+            name='date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='recharge',
+            name='date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='recharge',
+            name='username',
+            field=models.CharField(blank=True, db_index=True, max_length=150, null=True),
+        ),
+        migrations.AlterField(
+            model_name='statemententry',
+            name='phone_number',
+            field=models.CharField(blank=True, db_index=True, max_length=15, null=True),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='phone_number',
+            field=models.CharField(blank=True, db_index=True, help_text="User's phone number for recharge", max_length=15, null=True),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='timestamp',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='phone_number',
+            field=models.CharField(blank=True, db_index=True, max_length=15, null=True),
+        ),
+        migrations.AlterField(
+            model_name='withdrawal',
+            name='date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-19 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='referral',
+            name='bonus_earned',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='referral',
+            name='recharged_invitees',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='referral',
+            name='vip0_invitees',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='referral',
+            name='vip1_invitees',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='referral',
+            name='vip2_invitees',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='referral',
+            name='vip3_invitees',
+            field=models.IntegerField(default=0),
+        ),
+    ]
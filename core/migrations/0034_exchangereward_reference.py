@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 16:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_referral_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exchangereward',
+            name='reference',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2 on 2026-10-19 16:15
+
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, DecimalField, Sum
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast
+
+VIP_INVITEE_FIELDS = {'VIP0': 'vip0_invitees', 'VIP1': 'vip1_invitees', 'VIP2': 'vip2_invitees', 'VIP3': 'vip3_invitees'}
+REFERRAL_BONUS_TYPE = 'Referral Bonus'
+
+
+def backfill_referral_stats(apps, schema_editor):
+    """Fill the stats columns added by 0033 for referrals that existed before them."""
+    db = schema_editor.connection.alias
+    # Wallets and rewards live on the shards once sharding is on, and those may not be
+    # migrated yet: sharded deployments run `manage.py refresh_referral_stats` afterwards
+    if db != 'default' or settings.SHARD_ALIASES:
+        return
+    Referral = apps.get_model('core', 'Referral')
+    ExchangeReward = apps.get_model('core', 'ExchangeReward')
+    ArchivedRecord = apps.get_model('core', 'ArchivedRecord')
+    Invitee = Referral.invitees.through
+
+    stats = defaultdict(dict)
+    by_level = Invitee.objects.using(db).values('referral_id', 'user__referral__vip_level').order_by().annotate(count=Count('id'))
+    for row in by_level:
+        field = VIP_INVITEE_FIELDS.get(row['user__referral__vip_level'], 'vip0_invitees')
+        stats[row['referral_id']][field] = stats[row['referral_id']].get(field, 0) + row['count']
+    recharged = Invitee.objects.using(db).filter(user__wallet__has_recharged=True).values('referral_id').order_by().annotate(count=Count('id'))
+    for row in recharged:
+        stats[row['referral_id']]['recharged_invitees'] = row['count']
+
+    earned = defaultdict(int)
+    hot = ExchangeReward.objects.using(db).filter(type=REFERRAL_BONUS_TYPE).values('user_id').order_by().annotate(total=Sum('amount'))
+    archived = (
+        ArchivedRecord.objects.using(db).filter(kind='exchange_reward', payload__type=REFERRAL_BONUS_TYPE)
+        .values('user_id').order_by().annotate(total=Sum(Cast(KT('payload__amount'), DecimalField(max_digits=14, decimal_places=2))))
+    )
+    for rows in (hot, archived):
+        for row in rows:
+            earned[row['user_id']] += row['total'] or 0
+    for user_id, referral_id in Referral.objects.using(db).filter(user_id__in=list(earned)).values_list('user_id', 'id'):
+        stats[referral_id]['bonus_earned'] = earned[user_id]
+
+    for referral_id, values in stats.items():
+        Referral.objects.using(db).filter(pk=referral_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0034_exchangereward_reference'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_referral_stats, migrations.RunPython.noop),
+    ]
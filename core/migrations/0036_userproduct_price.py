@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 16:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0035_backfill_referral_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userproduct',
+            name='price',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+    ]
@@ -1,8 +1,10 @@
 from django.db import models
+from django.db.models import Count, F
 import logging
 from django.contrib.auth.models import User
 from django.utils import timezone
 import uuid
+from datetime import datetime, time, timedelta, timezone as dt_timezone
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
@@ -10,7 +12,10 @@ logger = logging.getLogger(__name__)
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
-    phone_number = models.CharField(max_length=15, blank=True, null=True)
+    phone_number = models.CharField(max_length=15, blank=True, null=True, db_index=True)
+    # Bumped whenever the user's wallet or payment history changes (core.conditional)
+    data_version = models.PositiveBigIntegerField(default=0)
+    data_changed_at = models.DateTimeField(default=timezone.now)
 
     def __str__(self):
         return f"{self.user.username}'s profile"
@@ -37,17 +42,32 @@ class Wallet(models.Model):
     def __str__(self):
         return f"{self.user.username}'s Wallet"
 
+def generate_referral_code():
+    return uuid.uuid4().hex[:12]
+
+# Invitee counts per VIP level are kept on the inviter's Referral, one column per level
+VIP_INVITEE_FIELDS = {'VIP0': 'vip0_invitees', 'VIP1': 'vip1_invitees', 'VIP2': 'vip2_invitees', 'VIP3': 'vip3_invitees'}
+
 class Referral(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='referral')
-    referral_code = models.CharField(max_length=12, unique=True, default=uuid.uuid4().hex[:12])
+    referral_code = models.CharField(max_length=12, unique=True, default=generate_referral_code)
     referrals_count = models.IntegerField(default=0)
     vip_level = models.CharField(max_length=4, default='VIP0')
     invitees = models.ManyToManyField(User, related_name='invited_by', blank=True)
+    # Precomputed invitee stats, updated in place as invitees join, level up and recharge;
+    # `refresh_referral_stats` recomputes them from scratch
+    vip0_invitees = models.IntegerField(default=0)
+    vip1_invitees = models.IntegerField(default=0)
+    vip2_invitees = models.IntegerField(default=0)
+    vip3_invitees = models.IntegerField(default=0)
+    recharged_invitees = models.IntegerField(default=0)
+    bonus_earned = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
     def __str__(self):
         return f"{self.user.username}'s Referral (Code: {self.referral_code})"
 
     def increment_referrals(self):
+        old_level = self.vip_level
         self.referrals_count += 1
         if self.referrals_count >= 5:
             self.vip_level = 'VIP1'
@@ -55,7 +75,39 @@ class Referral(models.Model):
             self.vip_level = 'VIP2'
         elif self.referrals_count >= 15:
             self.vip_level = 'VIP3'
-        self.save()
+        # Only these two: a full save would overwrite stats updated concurrently with F()
+        self.save(update_fields=['referrals_count', 'vip_level'])
+        if self.vip_level != old_level and old_level in VIP_INVITEE_FIELDS:
+            # Move this user to their new level in their inviter's counts
+            old_field, new_field = VIP_INVITEE_FIELDS[old_level], VIP_INVITEE_FIELDS[self.vip_level]
+            Referral.objects.filter(invitees=self.user_id).update(**{old_field: F(old_field) - 1, new_field: F(new_field) + 1})
+
+    def record_invite(self, invitee, bonus, recharged=False):
+        """Count a new invitee at their current VIP level, plus the bonus credited for them.
+
+        `recharged` is whether the invitee's wallet was recharged before the invite was
+        recorded: record_first_recharges() only counts invitees already linked.
+        """
+        level = Referral.objects.filter(user=invitee).values_list('vip_level', flat=True).first() or 'VIP0'
+        field = VIP_INVITEE_FIELDS.get(level, 'vip0_invitees')
+        updates = {field: F(field) + 1, 'bonus_earned': F('bonus_earned') + bonus}
+        if recharged:
+            updates['recharged_invitees'] = F('recharged_invitees') + 1
+        Referral.objects.filter(pk=self.pk).update(**updates)
+
+def record_first_recharges(user_ids):
+    """Count users whose wallets just got has_recharged in their inviters' recharged_invitees."""
+    inviters = (
+        Referral.invitees.through.objects.filter(user_id__in=user_ids)
+        .values('referral_id').order_by().annotate(recharged=Count('user_id'))
+    )
+    for row in inviters:
+        Referral.objects.filter(pk=row['referral_id']).update(recharged_invitees=F('recharged_invitees') + row['recharged'])
+
+def maturity_date(purchase_date, cycles):
+    """When a holding stops earning: income is paid while (today - purchase day) <= cycles, in UTC days."""
+    day = purchase_date.astimezone(dt_timezone.utc).date() + timedelta(days=cycles + 1)
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
 
 class UserProduct(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -63,6 +115,23 @@ class UserProduct(models.Model):
     purchase_date = models.DateTimeField(default=timezone.now)
     cycles_completed = models.IntegerField(default=0)
     active = models.BooleanField(default=True)
+    matures_at = models.DateTimeField(null=True, blank=True, editable=False)  # Set from purchase_date + product.cycles
+    # What the user paid; null for holdings bought before it was recorded
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Only live holdings are indexed, so the maturity sweep scans just those
+            models.Index(fields=['matures_at'], name='userproduct_active_maturity', condition=models.Q(active=True)),
+        ]
+
+    def save(self, *args, **kwargs):
+        # bulk_create skips save(); bulk callers set matures_at and price themselves
+        if self.purchase_date and self.product_id:
+            self.matures_at = maturity_date(self.purchase_date, self.product.cycles)
+        if self.price is None and self.product_id:
+            self.price = self.product.price
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user.username} - {self.product.name}"
@@ -82,7 +151,7 @@ class Transaction(models.Model):
     )
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions')
     amount = models.DecimalField(max_digits=10, decimal_places=2, help_text="Transaction amount in KES")
-    phone_number = models.CharField(max_length=15, blank=True, null=True, help_text="User's phone number for recharge")
+    phone_number = models.CharField(max_length=15, blank=True, null=True, db_index=True, help_text="User's phone number for recharge")
     mpesa_receipt = models.CharField(max_length=20, unique=True, blank=True, null=True)
     airtel_transaction_id = models.CharField(
         max_length=100,
@@ -92,7 +161,7 @@ class Transaction(models.Model):
         help_text="Transaction ID from Airtel Money or M-Pesa (e.g., QJ1234567890)"
     )
     checkout_request_id = models.CharField(max_length=50, unique=True, blank=True, null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
     status = models.CharField(
         max_length=25,
         choices=TRANSACTION_STATUSES,
@@ -107,32 +176,35 @@ class Transaction(models.Model):
 class Recharge(models.Model):
     user = models.ForeignKey('auth.User', on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(auto_now_add=True, db_index=True)
     status = models.CharField(max_length=20, choices=[('Pending', 'Pending'), ('Completed', 'Completed'), ('Failed', 'Failed')], default='Pending')
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     transaction = models.OneToOneField('Transaction', on_delete=models.SET_NULL, null=True, blank=True)
-    username = models.CharField(max_length=150, blank=True, null=True)
+    username = models.CharField(max_length=150, blank=True, null=True, db_index=True)
 
     def save(self, *args, **kwargs):
         if self.status == 'Completed' and self.transaction and self.transaction.airtel_transaction_id:
             try:
                 wallet = Wallet.objects.get(user=self.user)
                 old_balance = wallet.balance
+                first_recharge = not wallet.has_recharged
                 wallet.balance += self.amount
                 wallet.has_recharged = True
                 wallet.save()
-                logger.info(f"Updated wallet for user {self.user.username}: Old balance {old_balance}, New balance {wallet.balance}, Recharge amount {self.amount}")
+                if first_recharge:
+                    record_first_recharges([self.user_id])
+                logger.info("Updated wallet for user %s: Old balance %s, New balance %s, Recharge amount %s", self.user.username, old_balance, wallet.balance, self.amount)
             except Wallet.DoesNotExist:
-                logger.error(f"No wallet found for user {self.user.username}")
+                logger.error("No wallet found for user %s", self.user.username)
             except Exception as e:
-                logger.error(f"Error updating wallet for user {self.user.username}: {str(e)}")
+                logger.error("Error updating wallet for user %s: %s", self.user.username, e)
         super().save(*args, **kwargs)
 
 class Withdrawal(models.Model):
     user = models.ForeignKey('auth.User', on_delete=models.CASCADE)
     requested_amount = models.DecimalField(max_digits=10, decimal_places=2)  # Original requested amount
     amount = models.DecimalField(max_digits=10, decimal_places=2)  # Net amount user receives after fee
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(auto_now_add=True, db_index=True)
     status = models.CharField(max_length=20, choices=[('Pending', 'Pending'), ('Approved', 'Approved'), ('Rejected', 'Rejected')], default='Pending')
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     transaction = models.OneToOneField('Transaction', on_delete=models.SET_NULL, null=True, blank=True)
@@ -145,22 +217,24 @@ class Withdrawal(models.Model):
                     old_income = wallet.income
                     wallet.income -= self.requested_amount
                     wallet.save()
-                    logger.info(f"Processed withdrawal for user {self.user.username}: Old income {old_income}, New income {wallet.income}, Requested amount {self.requested_amount}, Fee {self.transaction.fee}, Net amount {self.amount}")
+                    logger.info("Processed withdrawal for user %s: Old income %s, New income %s, Requested amount %s, Fee %s, Net amount %s", self.user.username, old_income, wallet.income, self.requested_amount, self.transaction.fee, self.amount)
                 else:
-                    logger.error(f"Insufficient income balance for withdrawal by user {self.user.username}: Requested {self.requested_amount}, Available {wallet.income}")
+                    logger.error("Insufficient income balance for withdrawal by user %s: Requested %s, Available %s", self.user.username, self.requested_amount, wallet.income)
                     self.status = 'Rejected'
             except Wallet.DoesNotExist:
-                logger.error(f"No wallet found for user {self.user.username}")
+                logger.error("No wallet found for user %s", self.user.username)
             except Exception as e:
-                logger.error(f"Error processing withdrawal for user {self.user.username}: {str(e)}")
+                logger.error("Error processing withdrawal for user %s: %s", self.user.username, e)
         super().save(*args, **kwargs)
 
 class ExchangeReward(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(auto_now_add=True, db_index=True)
     type = models.CharField(max_length=50, default='Bonus')
     transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, null=True, blank=True)
+    # What the reward was granted for, e.g. 'referral:<invitee id>'; unique so it is never granted twice
+    reference = models.CharField(max_length=64, unique=True, null=True, blank=True)
 
     def __str__(self):
         return f"{self.user.username} - Exchange Reward {self.amount} KSh"
@@ -168,13 +242,107 @@ class ExchangeReward(models.Model):
 class Deposit(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(auto_now_add=True, db_index=True)
     status = models.CharField(max_length=20, choices=[('Completed', 'Completed'), ('Processing', 'Processing')], default='Processing')
     transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, null=True, blank=True)
 
     def __str__(self):
         return f"{self.user.username} - Deposit {self.amount} KSh"
 
+class StatementEntry(models.Model):
+    """A line from an imported Airtel Money / M-Pesa statement."""
+    STATUSES = (
+        ('Queued', 'Queued'),
+        ('Matched', 'Matched'),
+        ('Ignored', 'Ignored'),
+    )
+    receipt = models.CharField(max_length=100, unique=True, help_text="Provider transaction ID from the statement")
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    phone_number = models.CharField(max_length=15, blank=True, null=True, db_index=True)
+    paid_at = models.DateTimeField(null=True, blank=True)
+    raw_line = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=STATUSES, default='Queued')
+    recharge = models.ForeignKey(Recharge, on_delete=models.SET_NULL, null=True, blank=True, related_name='statement_entries')
+    candidates = models.ManyToManyField(Recharge, blank=True, related_name='candidate_statement_entries')
+    date = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.receipt} - {self.amount} KSh - {self.status}"
+
+class ArchivedRecord(models.Model):
+    """A history row moved out of the hot tables, kept as the JSON its API serializer returned."""
+    KINDS = (
+        ('transaction', 'Transaction'),
+        ('recharge', 'Recharge'),
+        ('withdrawal', 'Withdrawal'),
+        ('exchange_reward', 'Exchange Reward'),
+        ('deposit', 'Deposit'),
+    )
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_records')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    source_id = models.BigIntegerField(help_text="Primary key the row had in its hot table")
+    occurred_at = models.DateTimeField()
+    month = models.DateField(help_text="First day of the UTC month the row belongs to")
+    payload = models.JSONField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'source_id'], name='archivedrecord_unique_source'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'kind', '-occurred_at'], name='archivedrecord_user_history'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.kind} #{self.source_id}"
+
+class MonthlySummary(models.Model):
+    """Per-user monthly totals of archived transactions, by type and status."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_summaries')
+    month = models.DateField()
+    transaction_type = models.CharField(max_length=20, choices=Transaction.TRANSACTION_TYPES)
+    status = models.CharField(max_length=25, choices=Transaction.TRANSACTION_STATUSES)
+    count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_fee = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month', 'transaction_type', 'status'], name='monthlysummary_unique_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.month:%Y-%m} - {self.transaction_type} {self.status}: {self.total_amount} KSh"
+
+class Task(models.Model):
+    """A background job run by the `run_tasks` worker (core.tasks)."""
+    STATUSES = (
+        ('Queued', 'Queued'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+        ('Dead', 'Dead'),  # Out of attempts; retried only by hand
+    )
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUSES, default='Queued')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} - {self.status}"
+
 # Signal to create UserProfile for new users
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
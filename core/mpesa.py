@@ -0,0 +1,164 @@
+# core/mpesa.py
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .mpesa_credentials import MpesaCredentials, make_password
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATH = '/oauth/v1/generate?grant_type=client_credentials'
+STK_PUSH_PATH = '/mpesa/stkpush/v1/processrequest'
+
+# Refresh the access token this many seconds before Daraja says it expires
+TOKEN_REFRESH_MARGIN = 60
+
+
+class MpesaError(Exception):
+    pass
+
+
+def build_session(pool_size=10, retries=3, backoff_factor=0.5):
+    """A pooled session that retries connection errors and, for GETs, 5xx/429 responses.
+
+    POSTs are only retried when the connection failed before the request was sent,
+    so an STK push is never submitted twice.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class MpesaClient:
+    def __init__(self, base_url=None, consumer_key=None, consumer_secret=None, shortcode=None,
+                 passkey=None, callback_url=None, timeout=None, session=None):
+        self.base_url = (base_url or settings.MPESA_BASE_URL).rstrip('/')
+        self.consumer_key = consumer_key if consumer_key is not None else MpesaCredentials.CONSUMER_KEY
+        self.consumer_secret = consumer_secret if consumer_secret is not None else MpesaCredentials.CONSUMER_SECRET
+        self.shortcode = shortcode if shortcode is not None else MpesaCredentials.SHORTCODE
+        self.passkey = passkey if passkey is not None else MpesaCredentials.PASSKEY
+        self.callback_url = callback_url if callback_url is not None else settings.MPESA_CALLBACK_URL
+        self.timeout = timeout or settings.MPESA_TIMEOUT
+        self.session = session or build_session()
+        self._token = None
+        self._token_expires_at = 0
+        self._token_lock = threading.Lock()
+
+    def get_access_token(self, force_refresh=False):
+        """Return a cached OAuth token, fetching a new one only when it is about to expire."""
+        if not force_refresh and self._token and time.monotonic() < self._token_expires_at:
+            return self._token
+        with self._token_lock:
+            # Another thread may have refreshed the token while we waited for the lock
+            if not force_refresh and self._token and time.monotonic() < self._token_expires_at:
+                return self._token
+            try:
+                response = self.session.get(
+                    self.base_url + TOKEN_PATH,
+                    auth=(self.consumer_key, self.consumer_secret),
+                    timeout=self.timeout,
+                )
+                response.raise_for_status()
+                data = response.json()
+                token = data['access_token']
+                expires_in = int(data.get('expires_in', 3599))
+            except (requests.RequestException, ValueError, KeyError) as e:
+                logger.error("Failed to fetch M-Pesa access token: %s", e)
+                raise MpesaError('Could not authenticate with M-Pesa') from e
+            self._token = token
+            self._token_expires_at = time.monotonic() + max(expires_in - TOKEN_REFRESH_MARGIN, 0)
+            logger.info("Fetched new M-Pesa access token valid for %ss", expires_in)
+            return token
+
+    def _post(self, path, payload):
+        for attempt in range(2):
+            token = self.get_access_token(force_refresh=attempt > 0)
+            try:
+                response = self.session.post(
+                    self.base_url + path,
+                    json=payload,
+                    headers={'Authorization': f'Bearer {token}'},
+                    timeout=self.timeout,
+                )
+            except requests.RequestException as e:
+                logger.error("M-Pesa request to %s failed: %s", path, e)
+                raise MpesaError('M-Pesa is unreachable') from e
+            # A revoked or expired token gets one retry with a fresh token
+            if response.status_code == 401 and attempt == 0:
+                continue
+            try:
+                data = response.json()
+            except ValueError:
+                data = {}
+            if response.status_code >= 400:
+                logger.error("M-Pesa request to %s returned %s: %s", path, response.status_code, data or response.text[:200])
+                raise MpesaError(data.get('errorMessage') or f'M-Pesa returned HTTP {response.status_code}')
+            return data
+        raise MpesaError('M-Pesa rejected the access token')
+
+    def stk_push(self, phone_number, amount, account_reference, description='Wallet recharge'):
+        """Ask Daraja to prompt the customer's phone for payment; returns the response body."""
+        password, timestamp = make_password(self.shortcode, self.passkey)
+        payload = {
+            'BusinessShortCode': self.shortcode,
+            'Password': password,
+            'Timestamp': timestamp,
+            'TransactionType': 'CustomerPayBillOnline',
+            'Amount': int(amount),
+            'PartyA': phone_number,
+            'PartyB': self.shortcode,
+            'PhoneNumber': phone_number,
+            'CallBackURL': self.callback_url,
+            'AccountReference': str(account_reference)[:12],
+            'TransactionDesc': description[:13],
+        }
+        data = self._post(STK_PUSH_PATH, payload)
+        if str(data.get('ResponseCode')) != '0' or not data.get('CheckoutRequestID'):
+            raise MpesaError(data.get('CustomerMessage') or data.get('errorMessage') or 'STK push was not accepted')
+        return data
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide client, so every request shares one token cache and connection pool."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MpesaClient()
+    return _client
+
+
+def parse_callback(body):
+    """Pull the fields we use out of a Daraja STK callback body."""
+    callback = (body or {}).get('Body', {}).get('stkCallback', {})
+    items = callback.get('CallbackMetadata', {}).get('Item', [])
+    metadata = {item.get('Name'): item.get('Value') for item in items if isinstance(item, dict)}
+    return {
+        'checkout_request_id': callback.get('CheckoutRequestID'),
+        'result_code': callback.get('ResultCode'),
+        'result_desc': callback.get('ResultDesc', ''),
+        'amount': metadata.get('Amount'),
+        'receipt': metadata.get('MpesaReceiptNumber'),
+        'phone_number': metadata.get('PhoneNumber'),
+    }
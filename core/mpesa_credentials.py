@@ -1,16 +1,29 @@
 # core/mpesa_credentials.py
+import base64
+
+from django.conf import settings
+from django.utils import timezone
+
+
+def make_password(shortcode, passkey):
+    # Daraja expects base64(shortcode + passkey + timestamp) alongside the timestamp
+    timestamp = timezone.localtime().strftime('%Y%m%d%H%M%S')
+    raw = f"{shortcode}{passkey}{timestamp}"
+    return base64.b64encode(raw.encode()).decode(), timestamp
+
+
 class MpesaCredentials:
-    CONSUMER_KEY = "YOUR_CONSUMER_KEY"  # Replace with Safaricom API Consumer Key
-    CONSUMER_SECRET = "YOUR_CONSUMER_SECRET"  # Replace with Safaricom API Consumer Secret
-    SHORTCODE = "YOUR_SHORTCODE"  # Replace with your registered shortcode
-    PASSKEY = "YOUR_PASSKEY"  # Replace with your passkey
+    CONSUMER_KEY = settings.MPESA_CONSUMER_KEY
+    CONSUMER_SECRET = settings.MPESA_CONSUMER_SECRET
+    SHORTCODE = settings.MPESA_SHORTCODE
+    PASSKEY = settings.MPESA_PASSKEY
 
     @classmethod
     def get_access_token(cls):
-        # Simulate token fetching (replace with actual API call)
-        return "SIMULATED_ACCESS_TOKEN"  # Replace with real token logic
+        # Imported here so the client module can use these credentials
+        from .mpesa import get_client
+        return get_client().get_access_token()
 
     @classmethod
     def get_password(cls):
-        # Simulate password generation (replace with actual logic)
-        return "SIMULATED_PASSWORD", timezone.now().strftime('%Y%m%d%H%M%S')
\ No newline at end of file
+        return make_password(cls.SHORTCODE, cls.PASSKEY)
@@ -0,0 +1,116 @@
+# core/notifications.py
+import json
+import threading
+from collections import defaultdict
+
+from django.db import transaction as db_transaction
+
+
+class NotificationHub:
+    """In-process wake-up hub for per-user status changes.
+
+    Each publish bumps the user's version and wakes that user's waiters only.
+    Waiters compare versions, so a publish landing between a DB read and the
+    wait is never lost.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = defaultdict(int)
+        self._waiters = defaultdict(set)
+
+    def version(self, user_id):
+        with self._lock:
+            return self._versions[user_id]
+
+    def publish(self, user_id):
+        with self._lock:
+            self._versions[user_id] += 1
+            waiters = list(self._waiters.get(user_id, ()))
+        for event in waiters:
+            event.set()
+
+    def wait(self, user_id, since, timeout):
+        """Block until the user's version moves past `since` or the timeout expires."""
+        event = threading.Event()
+        with self._lock:
+            if self._versions[user_id] != since:
+                return self._versions[user_id]
+            self._waiters[user_id].add(event)
+        try:
+            event.wait(timeout)
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(user_id)
+                if waiters is not None:
+                    waiters.discard(event)
+                    if not waiters:
+                        del self._waiters[user_id]
+        return self.version(user_id)
+
+
+hub = NotificationHub()
+
+
+class StreamSlots:
+    """Counts the status streams open in this process, so they can't take every worker thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+
+    def acquire(self, limit):
+        with self._lock:
+            if self.open >= limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+stream_slots = StreamSlots()
+
+
+class HeldStream:
+    """Iterate `events` while holding a stream slot; the response closing the stream frees it.
+
+    A plain generator's finally block doesn't run when it is closed before its first
+    item, so the slot is released from close() instead.
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.events)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.events.close()
+            stream_slots.release()
+
+
+def notify_user(user_id):
+    """Wake the user's status streams once the current transaction commits."""
+    if user_id is not None:
+        db_transaction.on_commit(lambda: hub.publish(user_id))
+
+
+def format_event(event, data, event_id=None, retry=None):
+    lines = []
+    if retry is not None:
+        # Milliseconds an EventSource waits before reconnecting once the stream ends
+        lines.append(f'retry: {retry}')
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,95 @@
+# core/paginators.py
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+def _sql(queryset):
+    return queryset.query.get_compiler(using=queryset.db).as_sql()
+
+
+def table_estimate(model, using):
+    """Approximate row count of the model's table, or None when there is no cheap estimate."""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [connection.ops.quote_name(model._meta.db_table)])
+            row = cursor.fetchone()
+        # reltuples is -1 until the table has been vacuumed or analyzed
+        return row[0] if row and row[0] >= 0 else None
+    if model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+        # The highest id overcounts deleted rows, but it is a single index lookup
+        return model._default_manager.using(using).aggregate(last=Max('pk'))['last'] or 0
+    return None
+
+
+def query_estimate(queryset):
+    """The planner's row estimate for a filtered queryset; PostgreSQL only."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = _sql(queryset.order_by())
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+def cached_count(queryset):
+    """Exact COUNT(*), cached for ADMIN_COUNT_CACHE_SECONDS per distinct query."""
+    sql, params = _sql(queryset)
+    key = 'admin-count:' + hashlib.sha256(repr((queryset.db, sql, params)).encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.ADMIN_COUNT_CACHE_SECONDS)
+    return count
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts the database's row estimate on big result sets.
+
+    Unfiltered lists use the table statistics and filtered ones the query
+    plan; only results estimated below ADMIN_ESTIMATED_COUNT_THRESHOLD are
+    counted exactly. The page count is then approximate, so the last pages of
+    a huge list may come out short or empty.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        try:
+            if queryset.query.has_filters() or queryset.query.distinct:
+                estimate = query_estimate(queryset)
+            else:
+                estimate = table_estimate(queryset.model, queryset.db)
+            if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+            return cached_count(queryset)
+        except EmptyResultSet:
+            return 0
+
+
+class InviteeCursorPagination(CursorPagination):
+    """Keyset pages of a referral's invitees, newest first.
+
+    Ordered by the invitee's user id, so each page is a range scan of the
+    through table's unique (referral_id, user_id) index, with no COUNT and no
+    OFFSET however far the client pages.
+    """
+    ordering = '-user_id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
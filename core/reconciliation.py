@@ -0,0 +1,430 @@
+# core/reconciliation.py
+import csv
+import io
+import logging
+import re
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Recharge, StatementEntry, Transaction, Wallet, record_first_recharges
+from .notifications import notify_user
+from .conditional import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+# One parsed payment line from a statement export or a pasted SMS
+StatementLine = namedtuple('StatementLine', ['receipt', 'amount', 'phone_number', 'paid_at', 'raw_line'])
+
+# How far around the recharge request a payment may land and still be matched
+DEFAULT_WINDOW = timedelta(hours=72)
+EARLY_SLACK = timedelta(minutes=30)
+
+# Unmatched lines keep at most this many candidates, closest in time first
+MAX_CANDIDATES = 10
+
+# Rows are written in batches so SQLite stays under its variable limit
+BATCH_SIZE = 500
+
+# Precompiled patterns for Airtel Money / M-Pesa confirmation messages
+MPESA_RECEIPT_RE = re.compile(r'^\s*([A-Z0-9]{10})\s+Confirmed', re.IGNORECASE)
+AIRTEL_RECEIPT_RE = re.compile(r'\b(?:TID|Trans(?:action)?\.?\s*ID)\s*[:.]?\s*([A-Z0-9][A-Z0-9.]{5,})', re.IGNORECASE)
+AMOUNT_RE = re.compile(r'\b(?:Ksh|KES)\.?\s?([\d,]+(?:\.\d{1,2})?)', re.IGNORECASE)
+PHONE_RE = re.compile(r'(?<!\d)(?:\+?254|0)?([17]\d{8})(?!\d)')
+SMS_DATETIME_RE = re.compile(
+    r'\bon\s+(\d{1,2}/\d{1,2}/\d{2,4})\s+(?:at\s+)?(\d{1,2}:\d{2}(?::\d{2})?(?:\s?[AP]M)?)',
+    re.IGNORECASE,
+)
+RECEIVED_RE = re.compile(r'\breceived\b', re.IGNORECASE)
+MESSAGE_SPLIT_RE = re.compile(r'\n\s*\n')
+
+DATETIME_FORMATS = (
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%y %H:%M:%S',
+    '%d/%m/%y %H:%M',
+    '%d/%m/%Y %I:%M %p',
+    '%d/%m/%y %I:%M %p',
+    '%d/%m/%Y %I:%M%p',
+    '%d/%m/%y %I:%M%p',
+    '%d-%m-%Y %H:%M:%S',
+    '%d-%m-%Y %H:%M',
+)
+
+# Header aliases seen in Airtel Money and M-Pesa statement exports (lowercased)
+CSV_COLUMNS = {
+    'receipt': ('receipt no.', 'receipt no', 'receipt', 'transaction id', 'trans id', 'tid', 'reference'),
+    'paid_at': ('completion time', 'transaction date', 'date', 'initiation time', 'time'),
+    'amount': ('paid in', 'amount', 'credit', 'credit amount'),
+    'phone_number': ('phone', 'phone number', 'msisdn', 'sender msisdn', 'sender', 'from'),
+    'details': ('details', 'description', 'narration'),
+    'status': ('transaction status', 'status'),
+}
+
+
+def normalize_phone(value):
+    """Reduce a Kenyan phone number to its last nine digits (7XXXXXXXX)."""
+    if not value:
+        return None
+    match = PHONE_RE.search(str(value).replace(' ', ''))
+    return match.group(1) if match else None
+
+
+def parse_amount(value):
+    if value is None:
+        return None
+    cleaned = re.sub(r'(?i)ksh|kes|,|\s', '', str(value))
+    if not cleaned:
+        return None
+    try:
+        amount = Decimal(cleaned).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+    return amount if amount > 0 else None
+
+
+def parse_datetime(value):
+    if not value:
+        return None
+    value = ' '.join(str(value).split())
+    for fmt in DATETIME_FORMATS:
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+    return None
+
+
+def parse_sms(text):
+    """Parse pasted confirmation messages, one per blank-line separated block or line."""
+    text = text.replace('\r\n', '\n')
+    blocks = MESSAGE_SPLIT_RE.split(text)
+    if len(blocks) == 1:
+        blocks = text.split('\n')
+    lines = []
+    for block in blocks:
+        message = ' '.join(block.split())
+        if not message or not RECEIVED_RE.search(message):
+            continue
+        receipt_match = MPESA_RECEIPT_RE.search(message) or AIRTEL_RECEIPT_RE.search(message)
+        amount_match = AMOUNT_RE.search(message)
+        if not receipt_match or not amount_match:
+            logger.warning("Skipping unparseable statement message: %s", message[:80])
+            continue
+        amount = parse_amount(amount_match.group(1))
+        if amount is None:
+            continue
+        # The sender's number follows the amount ("received Ksh100 from JOHN 07...")
+        phone = normalize_phone(message[amount_match.end():])
+        paid_at = None
+        datetime_match = SMS_DATETIME_RE.search(message)
+        if datetime_match:
+            paid_at = parse_datetime(f"{datetime_match.group(1)} {datetime_match.group(2)}")
+        lines.append(StatementLine(receipt_match.group(1).upper().rstrip('.'), amount, phone, paid_at, message))
+    return lines
+
+
+def parse_csv(text):
+    """Parse a CSV statement export, mapping whichever known headers are present."""
+    reader = csv.reader(io.StringIO(text))
+    header = None
+    columns = {}
+    lines = []
+    for row in reader:
+        if header is None:
+            # Exports often carry a preamble; the header is the first row naming a receipt column
+            lowered = [cell.strip().lower() for cell in row]
+            if not any(cell in CSV_COLUMNS['receipt'] for cell in lowered):
+                continue
+            header = lowered
+            for key, aliases in CSV_COLUMNS.items():
+                for alias in aliases:
+                    if alias in header:
+                        columns[key] = header.index(alias)
+                        break
+            continue
+
+        def cell(key):
+            index = columns.get(key)
+            return row[index].strip() if index is not None and index < len(row) else ''
+
+        status = cell('status').lower()
+        if status and status not in ('completed', 'success', 'successful'):
+            continue
+        receipt = cell('receipt').upper()
+        amount = parse_amount(cell('amount'))
+        if not receipt or amount is None:
+            continue
+        phone = normalize_phone(cell('phone_number')) or normalize_phone(cell('details'))
+        lines.append(StatementLine(receipt, amount, phone, parse_datetime(cell('paid_at')), ','.join(row)))
+    return lines
+
+
+def _has_csv_header(text):
+    return any(
+        any(cell.strip().lower() in CSV_COLUMNS['receipt'] for cell in row)
+        for row in csv.reader(io.StringIO(text))
+    )
+
+
+def parse_statement(text, fmt='auto'):
+    if fmt == 'auto':
+        # Exports may open with a preamble, so look for the header row rather than at the first line
+        fmt = 'csv' if _has_csv_header(text) else 'sms'
+    if fmt == 'csv':
+        return parse_csv(text)
+    return parse_sms(text)
+
+
+class ReconciliationResult:
+    def __init__(self):
+        self.matched = []     # (StatementLine, recharge row)
+        self.queued = []      # (StatementLine, [candidate recharge ids])
+        self.duplicates = []  # StatementLine already recorded elsewhere
+
+    def summary(self):
+        return {
+            'matched': len(self.matched),
+            'queued': len(self.queued),
+            'duplicates': len(self.duplicates),
+            'matched_amount': sum((line.amount for line, _ in self.matched), Decimal('0.00')),
+        }
+
+
+def _pending_recharges(lines, window):
+    """Load pending recharges once and index them by (amount, phone) and by amount."""
+    queryset = Recharge.objects.filter(status='Pending', transaction__isnull=False)
+    times = [line.paid_at for line in lines if line.paid_at]
+    if times and len(times) == len(lines):
+        queryset = queryset.filter(date__gte=min(times) - window, date__lte=max(times) + EARLY_SLACK)
+    rows = queryset.values(
+        'id', 'user_id', 'amount', 'date', 'phone_number', 'transaction_id',
+        'transaction__phone_number', 'user__profile__phone_number',
+    )
+    by_amount_phone = defaultdict(list)
+    by_amount = defaultdict(list)
+    for row in rows:
+        by_amount[row['amount']].append(row)
+        phones = {
+            normalize_phone(row['phone_number']),
+            normalize_phone(row['transaction__phone_number']),
+            normalize_phone(row['user__profile__phone_number']),
+        }
+        phones.discard(None)
+        for phone in phones:
+            by_amount_phone[(row['amount'], phone)].append(row)
+    return by_amount_phone, by_amount
+
+
+def _known_receipts(receipts):
+    known = set()
+    receipts = list(receipts)
+    for start in range(0, len(receipts), BATCH_SIZE):
+        chunk = receipts[start:start + BATCH_SIZE]
+        known.update(Transaction.objects.filter(airtel_transaction_id__in=chunk).values_list('airtel_transaction_id', flat=True))
+        known.update(Transaction.objects.filter(mpesa_receipt__in=chunk).values_list('mpesa_receipt', flat=True))
+        known.update(StatementEntry.objects.filter(receipt__in=chunk).values_list('receipt', flat=True))
+    return known
+
+
+def match_lines(lines, window=DEFAULT_WINDOW):
+    """Match statement lines to pending recharges without writing anything.
+
+    A line is matched only when amount, phone and time window single out exactly one
+    unclaimed recharge; everything else is queued with its candidates for an admin.
+    """
+    result = ReconciliationResult()
+    known = _known_receipts({line.receipt for line in lines})
+    by_amount_phone, by_amount = _pending_recharges(lines, window)
+    claimed = set()
+    seen = set()
+
+    def in_window(line, row):
+        if line.paid_at is None:
+            return True
+        return row['date'] - EARLY_SLACK <= line.paid_at <= row['date'] + window
+
+    # Earliest payments first so each one claims the oldest fitting request
+    ordered = sorted(lines, key=lambda line: (line.paid_at is None, line.paid_at or timezone.now()))
+    for line in ordered:
+        if line.receipt in known or line.receipt in seen:
+            result.duplicates.append(line)
+            continue
+        seen.add(line.receipt)
+        candidates = []
+        if line.phone_number:
+            candidates = [
+                row for row in by_amount_phone.get((line.amount, line.phone_number), ())
+                if row['id'] not in claimed and in_window(line, row)
+            ]
+        if line.phone_number and len(candidates) == 1:
+            claimed.add(candidates[0]['id'])
+            result.matched.append((line, candidates[0]))
+            continue
+        if not candidates:
+            candidates = [
+                row for row in by_amount.get(line.amount, ())
+                if row['id'] not in claimed and in_window(line, row)
+            ]
+        if line.paid_at is not None:
+            candidates.sort(key=lambda row: abs(line.paid_at - row['date']))
+        result.queued.append((line, [row['id'] for row in candidates[:MAX_CANDIDATES]]))
+    return result
+
+
+def complete_recharges(pairs, record_entries=True):
+    """Complete (StatementLine, recharge row) pairs in one database transaction.
+
+    Recharges that stopped being pending since matching are returned so the caller
+    can queue them instead.
+    """
+    if not pairs:
+        return [], []
+    now = timezone.now()
+    with db_transaction.atomic():
+        recharge_ids = [row['id'] for _, row in pairs]
+        still_pending = set()
+        for start in range(0, len(recharge_ids), BATCH_SIZE):
+            still_pending.update(
+                Recharge.objects.select_for_update()
+                .filter(id__in=recharge_ids[start:start + BATCH_SIZE], status='Pending')
+                .values_list('id', flat=True)
+            )
+        completed = [(line, row) for line, row in pairs if row['id'] in still_pending]
+        stale = [(line, row) for line, row in pairs if row['id'] not in still_pending]
+
+        transactions = []
+        recharges = []
+        credits = defaultdict(Decimal)
+        for line, row in completed:
+            transactions.append(Transaction(
+                id=row['transaction_id'],
+                airtel_transaction_id=line.receipt,
+                status='COMPLETED',
+                phone_number=row['transaction__phone_number'] or line.phone_number,
+            ))
+            recharges.append(Recharge(id=row['id'], status='Completed'))
+            credits[row['user_id']] += row['amount']
+        Transaction.objects.bulk_update(transactions, ['airtel_transaction_id', 'status', 'phone_number'], batch_size=BATCH_SIZE)
+        Recharge.objects.bulk_update(recharges, ['status'], batch_size=BATCH_SIZE)
+
+        # Credit each wallet once with the sum of its matched recharges, creating the
+        # missing ones first so a completed recharge is never left uncredited
+        wallets = []
+        first_recharges = []
+        user_ids = list(credits)
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            batch = user_ids[start:start + BATCH_SIZE]
+            missing = set(batch).difference(Wallet.objects.filter(user_id__in=batch).values_list('user_id', flat=True))
+            if missing:
+                Wallet.objects.bulk_create([Wallet(user_id=user_id) for user_id in missing], ignore_conflicts=True)
+                logger.info("Created wallets for %s users with matched recharges", len(missing))
+            for wallet_id, user_id, has_recharged in Wallet.objects.filter(user_id__in=user_ids[start:start + BATCH_SIZE]).values_list('id', 'user_id', 'has_recharged'):
+                wallets.append(Wallet(id=wallet_id, balance=F('balance') + credits[user_id], has_recharged=True))
+                if not has_recharged:
+                    first_recharges.append(user_id)
+        Wallet.objects.bulk_update(wallets, ['balance', 'has_recharged'], batch_size=BATCH_SIZE)
+        record_first_recharges(first_recharges)
+        # bulk_update skips post_save, so wake status streams and bump data versions explicitly
+        for user_id in credits:
+            notify_user(user_id)
+        bump_data_version(*credits)
+
+        if record_entries:
+            StatementEntry.objects.bulk_create([
+                StatementEntry(
+                    receipt=line.receipt,
+                    amount=line.amount,
+                    phone_number=line.phone_number,
+                    paid_at=line.paid_at,
+                    raw_line=line.raw_line,
+                    status='Matched',
+                    recharge_id=row['id'],
+                    date=now,
+                )
+                for line, row in completed
+            ], batch_size=BATCH_SIZE)
+    logger.info("Reconciliation completed %s recharges across %s wallets", len(completed), len(credits))
+    return completed, stale
+
+
+def queue_lines(queued):
+    """Store ambiguous or unmatched lines with their candidate recharges for review."""
+    if not queued:
+        return []
+    entries = StatementEntry.objects.bulk_create([
+        StatementEntry(
+            receipt=line.receipt,
+            amount=line.amount,
+            phone_number=line.phone_number,
+            paid_at=line.paid_at,
+            raw_line=line.raw_line,
+            status='Queued',
+        )
+        for line, _ in queued
+    ], batch_size=BATCH_SIZE)
+    # bulk_create does not return ids on every backend, so look them up by receipt
+    entry_ids = dict(StatementEntry.objects.filter(receipt__in=[line.receipt for line, _ in queued]).values_list('receipt', 'id'))
+    through = StatementEntry.candidates.through
+    through.objects.bulk_create([
+        through(statemententry_id=entry_ids[line.receipt], recharge_id=recharge_id)
+        for line, candidate_ids in queued
+        for recharge_id in candidate_ids
+    ], batch_size=BATCH_SIZE)
+    return entries
+
+
+def reconcile(text, fmt='auto', window=DEFAULT_WINDOW, dry_run=False):
+    """Parse a statement, complete confident matches in bulk and queue the rest."""
+    lines = parse_statement(text, fmt)
+    result = match_lines(lines, window)
+    if dry_run:
+        return result
+    with db_transaction.atomic():
+        completed, stale = complete_recharges(result.matched)
+        result.matched = completed
+        result.queued.extend((line, [row['id']]) for line, row in stale)
+        queue_lines(result.queued)
+    return result
+
+
+def entry_problem(entry):
+    """Why a queued statement entry can't complete its assigned recharge, or None if it can."""
+    recharge = entry.recharge
+    if entry.status != 'Queued' or recharge is None or recharge.status != 'Pending' or recharge.transaction_id is None:
+        return 'needs a pending recharge assigned before it can be completed'
+    if recharge.amount != entry.amount:
+        # The wallet is credited with the recharge amount, so a wrong assignment would pay the wrong sum
+        return f'paid {entry.amount} KSh but its recharge is for {recharge.amount} KSh'
+    return None
+
+
+def complete_entry(entry):
+    """Complete the recharge an admin assigned to a queued statement entry."""
+    problem = entry_problem(entry)
+    if problem is not None:
+        logger.warning("Statement line %s not completed: %s", entry.receipt, problem)
+        return False
+    recharge = entry.recharge
+    transaction = recharge.transaction
+    row = {
+        'id': recharge.id,
+        'user_id': recharge.user_id,
+        'amount': recharge.amount,
+        'transaction_id': recharge.transaction_id,
+        'transaction__phone_number': transaction.phone_number,
+    }
+    line = StatementLine(entry.receipt, entry.amount, entry.phone_number, entry.paid_at, entry.raw_line)
+    with db_transaction.atomic():
+        completed, _ = complete_recharges([(line, row)], record_entries=False)
+        if not completed:
+            return False
+        StatementEntry.objects.filter(id=entry.id).update(status='Matched')
+    return True
@@ -0,0 +1,99 @@
+# core/referrals.py
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import DecimalField, Sum
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast
+
+from .models import Referral, Wallet, ExchangeReward, ArchivedRecord, VIP_INVITEE_FIELDS
+from .sharding import fan_out
+
+BATCH_SIZE = 1000
+
+REFERRAL_BONUS_TYPE = 'Referral Bonus'
+
+STATS_FIELDS = [*VIP_INVITEE_FIELDS.values(), 'recharged_invitees', 'bonus_earned']
+
+Invitee = Referral.invitees.through
+
+
+def _chunks(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def recharged_users(user_ids):
+    """The subset of `user_ids` whose wallets have been recharged, from every shard."""
+    recharged = set()
+    for chunk in _chunks(user_ids):
+        for found in fan_out(lambda alias: list(Wallet.objects.using(alias).filter(user_id__in=chunk, has_recharged=True).values_list('user_id', flat=True))):
+            recharged.update(found)
+    return recharged
+
+
+def bonuses_earned(user_ids):
+    """Referral bonuses credited to each of `user_ids`, hot and archived rewards alike."""
+    earned = defaultdict(Decimal)
+
+    def totals(alias):
+        hot = (
+            ExchangeReward.objects.using(alias).filter(user_id__in=user_ids, type=REFERRAL_BONUS_TYPE)
+            .values('user_id').order_by().annotate(total=Sum('amount'))
+        )
+        archived = (
+            ArchivedRecord.objects.using(alias).filter(user_id__in=user_ids, kind='exchange_reward', payload__type=REFERRAL_BONUS_TYPE)
+            .values('user_id').order_by().annotate(total=Sum(Cast(KT('payload__amount'), DecimalField(max_digits=14, decimal_places=2))))
+        )
+        return [(row['user_id'], row['total']) for rows in (hot, archived) for row in rows]
+
+    for rows in fan_out(totals):
+        for user_id, total in rows:
+            earned[user_id] += total or 0
+    return earned
+
+
+def refresh_batch(referrals):
+    """Recompute the stats columns of `referrals` (Referral instances) and save the changed ones."""
+    stats = {referral.pk: dict.fromkeys(STATS_FIELDS, 0) for referral in referrals}
+
+    # The invitees, with the VIP level of their own Referral, in one joined query
+    invitees = list(Invitee.objects.filter(referral_id__in=stats).values_list('referral_id', 'user_id', 'user__referral__vip_level'))
+    recharged = recharged_users(user_id for _, user_id, _ in invitees)
+    for referral_id, user_id, level in invitees:
+        stats[referral_id][VIP_INVITEE_FIELDS.get(level, 'vip0_invitees')] += 1
+        if user_id in recharged:
+            stats[referral_id]['recharged_invitees'] += 1
+
+    earned = bonuses_earned([referral.user_id for referral in referrals])
+    # bulk_update() compiles a CASE per row and field; most referrals share their stats
+    # (no invitees at all, typically), so send one UPDATE per distinct set of values instead
+    changed = defaultdict(list)
+    for referral in referrals:
+        values = stats[referral.pk]
+        values['bonus_earned'] = earned.get(referral.user_id, Decimal('0.00'))
+        if any(getattr(referral, field) != values[field] for field in STATS_FIELDS):
+            changed[tuple(values[field] for field in STATS_FIELDS)].append(referral.pk)
+    for values, ids in changed.items():
+        Referral.objects.filter(pk__in=ids).update(**dict(zip(STATS_FIELDS, values)))
+    return sum(len(ids) for ids in changed.values())
+
+
+def refresh_referral_stats(batch_size=BATCH_SIZE):
+    """Recompute every referral's stats columns, in batches of referrals by id.
+
+    Returns (referrals checked, referrals whose stats changed).
+
+    Counts updated concurrently for a batch while it is being recomputed may be
+    overwritten; run it when invites and recharges are quiet.
+    """
+    checked = changed = 0
+    last_id = 0
+    while True:
+        referrals = list(Referral.objects.filter(id__gt=last_id).order_by('id').only('id', 'user_id', *STATS_FIELDS)[:batch_size])
+        if not referrals:
+            return checked, changed
+        changed += refresh_batch(referrals)
+        checked += len(referrals)
+        last_id = referrals[-1].pk
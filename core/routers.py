@@ -0,0 +1,82 @@
+# core/routers.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+REPLICA_ALIAS = 'replica'
+
+# Set while a read-only view opted into the replica is running
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_enabled():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def _sticky_key(user_id):
+    return f'replica-sticky:{user_id}'
+
+
+def _sticky_cache():
+    # Every worker must see the marks, whichever served the write
+    return caches[settings.REPLICA_STICKY_CACHE]
+
+
+def mark_write(user_id):
+    """Pin the user's reads to the primary until the replica has caught up with their write."""
+    if user_id is not None and replica_enabled():
+        _sticky_cache().set(_sticky_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_sticky(user_id):
+    return user_id is not None and _sticky_cache().get(_sticky_key(user_id)) is not None
+
+
+@contextmanager
+def use_replica():
+    token = _use_replica.set(replica_enabled())
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    """Send reads to the replica only inside `use_replica()`; everything else uses the primary."""
+
+    def db_for_read(self, model, **hints):
+        return REPLICA_ALIAS if _use_replica.get() else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary (replication or sync_sqlite_replica)
+        return db == 'default'
+
+
+class ReplicaReadMixin:
+    """Serve a view's GET/HEAD requests from the replica.
+
+    Users who wrote within the last REPLICA_STICKY_SECONDS keep reading from the
+    primary so they see their own changes.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD') and replica_enabled() and not is_sticky(request.user.pk):
+            self._replica_token = _use_replica.set(True)
+
+    def dispatch(self, request, *args, **kwargs):
+        self._replica_token = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._replica_token is not None:
+                _use_replica.reset(self._replica_token)
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Product, Wallet, Referral, UserProduct, UserProfile, Recharge, Withdrawal, ExchangeReward, Deposit, Transaction
+from .models import Product, Wallet, Referral, UserProduct, UserProfile, Recharge, Withdrawal, ExchangeReward, Deposit, Transaction, VIP_INVITEE_FIELDS
 from django.contrib.auth.models import User
 
 # Serializer for nesting user data (used in ReferralSerializer for invitees)
@@ -55,13 +55,22 @@ class WalletRechargeSerializer(serializers.Serializer):
     class Meta:
         fields = ['amount', 'phone_number']
 
-# Serializer for Referral model (includes nested invitees with usernames)
+# Serializer for Referral model: the precomputed invitee stats; invitees are listed by InviteeSerializer
 class ReferralSerializer(serializers.ModelSerializer):
-    invitees = UserSerializer(many=True, read_only=True)
+    invitees_by_vip = serializers.SerializerMethodField()
 
     class Meta:
         model = Referral
-        fields = ['referral_code', 'referrals_count', 'vip_level', 'invitees']
+        fields = ['referral_code', 'referrals_count', 'vip_level', 'invitees_by_vip', 'recharged_invitees', 'bonus_earned']
+
+    def get_invitees_by_vip(self, referral):
+        return {level: getattr(referral, field) for level, field in VIP_INVITEE_FIELDS.items()}
+
+# Serializer for invitee rows: values() of the referral's invitee through table, joined to user and profile
+class InviteeSerializer(serializers.Serializer):
+    id = serializers.IntegerField(source='user_id')
+    username = serializers.CharField(source='user__username')
+    phone_number = serializers.CharField(source='user__profile__phone_number', allow_null=True)
 
 # Serializer for UserProduct model (includes nested product details)
 class UserProductSerializer(serializers.ModelSerializer):
@@ -0,0 +1,161 @@
+# core/sharding.py
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections, router, transaction as db_transaction
+
+# Tables whose rows belong to one user: a user's rows live on shard user_id % N.
+# Everything else (users, tokens, profiles, referrals, products, tasks) stays on
+# 'default', the directory database.
+SHARDED_MODELS = {
+    'core.wallet', 'core.userproduct', 'core.transaction', 'core.recharge', 'core.withdrawal',
+    'core.exchangereward', 'core.deposit', 'core.archivedrecord', 'core.monthlysummary',
+}
+
+# Directory tables copied to every shard, so foreign keys and joins such as
+# select_related('user'), user__profile__phone_number or product__price resolve
+# inside the shard. A profile's data_version is bumped with update() and is only
+# current in the directory, where every read of it goes.
+REFERENCE_MODELS = {'auth.user', 'core.userprofile', 'core.product'}
+
+# The shard per-user queries without an instance to route by go to. Set for the
+# authenticated user by core.authentication, or explicitly by jobs.
+_pinned_shard = ContextVar('pinned_shard', default=None)
+
+
+def shard_aliases():
+    return settings.SHARD_ALIASES
+
+
+def shard_for(user_id):
+    """The user's shard alias, or None when sharding is off."""
+    aliases = settings.SHARD_ALIASES
+    if not aliases or user_id is None:
+        return None
+    return aliases[user_id % len(aliases)]
+
+
+def pin(user_id):
+    """Route the rest of this request's per-user queries to the user's shard.
+
+    ShardPinMiddleware scopes the pin to one request.
+    """
+    _pinned_shard.set(shard_for(user_id))
+
+
+@contextmanager
+def on_shard(alias):
+    token = _pinned_shard.set(alias)
+    try:
+        yield
+    finally:
+        _pinned_shard.reset(token)
+
+
+def for_user(user_id):
+    return on_shard(shard_for(user_id))
+
+
+def atomic_for(model):
+    """transaction.atomic() on the database the model's rows currently route to.
+
+    A plain atomic() only covers the directory; writes and select_for_update()
+    on a shard need their transaction opened there.
+    """
+    return db_transaction.atomic(using=router.db_for_write(model))
+
+
+def fan_out(fn):
+    """Call fn(alias) on every shard in parallel threads; results come back in shard order.
+
+    Without sharding fn(None) runs once on this thread, and the None alias
+    leaves the choice of primary or replica to the routers as usual.
+    """
+    aliases = shard_aliases()
+    if not aliases:
+        return [fn(None)]
+
+    def run(alias):
+        try:
+            return fn(alias)
+        finally:
+            # Connections are per thread; close the ones this worker opened
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=len(aliases)) as pool:
+        return list(pool.map(run, aliases))
+
+
+def find_shard(model, **filters):
+    """The shard holding a row that matches `filters`, for lookups by something other than the user."""
+    if not shard_aliases():
+        return None
+    for alias, found in zip(shard_aliases(), fan_out(lambda alias: model._default_manager.using(alias).filter(**filters).exists())):
+        if found:
+            return alias
+    return None
+
+
+def replicate(instance):
+    """Copy a directory row (user, product) to every shard, inserting or updating it."""
+    model = type(instance)
+    values = {field.attname: getattr(instance, field.attname) for field in model._meta.concrete_fields if not field.primary_key}
+    for alias in shard_aliases():
+        rows = model._base_manager.using(alias)
+        # update() and bulk_create() send no signals, so this does not recurse
+        if not rows.filter(pk=instance.pk).update(**values):
+            rows.bulk_create([model(pk=instance.pk, **values)])
+
+
+def remove_replicas(instance):
+    for alias in shard_aliases():
+        type(instance)._base_manager.using(alias).filter(pk=instance.pk).delete()
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+class ShardRouter:
+    """Route per-user models to the shard of the user they belong to.
+
+    The user comes from the instance hint when Django passes one (saves,
+    related lookups), otherwise from the pinned shard. Unpinned queries on
+    per-user models fall through to the directory, which holds none of their
+    rows once sharding is on: use fan_out() or on_shard() for those.
+    """
+
+    def _shard(self, model, hints):
+        if _label(model) not in SHARDED_MODELS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None:
+            if instance._state.db in settings.SHARD_ALIASES:
+                return instance._state.db
+            user_id = instance.pk if _label(type(instance)) == 'auth.user' else getattr(instance, 'user_id', None)
+            if user_id is not None:
+                return shard_for(user_id)
+        return _pinned_shard.get()
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        sharded = [_label(type(obj)) in SHARDED_MODELS for obj in (obj1, obj2)]
+        if all(sharded):
+            return obj1._state.db == obj2._state.db
+        if any(sharded):
+            # The other side is a directory row, replicated to every shard
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Shards get the full schema: per-user tables plus the replicated reference tables
+        if db in settings.SHARD_ALIASES:
+            return True
+        return None
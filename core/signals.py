@@ -1,12 +1,84 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Referral
+from rest_framework.authtoken.models import Token
+from .authentication import invalidate_token, invalidate_user
+from .models import Referral, Recharge, Withdrawal, Transaction, Wallet, ExchangeReward, Deposit, UserProfile, Product
+from .conditional import bump_data_version
+from .notifications import notify_user
+from .routers import mark_write
+from .sharding import replicate, remove_replicas, shard_aliases
 
 @receiver(post_save, sender=User)
 def create_referral(sender, instance, created, **kwargs):
     if created:
         Referral.objects.get_or_create(user=instance)
 
+# Cached token snapshots must not outlive is_active toggles, password changes or deleted tokens
+@receiver(post_save, sender=User)
+def invalidate_cached_tokens(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_user(instance.pk)
+        # set_password() keeps the new raw password until the save completes: a new
+        # password revokes the user's tokens as it ends their other sessions
+        if instance._password is not None:
+            Token.objects.filter(user=instance).delete()
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+# Wake the owner's status streams whenever a payment row changes; callbacks and admin
+# actions write on the owner's behalf, so their reads also stick to the primary
+@receiver(post_save, sender=Recharge)
+@receiver(post_save, sender=Withdrawal)
+@receiver(post_save, sender=Transaction)
+def notify_status_change(sender, instance, **kwargs):
+    notify_user(instance.user_id)
+    mark_write(instance.user_id)
+
+# Conditional GETs on wallet/history endpoints revalidate against the profile's data_version.
+# Deletes are left out: archiving removes rows without changing what the endpoints return.
+@receiver(post_save, sender=Wallet)
+@receiver(post_save, sender=Recharge)
+@receiver(post_save, sender=Withdrawal)
+@receiver(post_save, sender=Transaction)
+@receiver(post_save, sender=ExchangeReward)
+@receiver(post_save, sender=Deposit)
+def bump_user_data_version(sender, instance, using, **kwargs):
+    bump_data_version(instance.user_id, using=using)
+
+# The phone number is part of the funding history payload
+@receiver(post_save, sender=UserProfile)
+def bump_profile_data_version(sender, instance, created, **kwargs):
+    if not created:
+        bump_data_version(instance.user_id)
+
+# Users, profiles and products are mastered in the directory and copied to every shard.
+# Queryset update()/delete() bypasses these; run `replicate_references` afterwards.
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Product)
+def replicate_reference_row(sender, instance, using, created, **kwargs):
+    if shard_aliases() and using not in shard_aliases():
+        replicate(instance)
+        if sender is User and created:
+            # The new user's profile was saved before the user reached the shards
+            profile = UserProfile.objects.filter(user=instance).first()
+            if profile is not None:
+                replicate(profile)
+
+@receiver(post_save, sender=UserProfile)
+def replicate_profile(sender, instance, using, created, **kwargs):
+    # A profile created with its user is copied along with the user, above
+    if shard_aliases() and using not in shard_aliases() and not created:
+        replicate(instance)
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=UserProfile)
+@receiver(post_delete, sender=Product)
+def remove_reference_row(sender, instance, using, **kwargs):
+    if shard_aliases() and using not in shard_aliases():
+        remove_replicas(instance)
+
 # Register the signal
-default_app_config = 'core.apps.CoreConfig'
\ No newline at end of file
+default_app_config = 'core.apps.CoreConfig'
@@ -0,0 +1,180 @@
+# core/tasks.py
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task, Referral, Wallet, Transaction, ExchangeReward
+from .sharding import atomic_for, for_user
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class LeaseLost(Exception):
+    """The task's lease expired and another worker took it over."""
+
+
+def task(name):
+    """Register a function as a task handler. It is called with the task payload as keyword arguments."""
+    def register(fn):
+        _registry[name] = fn
+        return fn
+    return register
+
+
+def enqueue(name, payload=None, delay=0, max_attempts=None):
+    """Queue a task. Call inside the request's transaction so it is only queued if that commits.
+
+    Without a worker service (TASK_WORKER off), due tasks run in this process once
+    that transaction commits.
+    """
+    if name not in _registry:
+        raise LookupError(f'Unknown task: {name}')
+    task_row = Task.objects.create(
+        name=name,
+        payload=payload or {},
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.TASK_MAX_ATTEMPTS,
+    )
+    if not settings.TASK_WORKER:
+        db_transaction.on_commit(run_inline, robust=True)
+    return task_row
+
+
+def backoff(attempts):
+    """Seconds to wait before retry number `attempts`: exponential with jitter, capped."""
+    delay = min(settings.TASK_RETRY_BASE_SECONDS * 2 ** (attempts - 1), settings.TASK_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim(worker_id, batch_size):
+    """Take up to `batch_size` due tasks for this worker.
+
+    On PostgreSQL, SKIP LOCKED lets concurrent workers claim disjoint batches
+    without waiting on each other; the status guard on the update keeps
+    backends without row locks (SQLite) from double-claiming.
+    """
+    now = timezone.now()
+    with db_transaction.atomic():
+        ids = list(
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(status='Queued', run_at__lte=now)
+            .order_by('run_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        Task.objects.filter(id__in=ids, status='Queued').update(
+            status='Running', locked_at=now, locked_by=worker_id, attempts=F('attempts') + 1
+        )
+    return list(Task.objects.filter(id__in=ids, status='Running', locked_by=worker_id).order_by('run_at'))
+
+
+def run(task_row, worker_id):
+    """Run one claimed task. Returns True when it succeeded."""
+    handler = _registry.get(task_row.name)
+    ours = Task.objects.filter(id=task_row.id, status='Running', locked_by=worker_id)
+    try:
+        # The handler's writes to the default database and the Done mark commit together.
+        # Writes it makes to a shard commit on their own, before this: handlers must make
+        # those idempotent, as a failure after they commit retries the whole task.
+        with db_transaction.atomic():
+            if handler is None:
+                raise LookupError(f'Unknown task: {task_row.name}')
+            handler(**task_row.payload)
+            if not ours.update(status='Done', locked_at=None, last_error=''):
+                raise LeaseLost()
+        return True
+    except LeaseLost:
+        logger.warning("Task %s #%s was taken over by another worker; rolled back", task_row.name, task_row.id)
+        return False
+    except Exception as e:
+        error = traceback.format_exc()
+        if task_row.attempts >= task_row.max_attempts:
+            ours.update(status='Dead', locked_at=None, last_error=error)
+            logger.error("Task %s #%s failed for good after %s attempts: %s", task_row.name, task_row.id, task_row.attempts, e)
+        else:
+            retry_at = timezone.now() + timedelta(seconds=backoff(task_row.attempts))
+            ours.update(status='Queued', locked_at=None, locked_by='', run_at=retry_at, last_error=error)
+            logger.warning("Task %s #%s failed (attempt %s), retrying at %s: %s", task_row.name, task_row.id, task_row.attempts, retry_at, e)
+        return False
+
+
+def run_inline():
+    """Stand in for `run_tasks` in the web process: run up to TASK_INLINE_BATCH due tasks.
+
+    Delayed tasks and retries run on a later call, when the next task is queued.
+    """
+    worker_id = f'inline:{socket.gethostname()}:{os.getpid()}'
+    reclaim_stale()
+    for task_row in claim(worker_id, settings.TASK_INLINE_BATCH):
+        run(task_row, worker_id)
+
+
+def reclaim_stale():
+    """Requeue tasks whose worker died mid-run (lease expired); out of attempts means dead.
+
+    Leases aren't renewed: TASK_LEASE_SECONDS must outlive the slowest handler, or a
+    task still running gets requeued and the first run's Done mark is rolled back.
+    """
+    expired = Task.objects.filter(status='Running', locked_at__lt=timezone.now() - timedelta(seconds=settings.TASK_LEASE_SECONDS))
+    dead = expired.filter(attempts__gte=F('max_attempts')).update(status='Dead', locked_at=None, last_error='Lease expired')
+    requeued = expired.update(status='Queued', locked_at=None, locked_by='', run_at=timezone.now())
+    return requeued, dead
+
+
+@task('referral_bonus')
+def credit_referral_bonus(user_id, referral_code):
+    """Record the invite and credit the referrer's bonus for a new user's registration."""
+    user = User.objects.get(id=user_id)
+    try:
+        referrer = Referral.objects.select_related('user').get(referral_code=referral_code)
+    except Referral.DoesNotExist:
+        logger.warning("Invalid referral code provided: %s", referral_code)
+        return
+    referrer.invitees.add(user)
+    referrer.increment_referrals()
+    logger.info("User %s registered with referral code from %s", user.username, referrer.user.username)
+
+    # Referral Bonus: KSh 200 for the referrer, written on the referrer's shard. That commits
+    # apart from the task, so a retry finds the reward keyed by the invitee and doesn't pay twice.
+    referral_bonus = 200
+    reference = f'referral:{user.id}'
+    with for_user(referrer.user_id), atomic_for(Wallet):
+        referrer_wallet, _ = Wallet.objects.select_for_update().get_or_create(user=referrer.user)
+        if ExchangeReward.objects.filter(reference=reference).exists():
+            logger.info("Referral bonus for %s already credited to %s", user.username, referrer.user.username)
+            credited = False
+        else:
+            referrer_wallet.balance += referral_bonus
+            referrer_wallet.save()
+            referrer_transaction = Transaction.objects.create(
+                user=referrer.user,
+                amount=referral_bonus,
+                transaction_type='EXCHANGE_REWARD',
+                status='COMPLETED'
+            )
+            ExchangeReward.objects.create(
+                user=referrer.user,
+                amount=referral_bonus,
+                transaction=referrer_transaction,
+                type='Referral Bonus',
+                reference=reference
+            )
+            credited = True
+    # The invitee may have recharged before this ran, while not yet linked to the referrer
+    with for_user(user.id):
+        recharged = Wallet.objects.filter(user=user, has_recharged=True).exists()
+    # The invite's stats live in the default database, so they commit (or roll back) with the task
+    referrer.record_invite(user, referral_bonus, recharged)
+    if credited:
+        logger.info("Referral bonus of %s KSh credited to %s", referral_bonus, referrer.user.username)
@@ -0,0 +1,101 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Sum
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.archive import archive_before, months_ago
+from core.models import ArchivedRecord, Deposit, ExchangeReward, MonthlySummary, Recharge, Transaction, Wallet, Withdrawal
+from core.serializers import TransactionSerializer
+
+HISTORY = ('/api/funding-details/', '/api/withdrawal-history/', '/api/exchange-rewards/', '/api/deposit-status/')
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('saver', password='x')
+        self.admin = User.objects.create_user('admin', password='x', is_staff=True)
+        Wallet.objects.create(user=self.user, balance=0)
+        self.now = timezone.now()
+        self.cutoff = months_ago(self.now, 3)
+        self.age = 0
+
+        self.recharge('COMPLETED', 'Completed', 500)
+        self.recharge('REJECTED', 'Rejected', 300)  # As AdminApproveTransactionView rejects one
+        # Approved or rejected from the dashboard: only the transaction changes
+        self.withdrawal('COMPLETED', 200)
+        self.withdrawal('REJECTED', 100)
+        self.pending_withdrawal = self.withdrawal('PENDING', 50)
+        self.old(ExchangeReward.objects.create(user=self.user, amount=200, type='New User Bonus',
+                                               transaction=self.transaction('EXCHANGE_REWARD', 'COMPLETED', 200)))
+        self.old(Deposit.objects.create(user=self.user, amount=150, status='Completed',
+                                        transaction=self.transaction('DEPOSIT', 'COMPLETED', 150)))
+        # Recent enough to stay hot
+        self.recent = Transaction.objects.create(user=self.user, amount=80, transaction_type='RECHARGE', status='COMPLETED')
+        Recharge.objects.create(user=self.user, amount=80, status='Completed', transaction=self.recent)
+
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def old(self, row):
+        """Backdate a row (and its transaction) to before the cutoff, a day apart from the others."""
+        self.age += 1
+        when = self.cutoff - timedelta(days=self.age)
+        type(row).objects.filter(pk=row.pk).update(date=when)
+        Transaction.objects.filter(pk=row.transaction_id).update(timestamp=when)
+        return row
+
+    def transaction(self, transaction_type, status, amount, fee=0):
+        return Transaction.objects.create(user=self.user, amount=amount, transaction_type=transaction_type, status=status,
+                                          fee=fee, airtel_transaction_id=f'TX{Transaction.objects.count()}')
+
+    def recharge(self, tx_status, status, amount):
+        return self.old(Recharge.objects.create(user=self.user, amount=amount, status=status,
+                                                transaction=self.transaction('RECHARGE', tx_status, amount)))
+
+    def withdrawal(self, tx_status, amount):
+        transaction = self.transaction('WITHDRAWAL', tx_status, amount - 5, fee=5)
+        return self.old(Withdrawal.objects.create(user=self.user, requested_amount=amount, amount=amount - 5,
+                                                  phone_number='0712345678', transaction=transaction))
+
+    def responses(self):
+        self.api.force_authenticate(self.user)
+        responses = {path: self.api.get(path).json() for path in HISTORY}
+        self.api.force_authenticate(self.admin)
+        responses['dashboard'] = self.api.get('/api/admin/dashboard/').json()['stats']
+        return responses
+
+    def test_archiving_keeps_histories_and_totals(self):
+        before = self.responses()
+        old = list(Transaction.objects.filter(timestamp__lt=self.cutoff).exclude(status='PENDING').order_by('id'))
+        serialized = {row['id']: row for row in TransactionSerializer(old, many=True).data}
+        totals = {
+            (row['transaction_type'], row['status']): (row['count'], row['total'], row['fees'])
+            for row in Transaction.objects.filter(pk__in=serialized).values('transaction_type', 'status')
+            .annotate(count=Count('id'), total=Sum('amount'), fees=Sum('fee'))
+        }
+
+        self.assertEqual(archive_before(self.cutoff), (6, 6 + 6))
+
+        # Only the recent transaction and the withdrawal still in progress stay hot
+        self.assertEqual(set(Transaction.objects.values_list('pk', flat=True)), {self.recent.pk, self.pending_withdrawal.transaction_id})
+        self.assertEqual(list(Withdrawal.objects.values_list('pk', flat=True)), [self.pending_withdrawal.pk])
+        self.assertEqual(self.responses(), before)
+        for source_id, payload in ArchivedRecord.objects.filter(kind='transaction').values_list('source_id', 'payload'):
+            self.assertEqual(payload, dict(serialized[source_id]))
+        self.assertEqual({
+            (summary.transaction_type, summary.status): (summary.count, summary.total_amount, summary.total_fee)
+            for summary in MonthlySummary.objects.filter(user=self.user)
+        }, totals)
+        self.assertEqual(before['dashboard']['totalRecharges'], 580.0)
+        self.assertEqual(before['dashboard']['totalWithdrawals'], 195.0)
+
+    def test_pending_rows_stay_hot(self):
+        Recharge.objects.filter(status='Completed').update(status='Pending')
+        archive_before(self.cutoff)
+        self.assertEqual(Recharge.objects.filter(status='Pending').count(), 2)
+        self.assertTrue(Withdrawal.objects.filter(pk=self.pending_withdrawal.pk).exists())
+        self.assertEqual(MonthlySummary.objects.filter(transaction_type='RECHARGE', status='COMPLETED').aggregate(total=Sum('total_amount'))['total'], None)
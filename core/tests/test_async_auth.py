@@ -0,0 +1,81 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+
+from core.models import Task
+
+
+class AsyncRegisterTests(TestCase):
+    def setUp(self):
+        # The signup throttle's buckets live in the cache
+        cache.clear()
+
+    def register(self, **fields):
+        data = {'username': 'alice', 'password': 'a-long-password', 'phone_number': '0700000000', **fields}
+        return self.client.post('/api/async/register/', data, content_type='application/json')
+
+    def test_null_referral_code_is_no_referral(self):
+        response = self.register(referral_code=None)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertFalse(Task.objects.filter(name='referral_bonus').exists())
+
+    def test_referral_code_is_stripped(self):
+        response = self.register(referral_code='  ABC123 ')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Task.objects.get(name='referral_bonus').payload['referral_code'], 'ABC123')
+
+    def test_non_string_referral_code_is_rejected(self):
+        response = self.register(referral_code=123)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('referral_code', response.json())
+        self.assertFalse(User.objects.exists())
+
+    def test_username_is_normalized(self):
+        # NFKC, as create_user() applies: the ligature is stored as 'fi'
+        response = self.register(username='ﬁona')
+        self.assertEqual(response.status_code, 201, response.content)
+        user = User.objects.get()
+        self.assertEqual(user.username, 'fiona')
+        self.assertTrue(user.check_password('a-long-password'))
+
+
+class AsyncLoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='a-long-password')
+
+    def login(self, password='a-long-password'):
+        return self.client.post('/api/async/login/', {'username': 'alice', 'password': password}, content_type='application/json')
+
+    def test_login_records_last_login(self):
+        self.assertIsNone(self.user.last_login)
+        response = self.login()
+        self.assertEqual(response.status_code, 200, response.content)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_failed_login_leaves_last_login(self):
+        self.assertEqual(self.login('wrong-password').status_code, 400)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+
+    def test_outdated_hash_is_upgraded(self):
+        # Hashed with a hasher that is still accepted but no longer preferred
+        User.objects.filter(pk=self.user.pk).update(password=make_password('a-long-password', hasher='pbkdf2_sha1'))
+        token = Token.objects.create(user=self.user)
+        response = self.login()
+        self.assertEqual(response.status_code, 200, response.content)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(self.user.check_password('a-long-password'))
+        # A re-hash is not a password change: the existing token carries on
+        self.assertEqual(response.json()['token'], token.key)
+        self.assertTrue(Token.objects.filter(pk=token.pk).exists())
+
+    def test_current_hash_is_kept(self):
+        password = self.user.password
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, password)
@@ -0,0 +1,80 @@
+import io
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import Max, Min
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.archive import archive_before
+from core.audit import audit_range
+from core.models import Product, Transaction, UserProduct, Wallet, Withdrawal
+
+
+class AuditTests(TestCase):
+    def setUp(self):
+        call_command('seed_data', users=40, seed=7, stdout=io.StringIO())
+        self.users = User.objects.filter(username__startswith='seed7-')
+        self.admin = User.objects.create_user('admin', password='x', is_staff=True)
+        self.api = APIClient()
+
+    def drift(self):
+        bounds = Wallet.objects.aggregate(low=Min('user_id'), high=Max('user_id'))
+        audited, drift = audit_range('default', bounds['low'], bounds['high'] + 1)
+        self.assertEqual(audited, Wallet.objects.count())
+        return drift
+
+    def earner(self):
+        """A seeded user who can withdraw: WithdrawalView checks the balance, Withdrawal.save the income."""
+        return Wallet.objects.filter(user__in=self.users, balance__gte=500, income__gte=500).select_related('user').first().user
+
+    def withdraw(self, user, amount):
+        self.api.force_authenticate(user)
+        response = self.api.post('/api/wallets/withdraw/', {'amount': amount, 'phone_number': '0712345678'}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return Withdrawal.objects.filter(user=user).latest('id')
+
+    def approve(self, withdrawal, status):
+        self.api.force_authenticate(self.admin)
+        response = self.api.post('/api/admin/approve-transaction/', {'type': 'pendingWithdrawals', 'id': withdrawal.pk, 'status': status}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_seeded_wallets_have_no_drift(self):
+        self.assertTrue(Withdrawal.objects.filter(status='Approved').exists())
+        self.assertEqual(self.drift(), [])
+
+    def test_drift_is_reported_exactly(self):
+        wallet = Wallet.objects.filter(user__in=self.users).order_by('user_id').first()
+        Wallet.objects.filter(pk=wallet.pk).update(balance=wallet.balance + 25, income=wallet.income - Decimal('3.50'))
+        self.assertEqual(self.drift(), [(wallet.user_id, wallet.balance + 25, wallet.balance, wallet.income - Decimal('3.50'), wallet.income)])
+
+    def test_price_changes_do_not_drift(self):
+        self.assertTrue(UserProduct.objects.exists())
+        Product.objects.update(price=1)
+        self.assertEqual(self.drift(), [])
+
+    def test_dashboard_settled_withdrawals_follow_the_views(self):
+        user = self.earner()
+        # Approving from the dashboard only completes the transaction
+        self.approve(self.withdraw(user, '200'), 'COMPLETED')
+        self.assertEqual(self.drift(), [])
+        # Rejecting one refunds its net amount to the balance
+        rejected = self.withdraw(user, '200')
+        self.approve(rejected, 'REJECTED')
+        self.assertEqual(Transaction.objects.get(pk=rejected.transaction_id).status, 'REJECTED')
+        self.assertEqual(self.drift(), [])
+
+    def test_admin_approved_withdrawals_debit_income(self):
+        user = self.earner()
+        withdrawal = self.withdraw(user, '200')
+        Transaction.objects.filter(pk=withdrawal.transaction_id).update(airtel_transaction_id='AT-1')
+        withdrawal.refresh_from_db()
+        withdrawal.status = 'Approved'
+        withdrawal.save()
+        self.assertEqual(self.drift(), [])
+
+    def test_archived_history_still_counts(self):
+        archive_before(timezone.now())
+        self.assertEqual(self.drift(), [])
@@ -0,0 +1,75 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from core.models import Product, UserProduct, Wallet, maturity_date
+
+
+class CartPurchaseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('buyer', password='x')
+        Wallet.objects.create(user=self.user, balance=1000)
+        self.basic = Product.objects.create(name='Basic', cost=100, price=100, daily_income=5, return_rate=5, total_income=150, cycles=30)
+        self.premium = Product.objects.create(name='Premium', cost=300, price=300, daily_income=20, return_rate=7, total_income=1200, cycles=60)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def buy(self, items):
+        return self.api.post('/api/wallets/purchase-cart/', {'items': items}, format='json')
+
+    def balance(self):
+        return Wallet.objects.get(user=self.user).balance
+
+    def test_buys_every_unit_with_one_debit(self):
+        response = self.buy([{'product_id': self.basic.pk, 'quantity': 2}, {'product_id': self.premium.pk}])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Decimal(response.data['total']), Decimal('500.00'))
+        self.assertEqual(self.balance(), Decimal('500.00'))
+        self.assertEqual(UserProduct.objects.filter(user=self.user, product=self.basic).count(), 2)
+        self.assertEqual(UserProduct.objects.filter(user=self.user, product=self.premium).count(), 1)
+
+    def test_repeated_products_are_merged(self):
+        response = self.buy([{'product_id': self.basic.pk}, {'product_id': self.basic.pk, 'quantity': 2}])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['items'], [{'product_id': self.basic.pk, 'name': 'Basic', 'quantity': 3}])
+        self.assertEqual(self.balance(), Decimal('700.00'))
+        self.assertEqual(UserProduct.objects.filter(user=self.user).count(), 3)
+
+    def test_holdings_get_their_maturity_date(self):
+        self.buy([{'product_id': self.basic.pk}, {'product_id': self.premium.pk}])
+        for holding in UserProduct.objects.filter(user=self.user).select_related('product'):
+            self.assertEqual(holding.matures_at, maturity_date(holding.purchase_date, holding.product.cycles))
+
+    def test_insufficient_balance_buys_nothing(self):
+        response = self.buy([{'product_id': self.premium.pk, 'quantity': 4}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Insufficient wallet balance'})
+        self.assertEqual(self.balance(), Decimal('1000.00'))
+        self.assertFalse(UserProduct.objects.exists())
+
+    def test_unknown_product_buys_nothing(self):
+        response = self.buy([{'product_id': self.basic.pk}, {'product_id': 9999}])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['product_ids'], [9999])
+        self.assertEqual(self.balance(), Decimal('1000.00'))
+        self.assertFalse(UserProduct.objects.exists())
+
+    def test_bad_items_are_rejected(self):
+        for items in ([], 'basic', [{'quantity': 1}], [{'product_id': 'x'}], [{'product_id': self.basic.pk, 'quantity': 0}],
+                      [{'product_id': self.basic.pk, 'quantity': -1}], [{'product_id': self.basic.pk, 'quantity': 'two'}]):
+            with self.subTest(items=items):
+                self.assertEqual(self.buy(items).status_code, 400)
+        self.assertEqual(self.balance(), Decimal('1000.00'))
+        self.assertFalse(UserProduct.objects.exists())
+
+    def test_failed_insert_rolls_back_the_debit(self):
+        with mock.patch.object(UserProduct.objects, 'bulk_create', side_effect=RuntimeError('disk full')):
+            response = self.buy([{'product_id': self.basic.pk, 'quantity': 2}])
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.balance(), Decimal('1000.00'))
+        self.assertFalse(UserProduct.objects.exists())
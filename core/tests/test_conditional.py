@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.conditional import bump_data_version
+from core.models import Recharge, Transaction, UserProfile, Wallet
+
+
+class DataVersionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('versioned', password='x')
+        self.other = User.objects.create_user('other', password='x')
+
+    def version(self, user):
+        return UserProfile.objects.get(user=user).data_version
+
+    def test_one_bump_per_user_and_transaction(self):
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                wallet = Wallet.objects.create(user=self.user, balance=100)
+                record = Transaction.objects.create(user=self.user, amount=100, transaction_type='RECHARGE', status='PENDING')
+                Recharge.objects.create(user=self.user, amount=100, transaction=record)
+                wallet.save()
+                Wallet.objects.create(user=self.other)
+        bumps = [query for query in queries.captured_queries if query['sql'].startswith('UPDATE "core_userprofile"')]
+        self.assertEqual(len(bumps), 1)
+        self.assertEqual((self.version(self.user), self.version(self.other)), (1, 1))
+
+    def test_rolled_back_changes_bump_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Wallet.objects.create(user=self.user)
+                try:
+                    with transaction.atomic():
+                        Wallet.objects.create(user=self.other)
+                        raise ValueError
+                except ValueError:
+                    pass
+                # Queued again after the savepoint dropped the first queue
+                bump_data_version(self.other.pk)
+        self.assertEqual((self.version(self.user), self.version(self.other)), (1, 1))
+
+    def test_conditional_get_sees_the_bump(self):
+        api = APIClient()
+        api.force_authenticate(self.user)
+        first = api.get('/api/funding-details/')
+        self.assertEqual(api.get('/api/funding-details/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Recharge.objects.create(user=self.user, amount=50)
+        self.assertEqual(api.get('/api/funding-details/', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
@@ -0,0 +1,77 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework import serializers
+
+from core.fastpath import row_mapper
+from core.models import Deposit, ExchangeReward, Product, Recharge, Transaction, UserProduct, Withdrawal
+from core.serializers import (
+    DepositSerializer, ExchangeRewardSerializer, ProductSerializer, RechargeSerializer, TransactionSerializer,
+    UserProductSerializer, WithdrawalSerializer,
+)
+
+
+class PriceSerializer(serializers.ModelSerializer):
+    """A nullable decimal: holdings bought before their price was recorded have none."""
+
+    class Meta:
+        model = UserProduct
+        fields = ['id', 'price']
+
+
+class RowMapperTests(TestCase):
+    """row_mapper() output must be exactly what the serializer gives for the same rows."""
+
+    def setUp(self):
+        alice = User.objects.create_user('alice')
+        alice.profile.phone_number = '0712345678'
+        alice.profile.save()
+        # No profile at all: the nested phone number is null
+        bob = User.objects.create_user('bob')
+        bob.profile.delete()
+
+        product = Product.objects.create(name='Basic', cost=0, price=Decimal('99.5'), daily_income=5, return_rate=Decimal('7.25'),
+                                         total_income=150, cycles=30)
+        UserProduct.objects.create(user=alice, product=product, cycles_completed=3)
+        UserProduct.objects.bulk_create([UserProduct(user=bob, product=product, active=False)])  # price left null
+
+        completed = Transaction.objects.create(user=alice, amount=Decimal('1500'), transaction_type='RECHARGE', status='COMPLETED',
+                                               phone_number='0712345678', airtel_transaction_id='AT-1')
+        # Null phone number and transaction id
+        pending = Transaction.objects.create(user=bob, amount=Decimal('12.5'), transaction_type='WITHDRAWAL', status='PENDING')
+        Recharge.objects.create(user=alice, amount=1500, transaction=completed, username='alice')
+        Recharge.objects.create(user=bob, amount=Decimal('0.1'))  # No transaction, no username
+        Withdrawal.objects.create(user=bob, requested_amount=Decimal('22.5'), amount=Decimal('12.5'), phone_number='0700000000', transaction=pending)
+        Withdrawal.objects.create(user=alice, requested_amount=100, amount=90, phone_number='0712345678')
+        ExchangeReward.objects.create(user=alice, amount=200, type='New User Bonus')
+        Deposit.objects.create(user=bob, amount=Decimal('75.75'))
+
+    def assertMatchesSerializer(self, serializer_class, queryset):
+        queryset = queryset.order_by('pk')
+        expected = serializer_class(queryset, many=True).data
+        self.assertEqual(len(expected), queryset.count())
+        self.assertEqual(row_mapper(serializer_class).rows(queryset), [dict(row) for row in expected])
+
+    def test_mapped_serializers(self):
+        for serializer_class, model in (
+            (ProductSerializer, Product),
+            (UserProductSerializer, UserProduct),
+            (TransactionSerializer, Transaction),
+            (RechargeSerializer, Recharge),
+            (WithdrawalSerializer, Withdrawal),
+            (ExchangeRewardSerializer, ExchangeReward),
+            (DepositSerializer, Deposit),
+        ):
+            with self.subTest(serializer=serializer_class.__name__):
+                self.assertMatchesSerializer(serializer_class, model.objects.all())
+
+    def test_null_foreign_keys_and_decimals(self):
+        recharge = row_mapper(RechargeSerializer).rows(Recharge.objects.filter(transaction=None))[0]
+        self.assertIsNone(recharge['transaction'])
+        self.assertIsNone(recharge['user']['phone_number'])
+        self.assertEqual(recharge['amount'], '0.10')
+        self.assertIsNone(row_mapper(WithdrawalSerializer).rows(Withdrawal.objects.filter(transaction=None))[0]['transaction'])
+
+        self.assertMatchesSerializer(PriceSerializer, UserProduct.objects.all())
+        self.assertEqual([row['price'] for row in row_mapper(PriceSerializer).rows(UserProduct.objects.order_by('pk'))], ['99.50', None])
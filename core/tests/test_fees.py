@@ -0,0 +1,90 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.fees import FeeSchedule, InvalidAmount, MAX_CENTS, get_fee_schedule, to_cents
+
+TIERS = [
+    {'from': '0', 'percent': '10', 'min_fee': '5'},
+    {'from': '1000', 'percent': '5', 'max_fee': '200'},
+]
+
+
+class ToCentsTests(SimpleTestCase):
+    def test_int_str_and_decimal_are_shillings(self):
+        for value in (500, '500', ' 500 ', Decimal('500'), 500.0, '500.00'):
+            with self.subTest(value=value):
+                self.assertEqual(to_cents(value), 50000)
+
+    def test_rounds_half_up_to_the_cent(self):
+        self.assertEqual(to_cents('10.005'), 1001)
+        self.assertEqual(to_cents('10.004'), 1000)
+
+    def test_rejects_bools(self):
+        for value in (True, False):
+            with self.subTest(value=value), self.assertRaises(InvalidAmount):
+                to_cents(value)
+
+    def test_rejects_garbage_and_non_finite(self):
+        for value in (None, '', 'abc', 'NaN', 'sNaN', 'Infinity', '-inf', [], {}):
+            with self.subTest(value=value), self.assertRaises(InvalidAmount):
+                to_cents(value)
+
+    def test_rejects_overflow(self):
+        for value in ('1e30', '1e100000', 10 ** 30, '100000000.00'):
+            with self.subTest(value=value), self.assertRaises(InvalidAmount):
+                to_cents(value)
+        self.assertEqual(to_cents(Decimal(MAX_CENTS) / 100), MAX_CENTS)
+
+
+class FeeScheduleTests(SimpleTestCase):
+    schedule = FeeSchedule(TIERS)
+
+    def test_quote_is_the_same_for_int_str_and_decimal(self):
+        expected = (Decimal('500.00'), Decimal('50.00'), Decimal('450.00'))
+        for value in (500, '500', Decimal('500')):
+            with self.subTest(value=value):
+                self.assertEqual(self.schedule.quote(value), expected)
+
+    def test_quote_cents_takes_cents(self):
+        self.assertEqual(self.schedule.quote_cents(50000), self.schedule.quote('500'))
+
+    def test_tiers_and_clamps(self):
+        self.assertEqual(self.schedule.quote('20')[1], Decimal('5.00'))  # min_fee
+        self.assertEqual(self.schedule.quote('3')[1], Decimal('3.00'))  # never above the amount
+        self.assertEqual(self.schedule.quote('1000')[1], Decimal('50.00'))
+        self.assertEqual(self.schedule.quote('10000')[1], Decimal('200.00'))  # max_fee
+
+    def test_quote_rejects_bools_and_overflow(self):
+        for value in (True, '1e30'):
+            with self.subTest(value=value), self.assertRaises(InvalidAmount):
+                self.schedule.quote(value)
+
+
+@override_settings(WITHDRAWAL_FEE_TIERS=TIERS)
+class WithdrawalQuoteViewTests(TestCase):
+    def setUp(self):
+        get_fee_schedule.cache_clear()
+        self.addCleanup(get_fee_schedule.cache_clear)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('quoter', password='x'))
+
+    def test_json_numbers_and_strings_quote_alike(self):
+        response = self.client.post('/api/withdrawal-quote/', {'amounts': [500, '500', 500.5]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        quotes = response.json()['quotes']
+        self.assertEqual(quotes[0], quotes[1])
+        self.assertEqual(quotes[0], {'amount': '500.00', 'fee': '50.00', 'net_amount': '450.00'})
+        self.assertEqual(quotes[2]['amount'], '500.50')
+
+    def test_bad_amounts_are_400(self):
+        for amount in (True, '1e30', 'NaN', None):
+            with self.subTest(amount=amount):
+                response = self.client.post('/api/withdrawal-quote/', {'amounts': [amount]}, format='json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_withdrawal_rejects_overflow(self):
+        response = self.client.post('/api/wallets/withdraw/', {'amount': '1e30', 'phone_number': '0700000000'}, format='json')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,48 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Product, Transaction, UserProduct, Wallet
+
+
+class HomeViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('homer', password='x')
+        self.user.profile.phone_number = '0712345678'
+        self.user.profile.save()
+        Wallet.objects.create(user=self.user, balance=750, income=40)
+        product = Product.objects.create(name='Basic', cost=100, price=100, daily_income=5, return_rate=5, total_income=150, cycles=30)
+        UserProduct.objects.create(user=self.user, product=product)
+        Transaction.objects.create(user=self.user, amount=750, transaction_type='RECHARGE', status='COMPLETED')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def get(self, path):
+        response = self.api.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_route_names(self):
+        self.assertEqual(reverse('api-home'), '/api/home/')
+        # The root health check keeps its own name
+        self.assertEqual(reverse('home'), '/')
+
+    def test_sections_match_their_own_endpoints(self):
+        home = self.get('/api/home/')
+        self.assertEqual(list(home), ['profile', 'wallet', 'referral', 'user_products', 'products', 'statistics'])
+        profile = self.get('/api/user-profile/')
+        # /api/user-profile/ looks for a phone_number attribute on the user and so always sends ''
+        self.assertEqual(home['profile'], {**{key: profile[key] for key in ('username', 'is_staff', 'is_superuser')}, 'phone_number': '0712345678'})
+        self.assertEqual(home['wallet'], self.get('/api/wallets/'))
+        referral = self.get('/api/referral/')[0]
+        self.assertEqual(home['referral'], {key: referral[key] for key in ('referral_code', 'referrals_count', 'vip_level')})
+        self.assertEqual(home['user_products'], self.get('/api/user-products/'))
+        self.assertEqual(home['products'], self.get('/api/products/'))
+        self.assertEqual(home['statistics'], self.get('/api/statistics/'))
+
+    def test_include_limits_the_sections(self):
+        self.assertEqual(list(self.get('/api/home/?include=wallet, products')), ['wallet', 'products'])
+        response = self.api.get('/api/home/?include=wallet,inbox')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Unknown sections: inbox')
@@ -0,0 +1,57 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from core.idempotency import DONE, IN_FLIGHT, _digest, idempotent
+
+
+class PaymentView(APIView):
+    calls = 0
+    delay = 0
+
+    @idempotent
+    def post(self, request):
+        PaymentView.calls += 1
+        time.sleep(self.delay)
+        return Response({'call': PaymentView.calls}, status=201)
+
+
+@override_settings(IDEMPOTENCY_CLAIM_SECONDS=1, IDEMPOTENCY_WAIT_SECONDS=5)
+class IdempotentTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        PaymentView.calls = 0
+        PaymentView.delay = 0
+        self.user = User(pk=1, username='payer')
+
+    def post(self, key='key-1', body=None):
+        request = APIRequestFactory().post('/pay/', body or {'amount': 100}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        force_authenticate(request, self.user)
+        return PaymentView.as_view()(request)
+
+    def test_retries_replay_the_first_response(self):
+        first, second = self.post(), self.post()
+        self.assertEqual((first.status_code, first.data), (201, {'call': 1}))
+        self.assertEqual((second.status_code, second.data), (201, {'call': 1}))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.post(body={'amount': 5}).status_code, 422)
+
+    def test_claim_outlives_a_slow_handler(self):
+        PaymentView.delay = 2.5
+        worker = threading.Thread(target=self.post)
+        worker.start()
+        time.sleep(1.8)
+        # Past the claim's TTL, but renewed while the handler runs
+        claim = cache.get(f'idempotency:{self.user.pk}:{_digest("/pay/", "key-1")}')
+        self.assertEqual(claim['state'], IN_FLIGHT)
+        worker.join()
+        retry = self.post()
+        self.assertEqual((retry.data, PaymentView.calls), ({'call': 1}, 1))
+        stored = cache.get(f'idempotency:{self.user.pk}:{_digest("/pay/", "key-1")}')
+        self.assertEqual(stored['state'], DONE)
@@ -0,0 +1,203 @@
+import json
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core import mpesa
+from core.models import Recharge, Transaction, Wallet
+from core.mpesa import MpesaClient, MpesaError, STK_PUSH_PATH, TOKEN_PATH, build_session
+
+
+class StubDaraja(BaseHTTPRequestHandler):
+    """Daraja's token and STK push endpoints, answering from the server's scripted `replies`."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, path):
+        self.server.hits[path] += 1
+        script = self.server.replies.get(path)
+        status, body = script.pop(0) if len(script) > 1 else script[0]
+        time.sleep(self.server.delay)
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.reply(self.path)
+
+    def do_POST(self):
+        self.server.bodies.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+        self.server.authorizations.append(self.headers['Authorization'])
+        self.reply(self.path)
+
+
+TOKEN = (200, {'access_token': 'token-1', 'expires_in': '3599'})
+ACCEPTED = (200, {'ResponseCode': '0', 'CheckoutRequestID': 'ws_CO_1', 'CustomerMessage': 'Success. Request accepted for processing'})
+
+
+class StubServerMixin:
+    def start_stub(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubDaraja)
+        self.server.hits = Counter()
+        self.server.bodies = []
+        self.server.authorizations = []
+        self.server.delay = 0
+        self.server.replies = {TOKEN_PATH: [TOKEN], STK_PUSH_PATH: [ACCEPTED]}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def mpesa_client(self, **kwargs):
+        return MpesaClient(
+            base_url=self.base_url, consumer_key='key', consumer_secret='secret', shortcode='174379',
+            passkey='passkey', callback_url='https://example.com/callback', timeout=5,
+            session=build_session(backoff_factor=0), **kwargs
+        )
+
+
+class MpesaClientTests(StubServerMixin, SimpleTestCase):
+    def setUp(self):
+        self.start_stub()
+
+    def test_token_is_fetched_once_by_concurrent_requests(self):
+        self.server.delay = 0.2
+        client = self.mpesa_client()
+        tokens = []
+        threads = [threading.Thread(target=lambda: tokens.append(client.get_access_token())) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(tokens, ['token-1'] * 10)
+        self.assertEqual(self.server.hits[TOKEN_PATH], 1)
+
+    def test_token_is_refreshed_before_it_expires(self):
+        self.server.replies[TOKEN_PATH] = [(200, {'access_token': 'short', 'expires_in': '30'}), TOKEN]
+        client = self.mpesa_client()
+        self.assertEqual(client.get_access_token(), 'short')
+        # Within TOKEN_REFRESH_MARGIN of expiry, so it is already stale
+        self.assertEqual(client.get_access_token(), 'token-1')
+        self.assertEqual(self.server.hits[TOKEN_PATH], 2)
+
+    def test_token_fetch_retries_server_errors(self):
+        self.server.replies[TOKEN_PATH] = [(503, {}), (502, {}), TOKEN]
+        self.assertEqual(self.mpesa_client().get_access_token(), 'token-1')
+        self.assertEqual(self.server.hits[TOKEN_PATH], 3)
+
+    def test_token_fetch_gives_up_after_the_retries(self):
+        self.server.replies[TOKEN_PATH] = [(503, {})]
+        with self.assertRaises(MpesaError):
+            self.mpesa_client().get_access_token()
+        self.assertEqual(self.server.hits[TOKEN_PATH], 4)
+
+    def test_retries_back_off(self):
+        self.server.replies[TOKEN_PATH] = [(503, {}), (503, {}), TOKEN]
+        client = self.mpesa_client()
+        client.session = build_session(backoff_factor=0.1)
+        started = time.monotonic()
+        client.get_access_token()
+        # urllib3 sleeps backoff_factor * 2 ** (retry - 1) before each retry after the first
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+    def test_stk_push_is_not_retried_on_server_errors(self):
+        self.server.replies[STK_PUSH_PATH] = [(503, {'errorMessage': 'Service unavailable'}), ACCEPTED]
+        with self.assertRaisesMessage(MpesaError, 'Service unavailable'):
+            self.mpesa_client().stk_push('254712345678', 100, 'SIH1')
+        self.assertEqual(self.server.hits[STK_PUSH_PATH], 1)
+
+    def test_stk_push_retries_once_with_a_fresh_token(self):
+        self.server.replies[TOKEN_PATH] = [TOKEN, (200, {'access_token': 'token-2', 'expires_in': '3599'})]
+        self.server.replies[STK_PUSH_PATH] = [(401, {}), ACCEPTED]
+        data = self.mpesa_client().stk_push('254712345678', Decimal('100.00'), 'SIH1')
+        self.assertEqual(data['CheckoutRequestID'], 'ws_CO_1')
+        self.assertEqual(self.server.authorizations, ['Bearer token-1', 'Bearer token-2'])
+        self.assertEqual(self.server.bodies[-1]['Amount'], 100)
+
+
+@override_settings(MPESA_CALLBACK_TOKEN='callback-secret')
+class StkPushFlowTests(StubServerMixin, TestCase):
+    def setUp(self):
+        self.start_stub()
+        patcher = mock.patch.object(mpesa, '_client', self.mpesa_client())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('payer', password='x')
+        Wallet.objects.create(user=self.user, balance=0)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def callback(self, checkout_request_id, result_code=0, amount=100, receipt='QK12345678'):
+        body = {'Body': {'stkCallback': {
+            'CheckoutRequestID': checkout_request_id,
+            'ResultCode': result_code,
+            'ResultDesc': 'The service request is processed successfully.',
+            'CallbackMetadata': {'Item': [
+                {'Name': 'Amount', 'Value': amount},
+                {'Name': 'MpesaReceiptNumber', 'Value': receipt},
+                {'Name': 'PhoneNumber', 'Value': 254712345678},
+            ]},
+        }}}
+        return APIClient().post('/api/mpesa/callback/callback-secret/', body, format='json')
+
+    def test_callback_completes_the_recharge_by_checkout_request_id(self):
+        response = self.api.post('/api/mpesa/stk-push/', {'amount': '100', 'phone_number': '0712345678'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Transaction.objects.get().checkout_request_id, 'ws_CO_1')
+
+        self.assertEqual(self.callback('ws_CO_1').json(), {'ResultCode': 0, 'ResultDesc': 'Accepted'})
+        recharge = Recharge.objects.get(pk=response.json()['transaction_id'])
+        self.assertEqual((recharge.status, recharge.transaction.status, recharge.transaction.mpesa_receipt), ('Completed', 'COMPLETED', 'QK12345678'))
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('100.00'))
+
+        # Daraja repeats callbacks; the wallet is credited once
+        self.callback('ws_CO_1')
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('100.00'))
+
+    def test_failed_payment_fails_the_recharge(self):
+        self.api.post('/api/mpesa/stk-push/', {'amount': '100', 'phone_number': '0712345678'}, format='json')
+        self.callback('ws_CO_1', result_code=1032)
+        self.assertEqual(Recharge.objects.get().status, 'Failed')
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('0.00'))
+
+    def test_success_without_a_receipt_is_left_for_verification(self):
+        self.api.post('/api/mpesa/stk-push/', {'amount': '100', 'phone_number': '0712345678'}, format='json')
+        response = self.callback('ws_CO_1', receipt=None)
+        self.assertEqual(response.json(), {'ResultCode': 0, 'ResultDesc': 'Accepted'})
+        recharge = Recharge.objects.select_related('transaction').get()
+        self.assertEqual((recharge.status, recharge.transaction.status), ('Pending', 'AWAITING_VERIFICATION'))
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('0.00'))
+
+    def test_repeated_receipt_is_acknowledged_and_left_for_verification(self):
+        self.server.replies[STK_PUSH_PATH] = [ACCEPTED, (200, {**ACCEPTED[1], 'CheckoutRequestID': 'ws_CO_2'})]
+        for _ in range(2):
+            self.api.post('/api/mpesa/stk-push/', {'amount': '100', 'phone_number': '0712345678'}, format='json')
+        self.callback('ws_CO_1', receipt='QK1')
+        response = self.callback('ws_CO_2', receipt='QK1')
+        self.assertEqual((response.status_code, response.json()), (200, {'ResultCode': 0, 'ResultDesc': 'Accepted'}))
+        second = Transaction.objects.get(checkout_request_id='ws_CO_2')
+        self.assertEqual((second.status, second.mpesa_receipt, second.airtel_transaction_id), ('AWAITING_VERIFICATION', None, None))
+        self.assertEqual(Recharge.objects.get(transaction=second).status, 'Pending')
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('100.00'))
+
+    def test_unknown_checkout_request_id_is_acknowledged_and_ignored(self):
+        self.assertEqual(self.callback('ws_CO_unknown').status_code, 200)
+        self.assertEqual(self.callback('ws_CO_1', receipt='QK1').status_code, 200)
+        self.assertFalse(Recharge.objects.exists())
+
+    def test_rejected_push_fails_the_recharge(self):
+        self.server.replies[STK_PUSH_PATH] = [(400, {'errorMessage': 'Invalid PhoneNumber'})]
+        response = self.api.post('/api/mpesa/stk-push/', {'amount': '100', 'phone_number': '0712345678'}, format='json')
+        self.assertEqual((response.status_code, response.json()), (502, {'error': 'Invalid PhoneNumber'}))
+        self.assertEqual(Recharge.objects.get().status, 'Failed')
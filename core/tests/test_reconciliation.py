@@ -0,0 +1,188 @@
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from core.models import Recharge, Referral, StatementEntry, Transaction, Wallet
+from core.reconciliation import StatementLine, complete_entry, complete_recharges, match_lines, parse_statement, reconcile
+
+STATEMENTS = os.path.join(os.path.dirname(__file__), 'statements')
+
+
+def statement(name):
+    with open(os.path.join(STATEMENTS, name), encoding='utf-8') as handle:
+        return handle.read()
+
+
+def nairobi(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class ParseStatementTests(SimpleTestCase):
+    def test_mpesa_sms(self):
+        lines = parse_statement(statement('mpesa_sms.txt'))
+        # The payment sent out is not a receipt; the repeated message is kept for match_lines to skip
+        self.assertEqual([line.receipt for line in lines], ['SF51ABC1DE', 'SF51ABC2FG', 'SF51ABC1DE'])
+        first = lines[0]
+        self.assertEqual((first.amount, first.phone_number, first.paid_at), (Decimal('1000.00'), '712345678', nairobi(2024, 6, 5, 15, 45)))
+        self.assertEqual((lines[1].amount, lines[1].phone_number), (Decimal('250.00'), '722000111'))
+
+    def test_airtel_sms(self):
+        lines = parse_statement(statement('airtel_sms.txt'))
+        self.assertEqual(
+            [(line.receipt, line.amount, line.phone_number, line.paid_at) for line in lines],
+            [
+                ('MP240605.1545.A12345', Decimal('500.00'), '733123456', nairobi(2024, 6, 5, 15, 45)),
+                ('MP240605.1610.B67890', Decimal('750.00'), '100200300', nairobi(2024, 6, 5, 16, 10)),
+            ],
+        )
+
+    def test_csv_export_with_preamble(self):
+        lines = parse_statement(statement('mpesa_statement.csv'))
+        # Failed and outgoing rows are skipped
+        self.assertEqual([line.receipt for line in lines], ['SF51CSV001', 'SF51CSV002', 'SF51CSV005', 'SF51CSV001'])
+        self.assertEqual(
+            (lines[0].amount, lines[0].phone_number, lines[0].paid_at),
+            (Decimal('1000.00'), '712345678', nairobi(2024, 6, 5, 15, 45, 10)),
+        )
+        self.assertEqual(lines[1].phone_number, '722000111')
+
+    def test_explicit_format(self):
+        self.assertEqual(parse_statement(statement('mpesa_statement.csv'), fmt='sms'), [])
+        self.assertEqual(len(parse_statement(statement('mpesa_sms.txt'), fmt='sms')), 3)
+
+
+class MatchLinesTests(TestCase):
+    def setUp(self):
+        self.paid_at = nairobi(2024, 6, 5, 15, 45)
+        self.john = User.objects.create_user('john', password='x')
+        self.john.profile.phone_number = '0712345678'
+        self.john.profile.save()
+        self.mary = User.objects.create_user('mary', password='x')
+        for user in (self.john, self.mary):
+            Wallet.objects.create(user=user)
+
+    def pending_recharge(self, user, amount, requested_before=timedelta(minutes=10), phone_number=None):
+        transaction = Transaction.objects.create(user=user, amount=amount, phone_number=phone_number, transaction_type='RECHARGE', status='PENDING')
+        recharge = Recharge.objects.create(user=user, amount=amount, transaction=transaction)
+        Recharge.objects.filter(pk=recharge.pk).update(date=self.paid_at - requested_before)
+        return recharge
+
+    def line(self, receipt, amount, phone_number='712345678', paid_at=None):
+        return StatementLine(receipt, Decimal(amount), phone_number, paid_at or self.paid_at, '')
+
+    def test_amount_and_phone_single_out_one_recharge(self):
+        recharge = self.pending_recharge(self.john, 1000)
+        self.pending_recharge(self.mary, 1000)  # Same amount, another phone
+        result = match_lines([self.line('R1', '1000.00')])
+        self.assertEqual([(line.receipt, row['id']) for line, row in result.matched], [('R1', recharge.pk)])
+        self.assertEqual(result.queued, [])
+
+    def test_phone_from_the_transaction_or_request(self):
+        recharge = self.pending_recharge(self.mary, 250, phone_number='+254 722 000 111')
+        result = match_lines([self.line('R1', '250', phone_number='722000111')])
+        self.assertEqual([row['id'] for _, row in result.matched], [recharge.pk])
+
+    def test_ambiguous_matches_are_queued_closest_first(self):
+        older = self.pending_recharge(self.john, 1000, requested_before=timedelta(hours=5))
+        newer = self.pending_recharge(self.john, 1000)
+        result = match_lines([self.line('R1', '1000')])
+        self.assertEqual(result.matched, [])
+        self.assertEqual([(line.receipt, ids) for line, ids in result.queued], [('R1', [newer.pk, older.pk])])
+
+    def test_each_recharge_is_claimed_once(self):
+        first = self.pending_recharge(self.john, 1000)
+        result = match_lines([self.line('R1', '1000'), self.line('R2', '1000', paid_at=self.paid_at + timedelta(minutes=5))])
+        self.assertEqual([(line.receipt, row['id']) for line, row in result.matched], [('R1', first.pk)])
+        self.assertEqual([(line.receipt, ids) for line, ids in result.queued], [('R2', [])])
+
+    def test_unknown_phone_queues_the_amount_candidates(self):
+        recharge = self.pending_recharge(self.mary, 500)
+        result = match_lines([self.line('R1', '500', phone_number='799999999')])
+        self.assertEqual([ids for _, ids in result.queued], [[recharge.pk]])
+
+    def test_wrong_amount_or_outside_the_window_is_not_matched(self):
+        self.pending_recharge(self.john, 1000, requested_before=timedelta(hours=80))
+        self.pending_recharge(self.john, 999)
+        result = match_lines([self.line('R1', '1000')])
+        self.assertEqual([(line.receipt, ids) for line, ids in result.queued], [('R1', [])])
+
+    def test_duplicate_receipts_are_skipped(self):
+        self.pending_recharge(self.john, 1000)
+        Transaction.objects.create(user=self.mary, amount=100, transaction_type='RECHARGE', status='COMPLETED', airtel_transaction_id='KNOWN1')
+        StatementEntry.objects.create(receipt='KNOWN2', amount=100)
+        lines = [self.line('R1', '1000'), self.line('R1', '1000'), self.line('KNOWN1', '1000'), self.line('KNOWN2', '1000')]
+        result = match_lines(lines)
+        self.assertEqual(len(result.matched), 1)
+        self.assertEqual(sorted(line.receipt for line in result.duplicates), ['KNOWN1', 'KNOWN2', 'R1'])
+
+    def test_reconcile_a_csv_export(self):
+        john = self.pending_recharge(self.john, 1000)
+        mary = self.pending_recharge(self.mary, 250, phone_number='0722000111')
+        result = reconcile(statement('mpesa_statement.csv'))
+        self.assertEqual(result.summary(), {'matched': 2, 'queued': 1, 'duplicates': 1, 'matched_amount': Decimal('1250.00')})
+        self.assertEqual(set(Recharge.objects.filter(status='Completed').values_list('pk', flat=True)), {john.pk, mary.pk})
+        self.assertEqual(Wallet.objects.get(user=self.john).balance, Decimal('1000.00'))
+        self.assertEqual(Transaction.objects.get(pk=john.transaction_id).airtel_transaction_id, 'SF51CSV001')
+        # CSV005 paid 250 from an unknown phone; Mary's recharge was already claimed
+        self.assertEqual(dict(StatementEntry.objects.values_list('receipt', 'status')), {'SF51CSV001': 'Matched', 'SF51CSV002': 'Matched', 'SF51CSV005': 'Queued'})
+
+    def test_dry_run_writes_nothing(self):
+        self.pending_recharge(self.john, 1000)
+        result = reconcile(statement('mpesa_statement.csv'), dry_run=True)
+        self.assertEqual(len(result.matched), 1)
+        self.assertFalse(StatementEntry.objects.exists())
+        self.assertFalse(Recharge.objects.filter(status='Completed').exists())
+
+
+class CompleteEntryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('payer', password='x')
+        Wallet.objects.create(user=self.user)
+        transaction = Transaction.objects.create(user=self.user, amount=500, transaction_type='RECHARGE', status='PENDING')
+        self.recharge = Recharge.objects.create(user=self.user, amount=500, transaction=transaction)
+
+    def entry(self, amount):
+        return StatementEntry.objects.create(receipt='Q1', amount=amount, phone_number='712345678', recharge=self.recharge)
+
+    def test_completes_the_assigned_recharge(self):
+        entry = self.entry(500)
+        self.assertTrue(complete_entry(entry))
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('500.00'))
+        self.assertEqual(StatementEntry.objects.get().status, 'Matched')
+
+    def test_refuses_an_amount_mismatch(self):
+        entry = self.entry(50)
+        self.assertFalse(complete_entry(entry))
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, Decimal('0.00'))
+        self.recharge.refresh_from_db()
+        self.assertEqual(self.recharge.status, 'Pending')
+        self.assertEqual(StatementEntry.objects.get().status, 'Queued')
+
+
+class CompleteRechargesTests(TestCase):
+    def pending_recharge(self, user, amount):
+        transaction = Transaction.objects.create(user=user, amount=amount, phone_number='0700000001', transaction_type='RECHARGE', status='PENDING')
+        recharge = Recharge.objects.create(user=user, amount=amount, transaction=transaction)
+        row = {'id': recharge.id, 'user_id': user.id, 'amount': recharge.amount, 'transaction_id': transaction.id, 'transaction__phone_number': transaction.phone_number}
+        line = StatementLine(f'QK{recharge.id:08d}', recharge.amount, '0700000001', None, '')
+        return line, row
+
+    def test_credits_existing_and_missing_wallets(self):
+        with_wallet = User.objects.create_user('with-wallet', password='x')
+        Wallet.objects.create(user=with_wallet, balance=10)
+        without_wallet = User.objects.create_user('without-wallet', password='x')
+        inviter = Referral.objects.get(user=User.objects.create_user('inviter', password='x'))
+        inviter.invitees.add(without_wallet)
+
+        completed, stale = complete_recharges([self.pending_recharge(with_wallet, 100), self.pending_recharge(without_wallet, 250)])
+        self.assertEqual((len(completed), stale), (2, []))
+        self.assertEqual(Wallet.objects.get(user=with_wallet).balance, Decimal('110.00'))
+        wallet = Wallet.objects.get(user=without_wallet)
+        self.assertEqual((wallet.balance, wallet.has_recharged), (Decimal('250.00'), True))
+        self.assertFalse(Recharge.objects.exclude(status='Completed').exists())
+        inviter.refresh_from_db()
+        self.assertEqual(inviter.recharged_invitees, 1)
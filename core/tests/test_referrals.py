@@ -0,0 +1,45 @@
+from decimal import Decimal
+from importlib import import_module
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+
+from core.models import ArchivedRecord, ExchangeReward, Referral, Wallet
+from core.referrals import STATS_FIELDS, refresh_referral_stats
+
+backfill_referral_stats = import_module('core.migrations.0035_backfill_referral_stats').backfill_referral_stats
+
+
+class ReferralStatsTests(TestCase):
+    def setUp(self):
+        self.referrer = User.objects.create_user('referrer', password='x')
+        referral = Referral.objects.get(user=self.referrer)
+        for index, (level, recharged) in enumerate([('VIP0', True), ('VIP0', False), ('VIP1', True)]):
+            invitee = User.objects.create_user(f'invitee{index}', password='x')
+            Referral.objects.filter(user=invitee).update(vip_level=level)
+            Wallet.objects.create(user=invitee, has_recharged=recharged)
+            referral.invitees.add(invitee)
+        ExchangeReward.objects.create(user=self.referrer, amount=200, type='Referral Bonus')
+        ExchangeReward.objects.create(user=self.referrer, amount=50, type='Bonus')
+        ArchivedRecord.objects.create(user=self.referrer, kind='exchange_reward', source_id=1, occurred_at='2025-01-01T00:00:00Z', month='2025-01-01', payload={'type': 'Referral Bonus', 'amount': '200.00'})
+        # As left by migration 0033, before any invite was recorded in the new columns
+        Referral.objects.update(**dict.fromkeys(STATS_FIELDS, 0))
+
+    def stats(self):
+        return Referral.objects.filter(user=self.referrer).values(*STATS_FIELDS).get()
+
+    expected = {
+        'vip0_invitees': 2, 'vip1_invitees': 1, 'vip2_invitees': 0, 'vip3_invitees': 0,
+        'recharged_invitees': 2, 'bonus_earned': Decimal('400.00'),
+    }
+
+    def test_migration_backfills_existing_referrals(self):
+        backfill_referral_stats(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(self.stats(), self.expected)
+
+    def test_refresh_agrees_with_the_backfill(self):
+        self.assertEqual(refresh_referral_stats(), (Referral.objects.count(), 1))
+        self.assertEqual(self.stats(), self.expected)
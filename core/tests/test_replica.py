@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import tempfile
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import CachedTokenAuthentication
+from core.models import Product, Transaction, Wallet, Withdrawal
+from core.routers import REPLICA_ALIAS, is_sticky, use_replica
+
+
+@override_settings(DATABASE_ROUTERS=['core.routers.ReplicaRouter'], REPLICA_STICKY_SECONDS=60)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Reads and writes against a real second SQLite file standing in for the replica.
+
+    The replica is refreshed from the primary with SQLite's backup API, like
+    `sync_sqlite_replica`, so anything written after a sync shows replication lag.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        handle, cls.replica_path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        # connections reads its aliases from settings.DATABASES, which replica_enabled() checks too.
+        # Declared here rather than on the class: the runner would try to create a test database
+        # for an alias that only exists while these tests run.
+        settings.DATABASES[REPLICA_ALIAS] = {**settings.DATABASES['default'], 'NAME': cls.replica_path}
+        cls.databases = {'default', REPLICA_ALIAS}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA_ALIAS].close()
+        del connections[REPLICA_ALIAS]
+        del settings.DATABASES[REPLICA_ALIAS]
+        os.remove(cls.replica_path)
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='x')
+        Wallet.objects.create(user=self.user, balance=500)
+        Transaction.objects.create(user=self.user, amount=500, transaction_type='RECHARGE', status='COMPLETED')
+        caches[settings.REPLICA_STICKY_CACHE].clear()
+        self.sync_replica()
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def sync_replica(self):
+        connections[REPLICA_ALIAS].close()
+        connections['default'].ensure_connection()
+        target = sqlite3.connect(self.replica_path)
+        try:
+            connections['default'].connection.backup(target)
+        finally:
+            target.close()
+
+    def balance(self):
+        response = self.api.get('/api/statistics/')
+        self.assertEqual(response.status_code, 200)
+        return Decimal(response.json()['trend'][0]['balance'])
+
+    def test_reads_come_from_the_replica(self):
+        # Changed on the primary only, as if not yet replicated; update() marks no write
+        Wallet.objects.filter(user=self.user).update(balance=700)
+        self.assertEqual(self.balance(), Decimal('500.00'))
+        self.sync_replica()
+        self.assertEqual(self.balance(), Decimal('700.00'))
+
+    def test_writes_go_to_the_primary_and_stick_reads_to_it(self):
+        response = self.api.post('/api/wallets/withdraw/', {'amount': '100', 'phone_number': '0712345678'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Withdrawal.objects.using('default').filter(user=self.user).exists())
+        self.assertFalse(Withdrawal.objects.using(REPLICA_ALIAS).filter(user=self.user).exists())
+
+        self.assertTrue(is_sticky(self.user.pk))
+        Wallet.objects.filter(user=self.user).update(balance=700)
+        self.assertEqual(self.balance(), Decimal('700.00'))
+
+    def test_sticky_window_ends(self):
+        self.api.post('/api/withdrawal-quote/', {'amounts': ['100']}, format='json')
+        Wallet.objects.filter(user=self.user).update(balance=700)
+        self.assertEqual(self.balance(), Decimal('700.00'))
+        # The mark's expiry, without waiting REPLICA_STICKY_SECONDS
+        caches[settings.REPLICA_STICKY_CACHE].clear()
+        self.assertEqual(self.balance(), Decimal('500.00'))
+
+    def test_sticky_marks_are_shared_between_workers(self):
+        self.api.post('/api/withdrawal-quote/', {'amounts': ['100']}, format='json')
+        # The mark lives in the primary database, not in this process's memory
+        with connections['default'].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM replica_sticky_cache')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_other_users_keep_reading_the_replica(self):
+        other = User.objects.create_user('other', password='x')
+        Wallet.objects.create(user=other, balance=50)
+        Transaction.objects.create(user=other, amount=50, transaction_type='RECHARGE', status='COMPLETED')
+        caches[settings.REPLICA_STICKY_CACHE].clear()
+        self.sync_replica()
+        self.api.post('/api/withdrawal-quote/', {'amounts': ['100']}, format='json')
+        self.api.force_authenticate(other)
+        Wallet.objects.filter(user=other).update(balance=60)
+        self.assertEqual(self.balance(), Decimal('50.00'))
+
+    def test_home_reads_the_replica_until_the_user_writes(self):
+        # Added on the primary only, as if not yet replicated
+        Product.objects.create(name='New', cost=100, price=100, daily_income=5, return_rate=5, total_income=150, cycles=30)
+        response = self.api.get('/api/home/?include=products')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['products'], [])
+
+        self.api.post('/api/withdrawal-quote/', {'amounts': ['100']}, format='json')
+        self.assertEqual([product['name'] for product in self.api.get('/api/home/?include=products').json()['products']], ['New'])
+
+    def test_cached_users_keep_the_alias_they_were_read_from(self):
+        token = Token.objects.create(user=self.user)
+        self.sync_replica()
+        with use_replica():
+            # The first lookup reads the replica, the second is served from the cache
+            for lookup in ('miss', 'hit'):
+                user, _ = CachedTokenAuthentication().authenticate_credentials(token.key)
+                self.assertEqual(user._state.db, REPLICA_ALIAS, lookup)
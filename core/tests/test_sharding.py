@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import tempfile
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recharge, Transaction, UserProfile, Wallet, Withdrawal
+from core.sharding import fan_out, for_user, shard_for
+
+SHARDS = ['shard0', 'shard1']
+
+
+@override_settings(SHARD_ALIASES=SHARDS, DATABASE_ROUTERS=['core.sharding.ShardRouter'], STATUS_STREAM_MAX_SECONDS=0)
+class ShardingTests(TransactionTestCase):
+    """Per-user tables split over two SQLite shard files, with the test database as the directory."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.shard_paths = {}
+        for alias in SHARDS:
+            handle, cls.shard_paths[alias] = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(handle)
+            # Declared here rather than on the class, as for the replica tests
+            settings.DATABASES[alias] = {**settings.DATABASES['default'], 'NAME': cls.shard_paths[alias]}
+        cls.databases = {'default', *SHARDS}
+        super().setUpClass()
+        # Shards get the directory's full schema, as `migrate --database shardN` would give them
+        connections['default'].ensure_connection()
+        for path in cls.shard_paths.values():
+            target = sqlite3.connect(path)
+            try:
+                connections['default'].connection.backup(target)
+            finally:
+                target.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias, path in cls.shard_paths.items():
+            connections[alias].close()
+            del connections[alias]
+            del settings.DATABASES[alias]
+            os.remove(path)
+
+    def setUp(self):
+        cache.clear()
+        # Consecutive ids, so one user per shard
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        for user, balance in ((self.alice, 100), (self.bob, 200)):
+            user.profile.phone_number = f'07000000{user.pk:02d}'
+            user.profile.save()
+            # Creating through a manager has no instance to route by, so pin the shard as views do
+            with for_user(user.pk):
+                Wallet.objects.create(user=user, balance=balance)
+
+    def api(self, user):
+        client = APIClient()
+        # A real token, not force_authenticate(): authentication is what pins the shard
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        return client
+
+    def test_users_rows_are_placed_on_their_shard(self):
+        self.assertNotEqual(shard_for(self.alice.pk), shard_for(self.bob.pk))
+        for user in (self.alice, self.bob):
+            home = shard_for(user.pk)
+            with for_user(user.pk):
+                self.assertEqual(Wallet.objects.get(user=user)._state.db, home)
+            for alias in SHARDS:
+                self.assertEqual(Wallet.objects.using(alias).filter(user=user).exists(), alias == home)
+                # Users and profiles are copied to every shard
+                self.assertTrue(User.objects.using(alias).filter(pk=user.pk).exists())
+                self.assertEqual(UserProfile.objects.using(alias).get(user_id=user.pk).phone_number, user.profile.phone_number)
+            self.assertFalse(Wallet.objects.using('default').exists())
+
+    def test_reads_are_pinned_to_the_users_shard(self):
+        response = self.api(self.bob).get('/api/wallets/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.json()['balance']), Decimal('200.00'))
+
+    def test_writes_are_pinned_to_the_users_shard(self):
+        response = self.api(self.alice).post('/api/wallets/withdraw/', {'amount': '50', 'phone_number': '0700000001'}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        home = shard_for(self.alice.pk)
+        for alias in SHARDS:
+            self.assertEqual(Withdrawal.objects.using(alias).filter(user=self.alice).exists(), alias == home)
+            self.assertEqual(Transaction.objects.using(alias).filter(user=self.alice).exists(), alias == home)
+
+    def test_shard_joins_see_the_replicated_profile(self):
+        with for_user(self.alice.pk):
+            Recharge.objects.create(user=self.alice, amount=100)
+        response = self.api(self.alice).get('/api/funding-details/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['user']['phone_number'], self.alice.profile.phone_number)
+
+        self.alice.profile.phone_number = '0711111111'
+        self.alice.profile.save()
+        self.assertEqual(
+            Recharge.objects.using(shard_for(self.alice.pk)).values_list('user__profile__phone_number', flat=True).get(),
+            '0711111111',
+        )
+
+    def test_fan_out_covers_every_shard(self):
+        self.assertEqual(fan_out(lambda alias: (alias, Wallet.objects.using(alias).count())), [('shard0', 1), ('shard1', 1)])
+
+        for user, amount in ((self.alice, 100), (self.bob, 250)):
+            with for_user(user.pk):
+                Transaction.objects.create(user=user, amount=amount, transaction_type='RECHARGE', status='COMPLETED')
+        admin = User.objects.create_user('admin', password='x', is_staff=True)
+        response = self.api(admin).get('/api/admin/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['stats']['totalRecharges'], 350.0)
+
+    def test_status_stream_reads_the_users_shard(self):
+        with for_user(self.bob.pk):
+            recharge = Recharge.objects.create(user=self.bob, amount=100)
+        response = self.api(self.bob).get('/api/status-stream/')
+        # The events are generated here, after the request's shard pin was reset
+        body = b''.join(response.streaming_content).decode()
+        response.close()
+        self.assertIn(f'event: recharge\ndata: {{"id":{recharge.pk},"status":"Pending"}}', body)
+        self.assertNotIn('event: done', body)
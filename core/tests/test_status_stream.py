@@ -0,0 +1,93 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.models import Recharge, UserProfile
+from core.notifications import hub, stream_slots
+
+
+@override_settings(STATUS_STREAM_MAX_PER_PROCESS=1, STATUS_STREAM_MAX_SECONDS=0, STATUS_STREAM_POLL_SECONDS=7)
+class StatusStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('streamer', password='x')
+        self.recharge = Recharge.objects.create(user=self.user, amount=100)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def open_stream(self):
+        response = self.api.get('/api/status-stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return response
+
+    def test_event_ids_are_the_users_data_version(self):
+        UserProfile.objects.filter(user=self.user).update(data_version=5)
+        response = self.open_stream()
+        body = b''.join(response.streaming_content).decode()
+        response.close()
+        self.assertIn('id: 5\nevent: recharge\n', body)
+
+    def test_streams_beyond_the_cap_get_a_snapshot_to_poll(self):
+        held = self.open_stream()
+        self.assertEqual(stream_slots.open, 1)
+        polled = self.open_stream()
+        body = b''.join(polled.streaming_content).decode()
+        self.assertIn('event: recharge\n', body)
+        self.assertTrue(body.endswith('retry: 7000\nevent: poll\ndata: {}\n\n'))
+        self.assertEqual(stream_slots.open, 1)
+
+        # Closing the held stream, even unread, frees its slot
+        held.close()
+        self.assertEqual(stream_slots.open, 0)
+
+    def test_settled_rows_end_the_stream(self):
+        Recharge.objects.filter(pk=self.recharge.pk).update(status='Completed')
+        response = self.open_stream()
+        self.assertEqual(b''.join(response.streaming_content), b'event: done\ndata: {}\n\n')
+        response.close()
+        self.assertEqual(stream_slots.open, 0)
+
+
+# Long enough that only a published change can end the wait in time
+@override_settings(STATUS_STREAM_MAX_SECONDS=30, STATUS_STREAM_HEARTBEAT_SECONDS=30, STATUS_STREAM_RECHECK_SECONDS=60)
+class LiveStatusStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('streamer', password='x')
+        self.recharge = Recharge.objects.create(user=self.user, amount=100)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.response = self.api.get('/api/status-stream/')
+        self.events = iter(self.response.streaming_content)
+        self.assertEqual(self.next_event(), f'event: recharge\ndata: {{"id":{self.recharge.pk},"status":"Pending"}}')
+
+    def tearDown(self):
+        self.response.close()
+        self.assertEqual(stream_slots.open, 0)
+
+    def next_event(self):
+        """The next event without its id line, and how long it took to arrive."""
+        started = time.monotonic()
+        event = next(self.events).decode()
+        self.elapsed = time.monotonic() - started
+        return event.split('\n', 1)[1].rstrip('\n') if event.startswith('id: ') else event.rstrip('\n')
+
+    def test_committed_change_is_sent(self):
+        # As an approval saves it: post_save publishes through notify_user once the change commits
+        self.recharge.status = 'Completed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recharge.save()
+        event = next(self.events).decode()
+        version = UserProfile.objects.get(user=self.user).data_version
+        self.assertEqual(event, f'id: {version}\nevent: recharge\ndata: {{"id":{self.recharge.pk},"status":"Completed"}}\n\n')
+        self.assertEqual(self.next_event(), 'event: done\ndata: {}')
+
+    def test_publish_wakes_a_waiting_stream(self):
+        Recharge.objects.filter(pk=self.recharge.pk).update(status='Failed')
+        # Published while the stream is blocked waiting for a change
+        threading.Timer(0.2, hub.publish, [self.user.pk]).start()
+        self.assertEqual(self.next_event(), f'event: recharge\ndata: {{"id":{self.recharge.pk},"status":"Failed"}}')
+        # It blocked until the publish, then woke well before any recheck or heartbeat
+        self.assertTrue(0.1 < self.elapsed < 10, self.elapsed)
+        self.assertEqual(self.next_event(), 'event: done\ndata: {}')
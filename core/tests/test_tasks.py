@@ -0,0 +1,62 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from core.models import ExchangeReward, Referral, Task, Transaction, Wallet
+from core.tasks import claim, enqueue, run
+
+
+class ReferralBonusTaskTests(TestCase):
+    def setUp(self):
+        self.referrer = User.objects.create_user('referrer', password='x')
+        Wallet.objects.create(user=self.referrer, balance=0)
+        self.invitee = User.objects.create_user('invitee', password='x')
+        self.code = Referral.objects.get(user=self.referrer).referral_code
+
+    def run_task(self):
+        enqueue('referral_bonus', {'user_id': self.invitee.id, 'referral_code': self.code})
+        for task_row in claim('test', 10):
+            self.assertTrue(run(task_row, 'test'))
+
+    def test_credits_the_referrer_once(self):
+        self.run_task()
+        self.assertEqual(Wallet.objects.get(user=self.referrer).balance, Decimal('200.00'))
+        reward = ExchangeReward.objects.get(user=self.referrer)
+        self.assertEqual((reward.type, reward.reference), ('Referral Bonus', f'referral:{self.invitee.id}'))
+        referral = Referral.objects.get(user=self.referrer)
+        self.assertEqual((referral.referrals_count, referral.vip0_invitees, referral.bonus_earned), (1, 1, Decimal('200.00')))
+        self.assertEqual(Task.objects.get().status, 'Done')
+
+    def test_retry_after_the_shard_commit_does_not_pay_twice(self):
+        # What a shard transaction left behind when the task's own transaction then rolled back
+        transaction = Transaction.objects.create(user=self.referrer, amount=200, transaction_type='EXCHANGE_REWARD', status='COMPLETED')
+        ExchangeReward.objects.create(user=self.referrer, amount=200, transaction=transaction, type='Referral Bonus', reference=f'referral:{self.invitee.id}')
+        Wallet.objects.filter(user=self.referrer).update(balance=200)
+
+        self.run_task()
+        self.assertEqual(Wallet.objects.get(user=self.referrer).balance, Decimal('200.00'))
+        self.assertEqual(ExchangeReward.objects.filter(user=self.referrer).count(), 1)
+        # The invite itself was rolled back with the task, so it is recorded now
+        referral = Referral.objects.get(user=self.referrer)
+        self.assertEqual((referral.referrals_count, referral.bonus_earned), (1, Decimal('200.00')))
+        self.assertTrue(referral.invitees.filter(pk=self.invitee.pk).exists())
+
+    @override_settings(TASK_WORKER=False)
+    def test_runs_inline_after_commit_without_a_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue('referral_bonus', {'user_id': self.invitee.id, 'referral_code': self.code})
+            self.assertEqual(Task.objects.get().status, 'Queued')
+        self.assertEqual(Task.objects.get().status, 'Done')
+        self.assertEqual(Wallet.objects.get(user=self.referrer).balance, Decimal('200.00'))
+
+    @override_settings(TASK_WORKER=True)
+    def test_left_to_the_worker_when_there_is_one(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            enqueue('referral_bonus', {'user_id': self.invitee.id, 'referral_code': self.code})
+        self.assertEqual((callbacks, Task.objects.get().status), ([], 'Queued'))
+
+    def test_counts_an_invitee_who_recharged_before_the_task_ran(self):
+        Wallet.objects.create(user=self.invitee, balance=100, has_recharged=True)
+        self.run_task()
+        self.assertEqual(Referral.objects.get(user=self.referrer).recharged_invitees, 1)
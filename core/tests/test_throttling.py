@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from core import throttling
+from core.throttling import IPTokenBucketThrottle, check_throttles
+
+RATES = {'signup_ip': '3/min'}
+
+
+@mock.patch.object(IPTokenBucketThrottle, 'THROTTLE_RATES', RATES)
+class TokenBucketThrottleTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        throttling._blocked.clear()
+        self.now = 600.0
+        patcher = mock.patch.object(IPTokenBucketThrottle, 'timer', lambda _: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, ip='10.0.0.1', forwarded=None):
+        meta = {'REMOTE_ADDR': ip}
+        if forwarded:
+            meta['HTTP_X_FORWARDED_FOR'] = forwarded
+        throttling._blocked.clear()
+        return check_throttles(SimpleNamespace(META=meta), 'signup', [IPTokenBucketThrottle])
+
+    def test_allows_the_rate_then_rejects(self):
+        self.assertEqual([self.request() for _ in range(3)], [None, None, None])
+        wait = self.request()
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 120)
+        self.assertIsNone(self.request('10.0.0.2'))
+
+    def test_rejections_do_not_count(self):
+        for _ in range(10):
+            self.request()
+        self.now += 60
+        # The previous window holds the 3 accepted requests only, fully inside the window
+        self.assertIsNotNone(self.request())
+        self.now += 30
+        self.assertIsNone(self.request())
+
+    def test_retry_after_is_when_a_request_fits(self):
+        for _ in range(3):
+            self.request()
+        wait = self.request()
+        self.now += wait + 0.01
+        self.assertIsNone(self.request())
+
+    def test_blocked_keys_skip_the_cache(self):
+        for _ in range(3):
+            self.request()
+        self.request()
+        with mock.patch.object(cache, 'incr') as incr:
+            meta = {'REMOTE_ADDR': '10.0.0.1'}
+            self.assertIsNotNone(check_throttles(SimpleNamespace(META=meta), 'signup', [IPTokenBucketThrottle]))
+        incr.assert_not_called()
+
+    def test_concurrent_counts_are_not_lost(self):
+        # Two workers that read the same count before writing used to both get through
+        first, second = IPTokenBucketThrottle(), IPTokenBucketThrottle()
+        view = SimpleNamespace(throttle_scope='signup')
+        request = SimpleNamespace(META={'REMOTE_ADDR': '10.0.0.3'})
+        allowed = [throttle.allow_request(request, view) for throttle in (first, second, first, second)]
+        self.assertEqual(allowed, [True, True, True, False])
+
+    def use_proxies(self, count):
+        from rest_framework.settings import api_settings
+        override = self.settings(REST_FRAMEWORK={'NUM_PROXIES': count})
+        override.enable()
+        api_settings.reload()
+        self.addCleanup(api_settings.reload)
+        self.addCleanup(override.disable)
+
+    def test_forwarded_for_is_ignored_without_proxies(self):
+        self.use_proxies(0)
+        for index in range(3):
+            self.assertIsNone(self.request(forwarded=f'192.0.2.{index}'))
+        self.assertIsNotNone(self.request(forwarded='192.0.2.9'))
+
+    def test_client_ip_is_taken_behind_the_proxy(self):
+        self.use_proxies(1)
+        # A spoofed leftmost entry doesn't change the IP the proxy appended
+        for index in range(3):
+            self.assertIsNone(self.request('10.1.1.1', f'192.0.2.{index}, 203.0.113.7'))
+        self.assertIsNotNone(self.request('10.1.1.1', '192.0.2.9, 203.0.113.7'))
+        self.assertIsNone(self.request('10.1.1.1', '203.0.113.8'))
@@ -0,0 +1,59 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Wallet
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='a-long-password')
+        Wallet.objects.create(user=self.user, balance=100)
+        self.token = Token.objects.create(user=self.user)
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        # Warm the cache, so each test checks that the change reaches it
+        self.assertEqual(self.status(), 200)
+
+    def status(self):
+        return self.api.get('/api/wallets/').status_code
+
+    def test_repeat_requests_skip_the_token_lookup(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.status(), 200)
+        self.assertFalse([query for query in queries if 'authtoken_token' in query['sql']])
+
+    def test_logout(self):
+        self.assertEqual(self.api.post('/api/logout/').status_code, 200)
+        self.assertEqual(self.status(), 401)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+
+    def test_deleting_the_token(self):
+        self.token.delete()
+        self.assertEqual(self.status(), 401)
+
+    def test_deactivating_the_user(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.status(), 401)
+
+    def test_changing_the_password(self):
+        self.user.set_password('another-long-password')
+        self.user.save()
+        self.assertEqual(self.status(), 401)
+
+    def test_other_saves_keep_the_token(self):
+        self.user.email = 'alice@example.com'
+        self.user.save()
+        self.assertEqual(self.status(), 200)
+        # Logging in again after a password change issues a new token
+        self.user.set_password('another-long-password')
+        self.user.save()
+        response = self.client.post('/api/login/', {'username': 'alice', 'password': 'another-long-password'}, content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotEqual(response.json()['token'], self.token.key)
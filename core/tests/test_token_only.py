@@ -0,0 +1,108 @@
+import io
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from core.models import Wallet
+
+# settings.MIDDLEWARE with Django's session, CSRF, auth and message middleware swapped
+# for the subclasses that skip /api/, as API_TOKEN_ONLY=True configures it
+SUBCLASSES = {
+    'django.contrib.sessions.middleware.SessionMiddleware': 'core.middleware.SessionMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware': 'core.middleware.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware': 'core.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware': 'core.middleware.MessageMiddleware',
+}
+TOKEN_ONLY_MIDDLEWARE = [SUBCLASSES.get(path, path) for path in settings.MIDDLEWARE]
+
+
+@override_settings(API_TOKEN_ONLY=True, MIDDLEWARE=TOKEN_ONLY_MIDDLEWARE)
+class TokenOnlyMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user('staff', password='a-long-password', is_staff=True, is_superuser=True)
+        self.user = User.objects.create_user('alice', password='a-long-password')
+        Wallet.objects.create(user=self.user, balance=100)
+
+    def test_admin_gets_sessions_csrf_and_messages(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.get('/admin/login/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('csrftoken', response.cookies)
+        # Without the token the login form is refused
+        response = client.post('/admin/login/', {'username': 'staff', 'password': 'a-long-password'})
+        self.assertEqual(response.status_code, 403)
+
+        client.force_login(self.staff)
+        response = client.get('/admin/')
+        self.assertEqual(response.status_code, 200)
+        request = response.wsgi_request
+        self.assertEqual(request.session['_auth_user_id'], str(self.staff.pk))
+        self.assertEqual(request.user, self.staff)
+        self.assertTrue(hasattr(request, '_messages'))
+
+    def test_api_requests_skip_them(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        # The session cookie is ignored: /api/ only takes tokens
+        response = client.get('/api/wallets/')
+        self.assertEqual(response.status_code, 401)
+        request = response.wsgi_request
+        self.assertFalse(hasattr(request, 'session'))
+        self.assertFalse(hasattr(request, '_messages'))
+        self.assertEqual(response.cookies, {})
+
+        token = Token.objects.create(user=self.user)
+        response = client.get('/api/wallets/', HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies, {})
+
+    def test_api_login_writes_no_session(self):
+        sessions = Session.objects.count()
+        response = Client(enforce_csrf_checks=True).post('/api/login/', {'username': 'alice', 'password': 'a-long-password'},
+                                                        content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn('token', response.json())
+        self.assertEqual(response.cookies, {})
+        self.assertEqual(Session.objects.count(), sessions)
+
+
+class PurgeSessionsTests(TestCase):
+    def setUp(self):
+        staff = User.objects.create_user('staff', is_staff=True)
+        user = User.objects.create_user('alice')
+        self.staff_session = self.session(staff)
+        self.other_sessions = {self.session(user), self.session(None)}
+
+    def session(self, user):
+        store = SessionStore()
+        if user is not None:
+            store['_auth_user_id'] = str(user.pk)
+        store.create()
+        return store.session_key
+
+    def purge(self, *args):
+        out = io.StringIO()
+        call_command('purge_sessions', '--batch-size', '1', *args, stdout=out)
+        return out.getvalue().strip()
+
+    def keys(self):
+        return set(Session.objects.values_list('session_key', flat=True))
+
+    def test_keeps_staff_sessions(self):
+        self.assertEqual(self.purge(), 'Deleted 2 sessions, kept 1 staff sessions')
+        self.assertEqual(self.keys(), {self.staff_session})
+
+    def test_dry_run_deletes_nothing(self):
+        self.assertEqual(self.purge('--dry-run'), '[dry run] Deleted 2 sessions, kept 1 staff sessions')
+        self.assertEqual(self.keys(), {self.staff_session, *self.other_sessions})
+
+    def test_all_includes_staff_sessions(self):
+        self.assertEqual(self.purge('--all'), 'Deleted 3 sessions, kept 0 staff sessions')
+        self.assertEqual(self.keys(), set())
@@ -0,0 +1,162 @@
+# core/throttling.py
+import hashlib
+import threading
+import time
+from types import SimpleNamespace
+
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.throttling import SimpleRateThrottle
+
+# Keys known to be out of tokens in this process, mapped to when they may retry.
+# Rejections found here never touch the cache or the database.
+_blocked = {}
+_blocked_lock = threading.Lock()
+MAX_BLOCKED_KEYS = 10000
+
+
+def _blocked_for(key, now):
+    until = _blocked.get(key)
+    if until is None:
+        return 0
+    if now >= until:
+        _blocked.pop(key, None)
+        return 0
+    return until - now
+
+
+def _block(key, until):
+    with _blocked_lock:
+        if len(_blocked) >= MAX_BLOCKED_KEYS:
+            now = time.monotonic()
+            for stale in [k for k, v in _blocked.items() if v <= now]:
+                del _blocked[stale]
+        _blocked[key] = until
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Rate limit per scope and client, counted in the shared cache.
+
+    The view's `throttle_scope` picks the budget from DEFAULT_THROTTLE_RATES under
+    `<scope>_<ident_kind>`; a rate of '10/min' lets a client through up to 10 times
+    in any minute. Throttles with no configured rate let everything through.
+
+    The bucket drains over a sliding window estimated from two fixed windows: the
+    current window's count plus the share of the previous one still inside it.
+    Counts only change through cache.add()/incr(), so concurrent workers never
+    overwrite each other's requests; that needs a backend with atomic incr()
+    across processes (Redis or Memcached, see core.checks).
+    """
+    ident_kind = None
+    scope_attr = 'throttle_scope'
+    cache_format = 'bucket_%(scope)s_%(ident)s'
+
+    def __init__(self):
+        # The scope comes from the view, so the rate is resolved in allow_request
+        pass
+
+    def get_ident_value(self, request):
+        raise NotImplementedError('.get_ident_value() must be overridden')
+
+    def get_cache_key(self, request, view):
+        ident = self.get_ident_value(request)
+        if ident is None:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def _incr(self, key, delta=1):
+        # add() then incr() is atomic on every backend; the key may still expire in between
+        self.cache.add(key, 0, self.duration * 2)
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            self.cache.add(key, 0, self.duration * 2)
+            return self.cache.incr(key, delta)
+
+    def allow_request(self, request, view):
+        view_scope = getattr(view, self.scope_attr, None)
+        if not view_scope:
+            return True
+        self.scope = f'{view_scope}_{self.ident_kind}'
+        self.rate = self.THROTTLE_RATES.get(self.scope)
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = time.monotonic()
+        self.retry_after = _blocked_for(self.key, now)
+        if self.retry_after:
+            return False
+
+        wall_now = self.timer()
+        window, elapsed = divmod(wall_now, self.duration)
+        window = int(window)
+        previous = self.cache.get(f'{self.key}:{window - 1}', 0)
+        current = self._incr(f'{self.key}:{window}')
+        # The previous window's requests are taken as spread evenly over it
+        overlap = 1 - elapsed / self.duration
+        if previous * overlap + current <= self.num_requests:
+            return True
+
+        # Give the token back, so rejected requests don't count against the client
+        self.cache.decr(f'{self.key}:{window}')
+        current -= 1
+        self.retry_after = self._wait(previous, current, elapsed)
+        _block(self.key, now + self.retry_after)
+        return False
+
+    def _wait(self, previous, current, elapsed):
+        """Seconds until one more request fits, assuming no other requests arrive.
+
+        A burst at the start of a window is taken as spread over it, so this can
+        run up to two windows.
+        """
+        room = self.num_requests - 1 - current
+        if room >= 0 and previous:
+            # Within this window, once enough of the previous one has slid out
+            fits_at = (1 - room / previous) * self.duration
+            return max(fits_at - elapsed, 0)
+        # In the next window, once enough of this one has slid out
+        slide = max(1 - (self.num_requests - 1) / current, 0) if current else 0
+        return self.duration - elapsed + slide * self.duration
+
+    def wait(self):
+        return getattr(self, 'retry_after', None)
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    ident_kind = 'ip'
+
+    def get_ident_value(self, request):
+        return self.get_ident(request)
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Per-account bucket: the authenticated user, or the username a login is trying."""
+    ident_kind = 'user'
+
+    def get_ident_value(self, request):
+        if request.user and request.user.is_authenticated:
+            return str(request.user.pk)
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if username:
+            digest = hashlib.blake2b(str(username).strip().lower().encode(), digest_size=8).hexdigest()
+            return f'name:{digest}'
+        return None
+
+
+def check_throttles(request, scope, throttle_classes, data=None):
+    """Apply token-bucket throttles to a plain Django view.
+
+    Returns the number of seconds to wait when the request is throttled, else None.
+    """
+    shim = SimpleNamespace(META=request.META, user=AnonymousUser(), data=data or {})
+    view = SimpleNamespace(throttle_scope=scope)
+    waits = []
+    for throttle_class in throttle_classes:
+        throttle = throttle_class()
+        if not throttle.allow_request(shim, view):
+            waits.append(throttle.wait() or 0)
+    return max(waits) if waits else None
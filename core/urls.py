@@ -2,31 +2,42 @@ from django.urls import path, re_path
 from django.http import HttpResponseRedirect
 from .views import (
     UserProfileView, LoginView, LogoutView, RegisterView, ProductListView, WalletView, ReferralView,
-    UserProductView, UpdateIncomeView, RechargeView, RechargeStatusView, WithdrawalView, WalletsView,
-    WalletsPurchaseView, ReferralClaimView, StatisticsView, FundingDetailsView, WithdrawalHistoryView,
-    ExchangeRewardsView, DepositStatusView, PaymentInstructionsView,
+    UserProductView, UpdateIncomeView, RechargeView, RechargeStatusView, WithdrawalView, WithdrawalQuoteView, WalletsView,
+    WalletsPurchaseView, WalletsPurchaseCartView, ReferralClaimView, ReferralInviteesView, StatisticsView, FundingDetailsView, WithdrawalHistoryView,
+    ExchangeRewardsView, DepositStatusView, PaymentInstructionsView, MpesaStkPushView, MpesaCallbackView,
+    StatusStreamView, AsyncLoginView, AsyncRegisterView, HomeView,
     AdminDashboardView, AdminApproveTransactionView,  # Added new views
 )
 
 urlpatterns = [
     path('api/register/', RegisterView.as_view(), name='register'),
+    # Before the referral-link pattern, which would otherwise take 'invitees' as a code
+    path('api/referral/invitees/', ReferralInviteesView.as_view(), name='referral-invitees'),
     re_path(r'^api/referral/(?P<referral_code>[a-zA-Z0-9]+)/$',
             lambda request, referral_code: HttpResponseRedirect(f'/register/?referral_code={referral_code}'),
             name='referral-link'),
     path('api/login/', LoginView.as_view(), name='login'),
+    path('api/async/login/', AsyncLoginView.as_view(), name='async-login'),
+    path('api/async/register/', AsyncRegisterView.as_view(), name='async-register'),
     path('api/logout/', LogoutView.as_view(), name='logout'),
     path('api/user-profile/', UserProfileView.as_view(), name='user-profile'),
+    path('api/home/', HomeView.as_view(), name='api-home'),
     path('api/products/', ProductListView.as_view(), name='products'),
     path('api/wallet/', WalletView.as_view(), name='wallet'),
     path('api/wallets/', WalletsView.as_view(), name='wallets'),
     path('api/recharge/', RechargeView.as_view(), name='recharge'),
     path('api/recharge-status/<int:pk>/', RechargeStatusView.as_view(), name='recharge-status'),
+    path('api/status-stream/', StatusStreamView.as_view(), name='status-stream'),
+    path('api/mpesa/stk-push/', MpesaStkPushView.as_view(), name='mpesa-stk-push'),
+    path('api/mpesa/callback/<str:token>/', MpesaCallbackView.as_view(), name='mpesa-callback'),
     path('api/wallets/purchase/', WalletsPurchaseView.as_view(), name='wallets-purchase'),
+    path('api/wallets/purchase-cart/', WalletsPurchaseCartView.as_view(), name='wallets-purchase-cart'),
     path('api/referral/', ReferralView.as_view(), name='referral'),
     path('api/referral/claim/', ReferralClaimView.as_view(), name='referral-claim'),
     path('api/user-products/', UserProductView.as_view(), name='user-products'),
     path('api/update-income/', UpdateIncomeView.as_view(), name='update-income'),
     path('api/wallets/withdraw/', WithdrawalView.as_view(), name='withdraw'),
+    path('api/withdrawal-quote/', WithdrawalQuoteView.as_view(), name='withdrawal-quote'),
     path('api/statistics/', StatisticsView.as_view(), name='statistics'),
     path('api/funding-details/', FundingDetailsView.as_view(), name='funding-details'),
     path('api/withdrawal-history/', WithdrawalHistoryView.as_view(), name='withdrawal-history'),
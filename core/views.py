@@ -3,14 +3,42 @@ from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from rest_framework.views import APIView  # Correct import
-from .serializers import WalletRechargeSerializer, RechargeSerializer, WithdrawalSerializer, ExchangeRewardSerializer, DepositSerializer, TransactionSerializer
+from .serializers import WalletRechargeSerializer, RechargeSerializer, RechargeStatusSerializer, WithdrawalSerializer, ExchangeRewardSerializer, DepositSerializer, TransactionSerializer
 import logging
 from django.contrib.auth import authenticate, login, logout
-from django.contrib.auth.models import User
-from .models import Product, Wallet, Referral, UserProduct, Transaction, Recharge, Withdrawal, ExchangeReward, Deposit
-from .serializers import UserSerializer, ProductSerializer, WalletSerializer, ReferralSerializer, UserProductSerializer
+from django.contrib.auth.models import User, update_last_login
+from .models import Product, Wallet, Referral, UserProduct, Transaction, Recharge, Withdrawal, ExchangeReward, Deposit, UserProfile, maturity_date
+from .serializers import UserSerializer, RegisterUserSerializer, ProductSerializer, WalletSerializer, ReferralSerializer, UserProductSerializer, InviteeSerializer
 from django.utils import timezone
-from django.db.models import Sum
+from django.db.models import Sum, F
+from django.db import transaction as db_transaction
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from decimal import Decimal, InvalidOperation
+from .mpesa import get_client, parse_callback, MpesaError
+from .reconciliation import normalize_phone
+from .notifications import hub, format_event, stream_slots, HeldStream
+from .idempotency import idempotent
+from .throttling import IPTokenBucketThrottle, UserTokenBucketThrottle, check_throttles
+from .hashing import hashing_pool, PoolSaturated
+from .fees import get_fee_schedule, InvalidAmount
+from .routers import ReplicaReadMixin
+from .archive import ArchivedHistoryMixin, archived_totals
+from .fastpath import row_mapper
+from .paginators import InviteeCursorPagination
+from .conditional import user_data_conditional, bump_data_version
+from .tasks import enqueue
+from .sharding import atomic_for, fan_out, find_shard, for_user, on_shard, shard_aliases, shard_for
+from django.db import IntegrityError, connection, connections
+from django.http import StreamingHttpResponse, JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
+from django.contrib.auth.hashers import check_password, make_password
+from asgiref.sync import sync_to_async
+import json
+import math
+import time
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -18,10 +46,43 @@ logger = logging.getLogger(__name__)
 # Your Airtel Money number for receiving payments
 PAYMENT_PHONE_NUMBER = "+254736196188"
 
+def credit_signup_bonuses(user, referral_code):
+    """Create the new user's wallet and credit the signup and referral bonuses."""
+    # The wallet and bonus rows go to the new user's shard, in a transaction there
+    with for_user(user.pk), atomic_for(Wallet):
+        # Create or get the user's wallet
+        wallet, created = Wallet.objects.get_or_create(user=user)
+
+        # New User Bonus: KSh 200
+        new_user_bonus = 200
+        wallet.balance += new_user_bonus
+        wallet.save()
+        transaction = Transaction.objects.create(
+            user=user,
+            amount=new_user_bonus,
+            transaction_type='EXCHANGE_REWARD',
+            status='COMPLETED'
+        )
+        ExchangeReward.objects.create(
+            user=user,
+            amount=new_user_bonus,
+            transaction=transaction,
+            type='New User Bonus'
+        )
+    logger.info("New user bonus of %s KSh credited to %s", new_user_bonus, user.username)
+
+    # The referral bonus runs as a task (core.tasks.referral_bonus): in the worker, or inline
+    # once the registration commits when there is none
+    if referral_code:
+        enqueue('referral_bonus', {'user_id': user.id, 'referral_code': referral_code})
+
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    throttle_classes = [IPTokenBucketThrottle]
+    throttle_scope = 'signup'
 
     def post(self, request, *args, **kwargs):
         try:
@@ -30,57 +91,9 @@ class RegisterView(generics.CreateAPIView):
             serializer.is_valid(raise_exception=True)
             user = serializer.save()
             token, _ = Token.objects.get_or_create(user=user)
-            logger.info(f"User registered: {user.username}")
-
-            # Create or get the user's wallet
-            wallet, created = Wallet.objects.get_or_create(user=user)
+            logger.info("User registered: %s", user.username)
 
-            # New User Bonus: KSh 200
-            new_user_bonus = 200
-            wallet.balance += new_user_bonus
-            wallet.save()
-            transaction = Transaction.objects.create(
-                user=user,
-                amount=new_user_bonus,
-                transaction_type='EXCHANGE_REWARD',
-                status='COMPLETED'
-            )
-            ExchangeReward.objects.create(
-                user=user,
-                amount=new_user_bonus,
-                transaction=transaction,
-                type='New User Bonus'
-            )
-            logger.info(f"New user bonus of {new_user_bonus} KSh credited to {user.username}")
-
-            # Handle Referral Bonus if a valid referral code is provided
-            if referral_code:
-                try:
-                    referrer = Referral.objects.get(referral_code=referral_code)
-                    referrer.invitees.add(user)
-                    referrer.increment_referrals()
-                    logger.info(f"User {user.username} registered with referral code from {referrer.user.username}")
-
-                    # Referral Bonus: KSh 200 for the referrer
-                    referral_bonus = 200
-                    referrer_wallet, _ = Wallet.objects.get_or_create(user=referrer.user)
-                    referrer_wallet.balance += referral_bonus
-                    referrer_wallet.save()
-                    referrer_transaction = Transaction.objects.create(
-                        user=referrer.user,
-                        amount=referral_bonus,
-                        transaction_type='EXCHANGE_REWARD',
-                        status='COMPLETED'
-                    )
-                    ExchangeReward.objects.create(
-                        user=referrer.user,
-                        amount=referral_bonus,
-                        transaction=referrer_transaction,
-                        type='Referral Bonus'
-                    )
-                    logger.info(f"Referral bonus of {referral_bonus} KSh credited to {referrer.user.username}")
-                except Referral.DoesNotExist:
-                    logger.warning(f"Invalid referral code provided: {referral_code}")
+            credit_signup_bonuses(user, referral_code)
 
             return Response({
                 'message': 'User registered successfully',
@@ -89,39 +102,160 @@ class RegisterView(generics.CreateAPIView):
                 'referral_code': user.referral.referral_code
             }, status=201)
         except Exception as e:
-            logger.error(f"Error during registration: {str(e)}", exc_info=True)
+            logger.error("Error during registration: %s", e, exc_info=True)
             return Response({'error': str(e)}, status=400)
 
 class LoginView(APIView):
-    permission_classes = [permissions.AllowAny]  
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    throttle_classes = [IPTokenBucketThrottle, UserTokenBucketThrottle]
+    throttle_scope = 'auth'
     def post(self, request):
         username = request.data.get('username')
         password = request.data.get('password')
         user = authenticate(request, username=username, password=password)
         if user is not None:
-            login(request, user)
+            if not settings.API_TOKEN_ONLY:
+                login(request, user)
             token, created = Token.objects.get_or_create(user=user)
-            logger.info(f"User {username} logged in successfully")
+            logger.info("User %s logged in successfully", username)
             return Response({
                 'token': token.key,
                 'user_id': user.id,
                 'username': user.username,
             })
         else:
-            logger.warning(f"Failed login attempt for username: {username}")
+            logger.warning("Failed login attempt for username: %s", username)
             return Response({'detail': 'Invalid credentials'}, status=400)
 
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+def _retry_response(body, status, seconds):
+    response = JsonResponse(body, status=status)
+    response['Retry-After'] = str(max(1, math.ceil(seconds)))
+    return response
+
+def create_registered_user(validated_data, hashed_password, referral_code):
+    with db_transaction.atomic():
+        # create_user() would hash the password again; normalize the username as it does
+        user = User.objects.create(username=User.normalize_username(validated_data['username']), password=hashed_password)
+        UserProfile.objects.update_or_create(user=user, defaults={'phone_number': validated_data['phone_number']})
+        token, _ = Token.objects.get_or_create(user=user)
+        credit_signup_bonuses(user, referral_code)
+    logger.info("User registered: %s", user.username)
+    return user, token
+
+# Async variants of login/register: password hashing runs on the bounded hashing
+# pool, and requests are refused with 503 once its queue is full.
+# Under gunicorn's WSGI workers (build.sh) Django runs each request's event loop on
+# its worker thread: the pool still bounds and sheds hashing, but the thread waits
+# out the hash. Requests only overlap across awaits under an ASGI server, e.g.
+# `gunicorn smartinvesthub.asgi -k uvicorn.workers.UvicornWorker` with uvicorn
+# added to requirements.txt.
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncLoginView(View):
+    async def post(self, request):
+        data = _json_body(request)
+        if data is None:
+            return JsonResponse({'detail': 'Invalid JSON body'}, status=400)
+        username = data.get('username') or ''
+        password = data.get('password') or ''
+        wait = check_throttles(request, 'auth', [IPTokenBucketThrottle, UserTokenBucketThrottle], data)
+        if wait is not None:
+            return _retry_response({'detail': 'Request was throttled.'}, 429, wait)
+
+        user = await User.objects.filter(username=username).afirst()
+        # check_password() calls its setter when the hash was made with an outdated hasher or work factor
+        outdated = []
+        try:
+            if user is None:
+                # Hash anyway so unknown usernames take as long as wrong passwords
+                await hashing_pool.run(make_password, password)
+                valid = False
+            else:
+                valid = await hashing_pool.run(check_password, password, user.password, outdated.append)
+        except PoolSaturated:
+            logger.warning("Login shed under load for username: %s", username)
+            return _retry_response({'detail': 'Server busy, please retry.'}, 503, 1)
+
+        if not valid or not user.is_active:
+            logger.warning("Failed login attempt for username: %s", username)
+            return JsonResponse({'detail': 'Invalid credentials'}, status=400)
+        if outdated:
+            # Upgrade the stored hash, as User.check_password() does for sync logins
+            await sync_to_async(self.upgrade_password)(user, password)
+        await sync_to_async(update_last_login)(None, user)
+        token, _ = await Token.objects.aget_or_create(user=user)
+        logger.info("User %s logged in successfully", username)
+        return JsonResponse({
+            'token': token.key,
+            'user_id': user.id,
+            'username': user.username,
+        })
+
+    def upgrade_password(self, user, password):
+        user.set_password(password)
+        # As the check_password() setter does: a re-hash is not a password change,
+        # so validators are not notified and the user's tokens stay valid
+        user._password = None
+        user.save(update_fields=['password'])
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncRegisterView(View):
+    async def post(self, request):
+        data = _json_body(request)
+        if data is None:
+            return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+        wait = check_throttles(request, 'signup', [IPTokenBucketThrottle], data)
+        if wait is not None:
+            return _retry_response({'detail': 'Request was throttled.'}, 429, wait)
+
+        referral_code = data.get('referral_code') or ''
+        if not isinstance(referral_code, str):
+            return JsonResponse({'referral_code': ['Not a valid string.']}, status=400)
+        referral_code = referral_code.strip()
+        serializer = RegisterUserSerializer(data=data)
+        if not await sync_to_async(serializer.is_valid)():
+            return JsonResponse(serializer.errors, status=400)
+        try:
+            hashed_password = await hashing_pool.run(make_password, serializer.validated_data['password'])
+        except PoolSaturated:
+            logger.warning("Registration shed under load")
+            return _retry_response({'error': 'Server busy, please retry.'}, 503, 1)
+
+        try:
+            user, token = await sync_to_async(create_registered_user)(serializer.validated_data, hashed_password, referral_code)
+            referral = await Referral.objects.aget(user=user)
+        except Exception as e:
+            logger.error("Error during registration: %s", e, exc_info=True)
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({
+            'message': 'User registered successfully',
+            'token': token.key,
+            'user_id': user.id,
+            'referral_code': referral.referral_code
+        }, status=201)
+
 class LogoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request):
-        logger.info(f"Logout attempt for user: {request.user.username}")
+        logger.info("Logout attempt for user: %s", request.user.username)
         try:
-            logout(request)
-            logger.info(f"User {request.user.username} logged out successfully")
+            if request.auth is not None:
+                # The token must stop working, not just leave the cache; post_delete drops its snapshot
+                Token.objects.filter(key=request.auth.key).delete()
+            if not settings.API_TOKEN_ONLY:
+                logout(request)
+            logger.info("User %s logged out successfully", request.user.username)
             return Response({'message': 'Logged out'})
         except Exception as e:
-            logger.error(f"Logout error for user {request.user.username}: {str(e)}")
+            logger.error("Logout error for user %s: %s", request.user.username, e)
             return Response({'error': 'Logout failed'}, status=500)
 
 class UserProfileView(APIView):
@@ -131,7 +265,7 @@ class UserProfileView(APIView):
         try:
             # Attempt to get phone_number, assuming it might be in a related model or directly on User
             phone_number = getattr(request.user, 'phone_number', '')
-            logger.info(f"User profile fetched: username={request.user.username}, phone_number={phone_number}")
+            logger.info("User profile fetched: username=%s, phone_number=%s", request.user.username, phone_number)
             return Response({
                 'username': request.user.username,
                 'phone_number': phone_number,
@@ -139,7 +273,7 @@ class UserProfileView(APIView):
                 'is_superuser': request.user.is_superuser,
             })
         except Exception as e:
-            logger.error(f"Error fetching user profile for {request.user.username}: {str(e)}")
+            logger.error("Error fetching user profile for %s: %s", request.user.username, e)
             return Response({
                 'username': request.user.username,
                 'phone_number': '',
@@ -147,6 +281,58 @@ class UserProfileView(APIView):
                 'is_superuser': request.user.is_superuser,
             })
 
+class HomeView(ReplicaReadMixin, APIView):
+    """Everything the app's home screen needs in one request.
+
+    `include=wallet,referral` limits the response to those sections; by default all
+    sections are returned. Each section matches the payload of its own endpoint,
+    built from one query per section.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    SECTIONS = ('profile', 'wallet', 'referral', 'user_products', 'products', 'statistics')
+
+    def get(self, request):
+        include = request.query_params.get('include')
+        sections = [name.strip() for name in include.split(',') if name.strip()] if include else list(self.SECTIONS)
+        unknown = sorted(set(sections) - set(self.SECTIONS))
+        if unknown:
+            return Response({'error': f"Unknown sections: {', '.join(unknown)}", 'sections': self.SECTIONS}, status=400)
+
+        data = {}
+        wallet = None
+        if 'wallet' in sections or 'statistics' in sections:
+            wallet, _ = Wallet.objects.get_or_create(user=request.user)
+        if 'profile' in sections:
+            phone_number = UserProfile.objects.filter(user=request.user).values_list('phone_number', flat=True).first()
+            data['profile'] = {
+                'username': request.user.username,
+                'phone_number': phone_number or '',
+                'is_staff': request.user.is_staff,
+                'is_superuser': request.user.is_superuser,
+            }
+        if 'wallet' in sections:
+            data['wallet'] = WalletSerializer(wallet).data
+        if 'referral' in sections:
+            referral, _ = Referral.objects.get_or_create(user=request.user)
+            # Counts only; the invitee list stays on /api/referral/
+            data['referral'] = {
+                'referral_code': referral.referral_code,
+                'referrals_count': referral.referrals_count,
+                'vip_level': referral.vip_level,
+            }
+        if 'user_products' in sections:
+            active = UserProduct.objects.filter(user=request.user, active=True).order_by('-purchase_date')
+            data['user_products'] = row_mapper(UserProductSerializer).rows(active)
+        if 'products' in sections:
+            data['products'] = row_mapper(ProductSerializer).rows(Product.objects.all())
+        if 'statistics' in sections:
+            timestamps = Transaction.objects.filter(user=request.user).order_by('-timestamp').values_list('timestamp', flat=True)[:3]
+            data['statistics'] = {'trend': [
+                {'date': timestamp.strftime('%Y-%m-%d'), 'balance': wallet.balance, 'income': wallet.income}
+                for timestamp in timestamps
+            ]}
+        return Response(data)
+
 class ProductListView(generics.ListAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
@@ -162,20 +348,24 @@ class WalletView(generics.RetrieveUpdateAPIView):
 class WalletsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @user_data_conditional
     def get(self, request):
         try:
             wallet, created = Wallet.objects.get_or_create(user=request.user)
-            logger.info(f"Wallets endpoint accessed - Wallet retrieved for user: {request.user.username}")
+            logger.info("Wallets endpoint accessed - Wallet retrieved for user: %s", request.user.username)
             return Response(WalletSerializer(wallet).data)
         except Exception as e:
-            logger.error(f"Error retrieving wallet for user {request.user.username}: {str(e)}")
+            logger.error("Error retrieving wallet for user %s: %s", request.user.username, e)
             return Response({'error': 'Failed to retrieve wallet'}, status=500)
 
 class RechargeView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [IPTokenBucketThrottle, UserTokenBucketThrottle]
+    throttle_scope = 'payment'
 
+    @idempotent
     def post(self, request):
-        logger.info(f"Recharge request initiated for user: {request.user.username}")
+        logger.info("Recharge request initiated for user: %s", request.user.username)
         serializer = WalletRechargeSerializer(data=request.data)
         if serializer.is_valid():
             try:
@@ -185,7 +375,7 @@ class RechargeView(APIView):
 
                 # Validate amount
                 if amount <= 0:
-                    logger.error(f"Invalid recharge amount for user {request.user.username}: {amount}")
+                    logger.error("Invalid recharge amount for user %s: %s", request.user.username, amount)
                     return Response({'error': 'Amount must be greater than 0'}, status=400)
 
                 # Create a pending transaction
@@ -206,16 +396,16 @@ class RechargeView(APIView):
                     username=request.user.username
                 )
 
-                logger.info(f"Recharge request created for user {request.user.username}: {amount} KSh, Transaction ID: {transaction.id}")
+                logger.info("Recharge request created for user %s: %s KSh, Transaction ID: %s", request.user.username, amount, transaction.id)
                 return Response({
                     'message': f'Please send KES {amount} to Airtel Money number {PAYMENT_PHONE_NUMBER}. After payment, send the full transaction confirmation message to {PAYMENT_PHONE_NUMBER} on WhatsApp.',
                     'transaction_id': recharge.id,  # Use recharge ID for polling
                     'status': recharge.status
                 }, status=201)
             except Exception as e:
-                logger.error(f"Error creating recharge request for user {request.user.username}: {str(e)}", exc_info=True)
+                logger.error("Error creating recharge request for user %s: %s", request.user.username, e, exc_info=True)
                 return Response({'error': 'Internal server error'}, status=500)
-        logger.error(f"Invalid recharge data: {serializer.errors}")
+        logger.error("Invalid recharge data: %s", serializer.errors)
         return Response(serializer.errors, status=400)
 
 class RechargeStatusView(APIView):  # Fixed: ApiView -> APIView
@@ -227,17 +417,230 @@ class RechargeStatusView(APIView):  # Fixed: ApiView -> APIView
             serializer = RechargeStatusSerializer(recharge)
             return Response(serializer.data)
         except Recharge.DoesNotExist:
-            logger.error(f"Recharge not found for user {request.user.username}: Recharge ID {pk}")
+            logger.error("Recharge not found for user %s: Recharge ID %s", request.user.username, pk)
             return Response({'error': 'Recharge not found'}, status=404)
         except Exception as e:
-            logger.error(f"Error checking recharge status for user {request.user.username}: {str(e)}")
+            logger.error("Error checking recharge status for user %s: %s", request.user.username, e)
             return Response({'error': 'Internal server error'}, status=500)
 
+class MpesaStkPushView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [IPTokenBucketThrottle, UserTokenBucketThrottle]
+    throttle_scope = 'payment'
+
+    @idempotent
+    def post(self, request):
+        serializer = WalletRechargeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        amount = serializer.validated_data['amount']
+        phone = normalize_phone(serializer.validated_data.get('phone_number', ''))
+        if phone is None:
+            return Response({'error': 'A valid Safaricom phone number is required'}, status=400)
+        if amount != amount.to_integral_value():
+            return Response({'error': 'M-Pesa payments must be in whole shillings'}, status=400)
+
+        phone_number = f'254{phone}'
+        transaction = Transaction.objects.create(
+            user=request.user,
+            amount=amount,
+            phone_number=phone_number,
+            transaction_type='RECHARGE',
+            status='PENDING'
+        )
+        recharge = Recharge.objects.create(
+            user=request.user,
+            amount=amount,
+            transaction=transaction,
+            status='Pending',
+            username=request.user.username,
+            phone_number=phone_number
+        )
+        try:
+            data = get_client().stk_push(phone_number, amount, account_reference=f'SIH{recharge.id}')
+        except MpesaError as e:
+            transaction.status = 'FAILED'
+            transaction.save(update_fields=['status'])
+            recharge.status = 'Failed'
+            recharge.save(update_fields=['status'])
+            logger.error("STK push failed for user %s: %s", request.user.username, e)
+            return Response({'error': str(e)}, status=502)
+
+        transaction.checkout_request_id = data['CheckoutRequestID']
+        transaction.save(update_fields=['checkout_request_id'])
+        logger.info("STK push sent for user %s: %s KSh, CheckoutRequestID %s", request.user.username, amount, transaction.checkout_request_id)
+        return Response({
+            'message': data.get('CustomerMessage', 'Check your phone to complete the payment.'),
+            'transaction_id': recharge.id,  # Use recharge ID for polling
+            'status': recharge.status
+        }, status=201)
+
+class MpesaCallbackView(APIView):
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, token):
+        if not settings.MPESA_CALLBACK_TOKEN or not constant_time_compare(token, settings.MPESA_CALLBACK_TOKEN):
+            return Response({'error': 'Not found'}, status=404)
+
+        result = parse_callback(request.data)
+        checkout_request_id = result['checkout_request_id']
+        # Daraja only needs an acknowledgement; it does not act on our processing outcome
+        ack = Response({'ResultCode': 0, 'ResultDesc': 'Accepted'})
+        if not checkout_request_id:
+            logger.error("M-Pesa callback without CheckoutRequestID: %s", request.data)
+            return ack
+
+        # The callback carries no user, so with sharding the transaction is looked up on every shard
+        with on_shard(find_shard(Transaction, checkout_request_id=checkout_request_id)), atomic_for(Transaction):
+            try:
+                transaction = Transaction.objects.select_for_update().get(checkout_request_id=checkout_request_id)
+            except Transaction.DoesNotExist:
+                logger.error("M-Pesa callback for unknown CheckoutRequestID %s", checkout_request_id)
+                return ack
+            if transaction.status != 'PENDING':
+                logger.info("Ignoring repeated M-Pesa callback for CheckoutRequestID %s", checkout_request_id)
+                return ack
+            recharge = Recharge.objects.filter(transaction=transaction).first()
+
+            if str(result['result_code']) != '0':
+                transaction.status = 'FAILED'
+                transaction.save(update_fields=['status'])
+                if recharge:
+                    recharge.status = 'Failed'
+                    recharge.save()
+                logger.info("M-Pesa payment failed for %s: %s", transaction.user.username, result['result_desc'])
+                return ack
+
+            if not result['receipt']:
+                # Recharge.save only credits the wallet once a receipt is recorded, so completing
+                # the recharge now would report a payment that is never paid in
+                transaction.status = 'AWAITING_VERIFICATION'
+                transaction.save(update_fields=['status'])
+                logger.error("M-Pesa success callback without MpesaReceiptNumber for CheckoutRequestID %s", checkout_request_id)
+                return ack
+
+            try:
+                paid = Decimal(str(result['amount']))
+            except (InvalidOperation, TypeError):
+                paid = None
+            try:
+                # A savepoint, so a receipt already recorded elsewhere rolls back only these writes
+                with atomic_for(Transaction):
+                    transaction.mpesa_receipt = result['receipt']
+                    # Recharge.save credits the wallet once the provider transaction ID is recorded
+                    transaction.airtel_transaction_id = result['receipt']
+                    if paid != transaction.amount or recharge is None:
+                        transaction.status = 'AWAITING_VERIFICATION'
+                        transaction.save()
+                        logger.error("M-Pesa amount mismatch for CheckoutRequestID %s: expected %s, paid %s", checkout_request_id, transaction.amount, result['amount'])
+                        return ack
+                    transaction.status = 'COMPLETED'
+                    transaction.save()
+                    recharge.transaction = transaction
+                    recharge.status = 'Completed'
+                    recharge.save()
+            except IntegrityError:
+                transaction.mpesa_receipt = transaction.airtel_transaction_id = None
+                transaction.status = 'AWAITING_VERIFICATION'
+                transaction.save(update_fields=['status'])
+                logger.error("M-Pesa receipt %s for CheckoutRequestID %s is already recorded on another transaction", result['receipt'], checkout_request_id)
+                return ack
+            logger.info("M-Pesa payment %s completed recharge %s for %s", result['receipt'], recharge.id, transaction.user.username)
+        return ack
+
+class StatusStreamView(APIView):
+    """Server-sent events for the user's pending recharges and withdrawals.
+
+    The stream sends the current status of each pending row, then one event per
+    change until every row is settled or the stream times out (clients reconnect).
+    Changes are pushed through the in-process hub; a periodic recheck covers
+    approvals handled by another worker process.
+
+    A stream holds a worker thread, so each process keeps at most
+    STATUS_STREAM_MAX_PER_PROCESS open. Beyond that the response is a single
+    snapshot with a `retry:` delay, and the client's EventSource polls instead.
+    Event ids are the user's data_version, so they mean the same on every worker.
+
+    The events are generated after the view returns, when ShardPinMiddleware has
+    already dropped the request's shard pin, so each snapshot pins the shard again.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        user_id = request.user.id
+        shard = shard_for(user_id)
+        version = hub.version(user_id)
+        recharge_ids = list(Recharge.objects.filter(user_id=user_id, status='Pending').order_by('-date').values_list('id', flat=True)[:50])
+        withdrawal_ids = list(
+            Withdrawal.objects.filter(user_id=user_id, status='Pending', transaction__status='PENDING')
+            .order_by('-date').values_list('id', flat=True)[:50]
+        )
+        if stream_slots.acquire(settings.STATUS_STREAM_MAX_PER_PROCESS):
+            logger.info("Status stream opened for %s: %s recharges, %s withdrawals", request.user.username, len(recharge_ids), len(withdrawal_ids))
+            events = HeldStream(self.stream(user_id, shard, version, recharge_ids, withdrawal_ids))
+        else:
+            logger.info("Status streams full; sending %s a snapshot to poll", request.user.username)
+            events = self.stream(user_id, shard, version, recharge_ids, withdrawal_ids, live=False)
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def snapshot(self, user_id, shard, recharge_ids, withdrawal_ids):
+        data_version = UserProfile.objects.filter(user_id=user_id).values_list('data_version', flat=True).first()
+        statuses = {}
+        with on_shard(shard):
+            for row in Recharge.objects.filter(user_id=user_id, id__in=recharge_ids).values('id', 'status'):
+                statuses[('recharge', row['id'])] = {'id': row['id'], 'status': row['status']}
+            for row in Withdrawal.objects.filter(user_id=user_id, id__in=withdrawal_ids).values('id', 'status', 'transaction__status'):
+                statuses[('withdrawal', row['id'])] = {'id': row['id'], 'status': row['status'], 'transaction_status': row['transaction__status']}
+        # Don't hold database connections open while the stream idles
+        connection.close()
+        if shard is not None:
+            connections[shard].close()
+        return data_version, statuses
+
+    def stream(self, user_id, shard, version, recharge_ids, withdrawal_ids, live=True):
+        deadline = time.monotonic() + settings.STATUS_STREAM_MAX_SECONDS
+        next_recheck = time.monotonic() + settings.STATUS_STREAM_RECHECK_SECONDS
+        sent = {}
+        changed = True
+        while True:
+            if changed:
+                data_version, statuses = self.snapshot(user_id, shard, recharge_ids, withdrawal_ids)
+                for key, data in statuses.items():
+                    if sent.get(key) != data:
+                        sent[key] = data
+                        yield format_event(key[0], data, event_id=data_version)
+                pending = [
+                    key for key, data in sent.items()
+                    if data['status'] == 'Pending' and data.get('transaction_status', 'PENDING') == 'PENDING'
+                ]
+                if not pending:
+                    yield format_event('done', {})
+                    return
+                if not live:
+                    yield format_event('poll', {}, retry=settings.STATUS_STREAM_POLL_SECONDS * 1000)
+                    return
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            timeout = min(settings.STATUS_STREAM_HEARTBEAT_SECONDS, deadline - now, max(next_recheck - now, 0))
+            new_version = hub.wait(user_id, version, timeout)
+            changed = new_version != version
+            version = new_version
+            if time.monotonic() >= next_recheck:
+                changed = True
+                next_recheck = time.monotonic() + settings.STATUS_STREAM_RECHECK_SECONDS
+            if not changed:
+                yield ': keepalive\n\n'
+
 class PaymentInstructionsView(APIView):  # Fixed: ApiView -> APIView
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        logger.info(f"Payment instructions requested for user: {request.user.username}")
+        logger.info("Payment instructions requested for user: %s", request.user.username)
         return Response({
             'message': 'Please send the recharge amount to the following Airtel Money number and await admin verification.',
             'phone_number': PAYMENT_PHONE_NUMBER,
@@ -262,7 +665,7 @@ class UpdateIncomeView(APIView):  # Fixed: ApiView -> APIView
 
         # Check if 24 hours have passed since the last update
         if wallet.last_income_update and wallet.last_income_update > twenty_four_hours_ago:
-            logger.info(f"No income update for {request.user.username}: Less than 24 hours since last update.")
+            logger.info("No income update for %s: Less than 24 hours since last update.", request.user.username)
             return Response(WalletSerializer(wallet).data)
 
         # Update income for each active product
@@ -278,28 +681,23 @@ class UpdateIncomeView(APIView):  # Fixed: ApiView -> APIView
         # Update the last income update timestamp
         wallet.last_income_update = today
         wallet.save()
-        logger.info(f"Income updated for {request.user.username}: {wallet.income} KSh")
+        logger.info("Income updated for %s: %s KSh", request.user.username, wallet.income)
         return Response(WalletSerializer(wallet).data)
 
 class WithdrawalView(APIView):  # Fixed: ApiView -> APIView
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [IPTokenBucketThrottle, UserTokenBucketThrottle]
+    throttle_scope = 'payment'
 
+    @idempotent
     def post(self, request):
         try:
-            amount = float(request.data.get('amount'))
+            # Fee and net amount come from the tiered schedule in exact cents
+            amount, fee, net_amount = get_fee_schedule().quote(request.data.get('amount'))
             phone_number = request.data.get('phone_number')
             if amount <= 0:
                 return Response({'error': 'Amount must be positive'}, status=400)
 
-            # Calculate withdrawal fee based on tiered structure
-            fee = 0
-            if 1 <= amount <= 1000:
-                fee = max(5, min(50, amount * 0.05))  # 5% fee, capped between 5 and 50 KSh
-            elif amount > 1000:
-                fee = amount * 0.10  # 10% fee for amounts above 1000 KSh
-
-            net_amount = amount - fee  # Amount the user receives after fee deduction
-
             wallet = Wallet.objects.get(user=request.user)
             if wallet.balance < amount:  # Check against the requested amount
                 return Response({'error': f'Insufficient balance'}, status=400)
@@ -320,23 +718,54 @@ class WithdrawalView(APIView):  # Fixed: ApiView -> APIView
                 transaction=transaction
             )
             serializer = WithdrawalSerializer(withdrawal)
-            logger.info(f"Withdrawal request created for user {request.user.username}: Requested {amount} KSh, Fee {fee} KSh, Net Amount {net_amount} KSh")
+            logger.info("Withdrawal request created for user %s: Requested %s KSh, Fee %s KSh, Net Amount %s KSh", request.user.username, amount, fee, net_amount)
             return Response({
                 'message': f'Withdrawal request submitted. Requested: {amount} KSh, Fee: {fee} KSh, You will receive: {net_amount} KSh',
                 'data': serializer.data
             }, status=201)
-        except ValueError:
+        except InvalidAmount:
             return Response({'error': 'Invalid amount'}, status=400)
         except Wallet.DoesNotExist:
-            logger.error(f"No wallet found for user {request.user.username}")
+            logger.error("No wallet found for user %s", request.user.username)
             return Response({'error': 'Wallet not found'}, status=404)
         except Exception as e:
-            logger.error(f"Error creating withdrawal for user {request.user.username}: {str(e)}")
+            logger.error("Error creating withdrawal for user %s: %s", request.user.username, e)
             return Response({'error': 'Internal server error'}, status=500)
 
+class WithdrawalQuoteView(APIView):
+    """Quote withdrawal fees for one or more amounts: ?amount=100&amount=2500 or POST {"amounts": [...]}."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return self.quote(request.query_params.getlist('amount'))
+
+    def post(self, request):
+        amounts = request.data.get('amounts')
+        if not isinstance(amounts, list):
+            return Response({'error': 'amounts must be a list'}, status=400)
+        return self.quote(amounts)
+
+    def quote(self, amounts):
+        if not amounts:
+            return Response({'error': 'At least one amount is required'}, status=400)
+        if len(amounts) > settings.WITHDRAWAL_QUOTE_MAX_AMOUNTS:
+            return Response({'error': f'At most {settings.WITHDRAWAL_QUOTE_MAX_AMOUNTS} amounts per request'}, status=400)
+        schedule = get_fee_schedule()
+        quotes = []
+        for value in amounts:
+            try:
+                amount, fee, net_amount = schedule.quote(value)
+            except InvalidAmount:
+                return Response({'error': f'Invalid amount: {value}'}, status=400)
+            if amount <= 0:
+                return Response({'error': 'Amount must be positive'}, status=400)
+            quotes.append({'amount': str(amount), 'fee': str(fee), 'net_amount': str(net_amount)})
+        return Response({'quotes': quotes})
+
 class WalletsPurchaseView(APIView):  # Fixed: ApiView -> APIView
     permission_classes = [permissions.IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         try:
             product_id = request.data.get('product_id')
@@ -359,21 +788,90 @@ class WalletsPurchaseView(APIView):  # Fixed: ApiView -> APIView
                 active=True
             )
 
-            logger.info(f"Product {product.name} purchased by {request.user.username} using wallet")
+            logger.info("Product %s purchased by %s using wallet", product.name, request.user.username)
             return Response({'balance': wallet.balance}, status=200)
         except Product.DoesNotExist:
-            logger.error(f"Product not found for id: {product_id}")
+            logger.error("Product not found for id: %s", product_id)
             return Response({'error': 'Product not found'}, status=404)
         except Wallet.DoesNotExist:
-            logger.error(f"Wallet not found for user: {request.user.username}")
+            logger.error("Wallet not found for user: %s", request.user.username)
             return Response({'error': 'Wallet not found'}, status=404)
         except Exception as e:
-            logger.error(f"Purchase error for user {request.user.username}: {str(e)}")
+            logger.error("Purchase error for user %s: %s", request.user.username, e)
             return Response({'error': 'Purchase failed'}, status=500)
 
+class WalletsPurchaseCartView(APIView):
+    """Buy several products in one request: {"items": [{"product_id": 1, "quantity": 2}, ...]}.
+
+    Everything is priced from one product query and paid with a single conditional
+    wallet debit; either every unit is bought or nothing is.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [IPTokenBucketThrottle, UserTokenBucketThrottle]
+    throttle_scope = 'payment'
+
+    @idempotent
+    def post(self, request):
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'items must be a non-empty list'}, status=400)
+
+        # Merge repeated products so each is priced and counted once
+        quantities = {}
+        try:
+            for item in items:
+                product_id = int(item['product_id'])
+                quantity = int(item.get('quantity', 1))
+                if quantity < 1:
+                    return Response({'error': 'Quantity must be at least 1'}, status=400)
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return Response({'error': 'Each item needs an integer product_id and quantity'}, status=400)
+        if sum(quantities.values()) > settings.CART_MAX_UNITS:
+            return Response({'error': f'At most {settings.CART_MAX_UNITS} units per purchase'}, status=400)
+
+        products = Product.objects.in_bulk(list(quantities))
+        missing = [product_id for product_id in quantities if product_id not in products]
+        if missing:
+            logger.error("Products not found for ids: %s", missing)
+            return Response({'error': 'Product not found', 'product_ids': missing}, status=404)
+        total = sum(products[product_id].price * quantity for product_id, quantity in quantities.items())
+
+        try:
+            with atomic_for(Wallet):
+                # Debit only if the balance covers the whole cart; concurrent purchases cannot overdraw
+                debited = Wallet.objects.filter(user=request.user, balance__gte=total).update(balance=F('balance') - total)
+                if not debited:
+                    if not Wallet.objects.filter(user=request.user).exists():
+                        logger.error("Wallet not found for user: %s", request.user.username)
+                        return Response({'error': 'Wallet not found'}, status=404)
+                    return Response({'error': 'Insufficient wallet balance'}, status=400)
+                bump_data_version(request.user.pk)  # update() skips the Wallet post_save signal
+                purchase_date = timezone.now()
+                UserProduct.objects.bulk_create([
+                    UserProduct(user=request.user, product=products[product_id], purchase_date=purchase_date,
+                                cycles_completed=0, active=True, price=products[product_id].price,
+                                matures_at=maturity_date(purchase_date, products[product_id].cycles))
+                    for product_id, quantity in quantities.items()
+                    for _ in range(quantity)
+                ])
+                balance = Wallet.objects.filter(user=request.user).values_list('balance', flat=True).get()
+        except Exception as e:
+            logger.error("Cart purchase error for user %s: %s", request.user.username, e)
+            return Response({'error': 'Purchase failed'}, status=500)
+
+        logger.info("Cart of %s products (%s KSh) purchased by %s using wallet", sum(quantities.values()), total, request.user.username)
+        return Response({
+            'balance': balance,
+            'total': total,
+            'items': [{'product_id': product_id, 'name': products[product_id].name, 'quantity': quantity}
+                      for product_id, quantity in quantities.items()],
+        }, status=200)
+
 class ReferralClaimView(APIView):  # Fixed: ApiView -> APIView
     permission_classes = [permissions.IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         try:
             referral = Referral.objects.get(user=request.user)
@@ -404,16 +902,16 @@ class ReferralClaimView(APIView):  # Fixed: ApiView -> APIView
                 )
                 ExchangeReward.objects.create(user=request.user, amount=amount, transaction=transaction)
 
-            logger.info(f"Reward claimed by {request.user.username}: {message}")
+            logger.info("Reward claimed by %s: %s", request.user.username, message)
             return Response({'message': message, 'balance': wallet.balance}, status=200)
         except Referral.DoesNotExist:
-            logger.error(f"No referral found for user: {request.user.username}")
+            logger.error("No referral found for user: %s", request.user.username)
             return Response({'error': 'Referral not found.'}, status=404)
         except Exception as e:
-            logger.error(f"Error claiming reward for {request.user.username}: {str(e)}")
+            logger.error("Error claiming reward for %s: %s", request.user.username, e)
             return Response({'error': 'Failed to claim reward.'}, status=500)
 
-class StatisticsView(generics.GenericAPIView):
+class StatisticsView(ReplicaReadMixin, generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
@@ -429,39 +927,59 @@ class StatisticsView(generics.GenericAPIView):
             ]
             return Response({'trend': trend})
         except Wallet.DoesNotExist:
-            logger.error(f"No wallet found for user: {request.user.username}")
+            logger.error("No wallet found for user: %s", request.user.username)
             return Response({'error': 'Wallet not found'}, status=404)
 
-class FundingDetailsView(generics.ListAPIView):
+class FundingDetailsView(ReplicaReadMixin, ArchivedHistoryMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = RechargeSerializer
+    archive_kind = 'recharge'
+
+    @user_data_conditional
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
 
     def get_queryset(self):
         return Recharge.objects.filter(user=self.request.user).order_by('-date')
 
-class WithdrawalHistoryView(generics.ListAPIView):
+class WithdrawalHistoryView(ReplicaReadMixin, ArchivedHistoryMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = WithdrawalSerializer
+    archive_kind = 'withdrawal'
+
+    @user_data_conditional
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
 
     def get_queryset(self):
         return Withdrawal.objects.filter(user=self.request.user).order_by('-date')
 
-class ExchangeRewardsView(generics.ListAPIView):
+class ExchangeRewardsView(ReplicaReadMixin, ArchivedHistoryMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = ExchangeRewardSerializer
+    archive_kind = 'exchange_reward'
+
+    @user_data_conditional
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
 
     def get_queryset(self):
         return ExchangeReward.objects.filter(user=self.request.user).order_by('-date')
 
-class DepositStatusView(generics.ListAPIView):
+class DepositStatusView(ReplicaReadMixin, ArchivedHistoryMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = DepositSerializer
+    archive_kind = 'deposit'
+
+    @user_data_conditional
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
 
     def get_queryset(self):
         return Deposit.objects.filter(user=self.request.user).order_by('-date')
 
 # Add UserProductView here
-class UserProductView(generics.ListAPIView):
+class UserProductView(ReplicaReadMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = UserProductSerializer
 
@@ -476,32 +994,36 @@ class ReferralView(generics.RetrieveAPIView):
         try:
             referral, created = Referral.objects.get_or_create(user=request.user)
             if created:
-                logger.info(f"Created new referral for user: {request.user.username}")
+                logger.info("Created new referral for user: %s", request.user.username)
             serializer = self.get_serializer(referral)
-            logger.info(f"Referral fetched for user: {request.user.username}")
+            logger.info("Referral fetched for user: %s", request.user.username)
             return Response([serializer.data])
         except Exception as e:
-            logger.error(f"Error fetching referral for user {request.user.username}: {str(e)}")
+            logger.error("Error fetching referral for user %s: %s", request.user.username, e)
             return Response([{'referral_code': '', 'vip_level': 'VIP0', 'referrals_count': 0}])
 
-class AdminDashboardView(generics.GenericAPIView):
+class ReferralInviteesView(ReplicaReadMixin, generics.ListAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = InviteeSerializer
+    pagination_class = InviteeCursorPagination
+
+    def get_queryset(self):
+        # One query per page: the through table joined to each invitee's user and profile
+        return Referral.invitees.through.objects.filter(referral__user=self.request.user).values(
+            'user_id', 'user__username', 'user__profile__phone_number'
+        )
+
+class AdminDashboardView(ReplicaReadMixin, generics.GenericAPIView):
     def get(self, request, *args, **kwargs):
-        # Aggregate stats
-        total_recharges = Transaction.objects.filter(transaction_type='RECHARGE', status='COMPLETED').aggregate(total=Sum('amount'))['total'] or 0
-        total_withdrawals = Transaction.objects.filter(transaction_type='WITHDRAWAL', status='COMPLETED').aggregate(total=Sum('amount'))['total'] or 0
+        # Per-user tables may be split over shards: each is summarised in parallel, then merged
+        shards = fan_out(self.shard_summary)
+        total_recharges = sum(shard['recharges'] for shard in shards)
+        total_withdrawals = sum(shard['withdrawals'] for shard in shards)
         active_users = User.objects.filter(is_active=True).count()
 
         # Recent activities (last 10 transactions)
-        activities = Transaction.objects.select_related('user').filter(status='COMPLETED').order_by('-timestamp')[:10]
-        activities_data = TransactionSerializer(activities, many=True).data
-
-        # Pending alerts
-        pending_recharges = Recharge.objects.filter(status='Pending').select_related('user', 'transaction').values(
-            'id', 'user__username', 'amount', 'date', 'transaction__airtel_transaction_id'
-        )
-        pending_withdrawals = Withdrawal.objects.filter(status='Pending').select_related('user', 'transaction').values(
-            'id', 'user__username', 'amount', 'date', 'transaction__airtel_transaction_id'
-        )
+        activities = sorted((row for shard in shards for row in shard['activities']), key=lambda row: row[0], reverse=True)[:10]
+        activities_data = [data for _, data in activities]
 
         # Users list
         users = User.objects.all().values('id', 'username', 'email', 'is_staff', 'is_superuser', 'is_active')
@@ -515,11 +1037,32 @@ class AdminDashboardView(generics.GenericAPIView):
             'activities': activities_data,
             'users': list(users),
             'alerts': {
-                'pendingRecharges': list(pending_recharges),
-                'pendingWithdrawals': list(pending_withdrawals)
+                'pendingRecharges': [row for shard in shards for row in shard['pending_recharges']],
+                'pendingWithdrawals': [row for shard in shards for row in shard['pending_withdrawals']]
             }
         })
 
+    def shard_summary(self, alias):
+        transactions = Transaction.objects.using(alias)
+        pending_recharges = list(Recharge.objects.using(alias).filter(status='Pending').select_related('user', 'transaction').values(
+            'id', 'user__username', 'amount', 'date', 'transaction__airtel_transaction_id'
+        ))
+        pending_withdrawals = list(Withdrawal.objects.using(alias).filter(status='Pending').select_related('user', 'transaction').values(
+            'id', 'user__username', 'amount', 'date', 'transaction__airtel_transaction_id'
+        ))
+        if alias is not None:
+            # Row ids are only unique within a shard; approvals send the shard back
+            for row in pending_recharges + pending_withdrawals:
+                row['shard'] = alias
+        return {
+            # Hot rows plus the monthly summaries of archived ones
+            'recharges': (transactions.filter(transaction_type='RECHARGE', status='COMPLETED').aggregate(total=Sum('amount'))['total'] or 0) + archived_totals('RECHARGE', 'COMPLETED', alias),
+            'withdrawals': (transactions.filter(transaction_type='WITHDRAWAL', status='COMPLETED').aggregate(total=Sum('amount'))['total'] or 0) + archived_totals('WITHDRAWAL', 'COMPLETED', alias),
+            'activities': row_mapper(TransactionSerializer).keyed_rows(transactions.filter(status='COMPLETED').order_by('-timestamp')[:10], 'timestamp'),
+            'pending_recharges': pending_recharges,
+            'pending_withdrawals': pending_withdrawals,
+        }
+
     def post(self, request):
         # Handle user updates (e.g., toggle is_staff, is_superuser, is_active)
         user_id = request.data.get('user_id')
@@ -529,13 +1072,13 @@ class AdminDashboardView(generics.GenericAPIView):
             user = User.objects.get(id=user_id)
             if action == 'toggle_staff':
                 user.is_staff = not user.is_staff
-                logger.info(f"Admin {request.user.username} toggled is_staff for {user.username} to {user.is_staff}")
+                logger.info("Admin %s toggled is_staff for %s to %s", request.user.username, user.username, user.is_staff)
             elif action == 'toggle_superuser':
                 user.is_superuser = not user.is_superuser
-                logger.info(f"Admin {request.user.username} toggled is_superuser for {user.username} to {user.is_superuser}")
+                logger.info("Admin %s toggled is_superuser for %s to %s", request.user.username, user.username, user.is_superuser)
             elif action == 'toggle_active':
                 user.is_active = not user.is_active
-                logger.info(f"Admin {request.user.username} toggled is_active for {user.username} to {user.is_active}")
+                logger.info("Admin %s toggled is_active for %s to %s", request.user.username, user.username, user.is_active)
             user.save()
             return Response({'message': f'User {user.username} updated successfully', 'user': {
                 'id': user.id,
@@ -545,10 +1088,10 @@ class AdminDashboardView(generics.GenericAPIView):
                 'is_active': user.is_active,
             }})
         except User.DoesNotExist:
-            logger.error(f"User with id {user_id} not found by admin {request.user.username}")
+            logger.error("User with id %s not found by admin %s", user_id, request.user.username)
             return Response({'error': 'User not found'}, status=404)
         except Exception as e:
-            logger.error(f"Error updating user by admin {request.user.username}: {str(e)}")
+            logger.error("Error updating user by admin %s: %s", request.user.username, e)
             return Response({'error': 'Internal server error'}, status=500)
 
 class AdminApproveTransactionView(APIView):
@@ -558,41 +1101,45 @@ class AdminApproveTransactionView(APIView):
         type = request.data.get('type')  # 'pendingRecharges' or 'pendingWithdrawals'
         id = request.data.get('id')
         status = request.data.get('status')  # 'COMPLETED' or 'REJECTED'
+        shard = request.data.get('shard')  # From the dashboard alert, when per-user tables are sharded
+        if shard_aliases() and shard not in shard_aliases():
+            return Response({'error': 'A valid shard is required'}, status=400)
 
-        try:
-            if type == 'pendingRecharges':
-                recharge = Recharge.objects.get(id=id)
-                transaction = recharge.transaction
-                if status == 'COMPLETED':
-                    recharge.status = 'Completed'
-                    transaction.status = 'COMPLETED'
-                    wallet = Wallet.objects.get(user=recharge.user)
-                    wallet.balance += recharge.amount
-                    wallet.save()
-                    logger.info(f"Admin {request.user.username} approved recharge {id} for {recharge.user.username}")
-                else:  # REJECTED
-                    recharge.status = 'Rejected'
-                    transaction.status = 'REJECTED'
-                    logger.info(f"Admin {request.user.username} rejected recharge {id} for {recharge.user.username}")
-                recharge.save()
-                transaction.save()
-            elif type == 'pendingWithdrawals':
-                withdrawal = Withdrawal.objects.get(id=id)
-                transaction = withdrawal.transaction
-                if status == 'COMPLETED':
-                    withdrawal.transaction.status = 'COMPLETED'
-                    logger.info(f"Admin {request.user.username} approved withdrawal {id} for {withdrawal.user.username}")
-                else:  # REJECTED
-                    withdrawal.transaction.status = 'REJECTED'
-                    wallet = Wallet.objects.get(user=withdrawal.user)
-                    wallet.balance += withdrawal.amount  # Refund the amount
-                    wallet.save()
-                    logger.info(f"Admin {request.user.username} rejected withdrawal {id} for {withdrawal.user.username}")
-                withdrawal.transaction.save()
-            return Response({'message': f'{type} {id} updated to {status}'})
-        except (Recharge.DoesNotExist, Withdrawal.DoesNotExist):
-            logger.error(f"Transaction {id} of type {type} not found by admin {request.user.username}")
-            return Response({'error': 'Transaction not found'}, status=404)
-        except Exception as e:
-            logger.error(f"Error processing transaction {id} by admin {request.user.username}: {str(e)}")
-            return Response({'error': 'Internal server error'}, status=500)
+        with on_shard(shard):
+            try:
+                if type == 'pendingRecharges':
+                    recharge = Recharge.objects.get(id=id)
+                    transaction = recharge.transaction
+                    if status == 'COMPLETED':
+                        recharge.status = 'Completed'
+                        transaction.status = 'COMPLETED'
+                        wallet = Wallet.objects.get(user=recharge.user)
+                        wallet.balance += recharge.amount
+                        wallet.save()
+                        logger.info("Admin %s approved recharge %s for %s", request.user.username, id, recharge.user.username)
+                    else:  # REJECTED
+                        recharge.status = 'Rejected'
+                        transaction.status = 'REJECTED'
+                        logger.info("Admin %s rejected recharge %s for %s", request.user.username, id, recharge.user.username)
+                    recharge.save()
+                    transaction.save()
+                elif type == 'pendingWithdrawals':
+                    withdrawal = Withdrawal.objects.get(id=id)
+                    transaction = withdrawal.transaction
+                    if status == 'COMPLETED':
+                        withdrawal.transaction.status = 'COMPLETED'
+                        logger.info("Admin %s approved withdrawal %s for %s", request.user.username, id, withdrawal.user.username)
+                    else:  # REJECTED
+                        withdrawal.transaction.status = 'REJECTED'
+                        wallet = Wallet.objects.get(user=withdrawal.user)
+                        wallet.balance += withdrawal.amount  # Refund the amount
+                        wallet.save()
+                        logger.info("Admin %s rejected withdrawal %s for %s", request.user.username, id, withdrawal.user.username)
+                    withdrawal.transaction.save()
+                return Response({'message': f'{type} {id} updated to {status}'})
+            except (Recharge.DoesNotExist, Withdrawal.DoesNotExist):
+                logger.error("Transaction %s of type %s not found by admin %s", id, type, request.user.username)
+                return Response({'error': 'Transaction not found'}, status=404)
+            except Exception as e:
+                logger.error("Error processing transaction %s by admin %s: %s", id, request.user.username, e)
+                return Response({'error': 'Internal server error'}, status=500)
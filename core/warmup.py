@@ -0,0 +1,74 @@
+# core/warmup.py
+import logging
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import get_resolver
+from django.utils import timezone, translation
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+# DRF settings resolved to classes on first access
+API_SETTINGS = (
+    'DEFAULT_AUTHENTICATION_CLASSES', 'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_RENDERER_CLASSES',
+    'DEFAULT_PARSER_CLASSES', 'DEFAULT_THROTTLE_CLASSES', 'DEFAULT_CONTENT_NEGOTIATION_CLASS',
+    'DEFAULT_METADATA_CLASS', 'DEFAULT_VERSIONING_CLASS', 'EXCEPTION_HANDLER',
+)
+
+
+def warm_resolver():
+    """Import the URLconf, and with it every view module, and compile all URL patterns."""
+    get_resolver().reverse_dict
+
+
+def warm_orm():
+    """Fill each model's field caches and compile a query per model, without touching the database."""
+    for model in apps.get_models():
+        model._meta.get_fields()
+        model._default_manager.all().query.get_compiler(DEFAULT_DB_ALIAS).as_sql()
+
+
+def warm_serializers():
+    """Build the row mappers of the list endpoints served from values() rows (core.fastpath)."""
+    from .archive import CHILDREN
+    from .fastpath import row_mapper
+    from .serializers import ProductSerializer, TransactionSerializer, UserProductSerializer
+
+    for serializer_class in (ProductSerializer, TransactionSerializer, UserProductSerializer, *(child[1] for child in CHILDREN.values())):
+        row_mapper(serializer_class)
+
+
+def warm_database():
+    """Run one query, which also wakes a database that went idle, then close the connections.
+
+    Closing keeps the connections out of forked workers (gunicorn --preload);
+    the first request still skips the driver and backend imports.
+    """
+    try:
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Exception as e:
+        # Serving must not depend on the warm-up: the first request will retry
+        logger.warning("Database warm-up failed: %s", e)
+    finally:
+        connections.close_all()
+
+
+def warm_up():
+    """Do at boot the one-off work Django otherwise leaves to the first requests after a cold start."""
+    started = time.perf_counter()
+    warm_resolver()
+    warm_orm()
+    warm_serializers()
+    for name in API_SETTINGS:
+        getattr(api_settings, name)
+    get_hashers()
+    timezone.get_default_timezone()
+    # Loads the translation catalogs that DRF's error messages go through
+    translation.gettext('Not found.')
+    warm_database()
+    logger.info("Warm-up finished in %.1f ms (API_ONLY=%s)", (time.perf_counter() - started) * 1000, settings.API_ONLY)
@@ -0,0 +1,16 @@
+# gunicorn.conf.py
+# Read by gunicorn from the working directory: `gunicorn smartinvesthub.wsgi` (see build.sh)
+import os
+
+# Threaded workers: a status stream (/api/status-stream/) holds one thread, not a whole
+# worker. STATUS_STREAM_MAX_PER_PROCESS keeps the rest free for ordinary requests.
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+# gthread workers heartbeat from their main thread, so long streams don't trip this
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Load the app, and run its warm-up (WSGI_WARM_UP), once in the master: forked workers
+# start with it done instead of each paying for it on boot or on their first request
+preload_app = True
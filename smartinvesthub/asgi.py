@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smartinvesthub.settings')
 
 application = get_asgi_application()
+
+if settings.WSGI_WARM_UP:
+    from core.warmup import warm_up
+    warm_up()
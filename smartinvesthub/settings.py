@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 import dj_database_url
@@ -17,6 +18,11 @@ if 'RENDER_EXTERNAL_HOSTNAME' in os.environ:
     ALLOWED_HOSTS.append(os.environ['RENDER_EXTERNAL_HOSTNAME'])
 ALLOWED_HOSTS.extend(['127.0.0.1', 'localhost'])
 
+# API-only web process: no admin, static files or messages, so none of their apps,
+# middleware or templates are imported at boot. Serve the admin from a separate
+# process started without API_ONLY, and run migrate and collectstatic without it too.
+API_ONLY = os.getenv('API_ONLY', 'False') == 'True'
+
 # Application definition
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -30,17 +36,40 @@ INSTALLED_APPS = [
     'corsheaders',
     'core',  # Your app
 ]
+if API_ONLY:
+    INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in ('django.contrib.admin', 'django.contrib.messages', 'django.contrib.staticfiles')]
+
+# Token-only API (opt in with API_TOKEN_ONLY=True once no client relies on session logins):
+# /api/ requests skip session, CSRF, auth and message middleware, which keep running for the admin
+API_TOKEN_ONLY = API_ONLY or os.getenv('API_TOKEN_ONLY', 'False') == 'True'
+
+if API_ONLY:
+    SESSION_MIDDLEWARE = []
+elif API_TOKEN_ONLY:
+    SESSION_MIDDLEWARE = [
+        'core.middleware.SessionMiddleware',
+        'core.middleware.CsrfViewMiddleware',
+        'core.middleware.AuthenticationMiddleware',
+        'core.middleware.MessageMiddleware',
+    ]
+else:
+    SESSION_MIDDLEWARE = [
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+    ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestIDMiddleware',
+    'core.middleware.ShardPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    *([] if API_ONLY else ['whitenoise.middleware.WhiteNoiseMiddleware']),
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
+    *SESSION_MIDDLEWARE,
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReplicaStickinessMiddleware',
 ]
 
 CORS_ALLOWED_ORIGINS = [
@@ -58,7 +87,7 @@ TEMPLATES = [
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
+                *([] if API_ONLY else ['django.contrib.messages.context_processors.messages']),
             ],
         },
     },
@@ -66,6 +95,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'smartinvesthub.wsgi.application'
 
+# Warm the URL resolver, ORM and database connection when the WSGI/ASGI app loads (core.warmup),
+# instead of on the first requests after a cold start. gunicorn.conf.py preloads the app, so this
+# runs once in the master and every worker it forks starts warm.
+WSGI_WARM_UP = os.getenv('WSGI_WARM_UP', 'True') == 'True'
+
 # Database (PostgreSQL for Render, SQLite fallback locally)
 DATABASES = {
     'default': dj_database_url.parse(
@@ -73,6 +107,44 @@ DATABASES = {
     )
 }
 
+# Optional read replica for heavy read-only views (core.routers). Locally it can be a
+# second SQLite file refreshed with `manage.py sync_sqlite_replica`; tests mirror default,
+# and core.tests.test_replica attaches a separate file of its own.
+if os.getenv('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = dj_database_url.parse(os.environ['DATABASE_REPLICA_URL'])
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+# Optional sharding of per-user tables (core.sharding): SHARD_DATABASE_URLS is a
+# comma-separated list of databases, aliased shard0, shard1, ...; 'default' stays the
+# directory for users, products and other global tables. Each shard needs
+# `migrate --database shardN` and `replicate_references` before use.
+SHARD_ALIASES = []
+for index, url in enumerate(url for url in os.getenv('SHARD_DATABASE_URLS', '').split(',') if url.strip()):
+    DATABASES[f'shard{index}'] = dj_database_url.parse(url.strip())
+    SHARD_ALIASES.append(f'shard{index}')
+
+DATABASE_ROUTERS = (['core.sharding.ShardRouter'] if SHARD_ALIASES else []) + (['core.routers.ReplicaRouter'] if 'replica' in DATABASES else [])
+
+# Seconds a user's reads stay on the primary after they write. Every worker must see these
+# marks, so by default they live in a cache table on the primary (`manage.py createcachetable`);
+# set REPLICA_STICKY_CACHE=default once the default cache is shared (Redis or Memcached).
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '5'))
+REPLICA_STICKY_CACHE = os.getenv('REPLICA_STICKY_CACHE', 'replica_sticky')
+
+# Cache shared by idempotency keys, throttle buckets and other per-request state. The
+# default is per-process; point CACHE_BACKEND at Redis or Memcached when running several
+# workers (checked by `manage.py check --deploy`).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'smartinvesthub'),
+    },
+    'replica_sticky': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'replica_sticky_cache',
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -92,12 +164,124 @@ AUTH_PASSWORD_VALIDATORS = [
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.SessionAuthentication',
-    ],
+        'core.authentication.CachedTokenAuthentication',
+    ] + ([] if API_TOKEN_ONLY else ['rest_framework.authentication.SessionAuthentication']),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Token buckets per endpoint class (core.throttling): '<scope>_ip' and '<scope>_user'
+    'DEFAULT_THROTTLE_RATES': {
+        'auth_ip': os.getenv('THROTTLE_AUTH_IP', '20/min'),
+        'auth_user': os.getenv('THROTTLE_AUTH_USER', '5/min'),
+        'signup_ip': os.getenv('THROTTLE_SIGNUP_IP', '5/hour'),
+        'payment_ip': os.getenv('THROTTLE_PAYMENT_IP', '60/min'),
+        'payment_user': os.getenv('THROTTLE_PAYMENT_USER', '10/min'),
+    },
+    # Proxies in front of the app, so the client IP is taken that many entries from the
+    # right of X-Forwarded-For; entries further left are client-supplied. Render adds one
+    # (and sets RENDER); 0 uses REMOTE_ADDR.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '1' if os.getenv('RENDER') else '0')),
+}
+if API_ONLY:
+    # The browsable API needs templates and static files
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = ['rest_framework.renderers.JSONRenderer']
+
+# M-Pesa Daraja API (STK push); point MPESA_BASE_URL at a local stub server for testing
+MPESA_BASE_URL = os.getenv('MPESA_BASE_URL', 'https://sandbox.safaricom.co.ke')
+MPESA_CONSUMER_KEY = os.getenv('MPESA_CONSUMER_KEY', '')
+MPESA_CONSUMER_SECRET = os.getenv('MPESA_CONSUMER_SECRET', '')
+MPESA_SHORTCODE = os.getenv('MPESA_SHORTCODE', '174379')
+MPESA_PASSKEY = os.getenv('MPESA_PASSKEY', '')
+MPESA_CALLBACK_URL = os.getenv('MPESA_CALLBACK_URL', '')
+MPESA_CALLBACK_TOKEN = os.getenv('MPESA_CALLBACK_TOKEN', '')  # Secret path segment of the callback URL
+MPESA_TIMEOUT = float(os.getenv('MPESA_TIMEOUT', '10'))
+
+# Token authentication cache (core.authentication): shared cache TTL plus a short-lived
+# per-process LRU that other processes cannot invalidate
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', '300'))
+AUTH_TOKEN_LOCAL_CACHE_TTL = int(os.getenv('AUTH_TOKEN_LOCAL_CACHE_TTL', '30'))
+AUTH_TOKEN_LOCAL_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_LOCAL_CACHE_SIZE', '10000'))
+
+# Password hashing pool for the async login/register views (core.hashing); requests
+# beyond workers + queue limit get 503 instead of waiting
+HASHING_POOL_WORKERS = int(os.getenv('HASHING_POOL_WORKERS', '2'))
+HASHING_POOL_QUEUE_LIMIT = int(os.getenv('HASHING_POOL_QUEUE_LIMIT', '8'))
+
+# Idempotency-Key support on money-moving POST endpoints
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', str(24 * 60 * 60)))
+IDEMPOTENCY_WAIT_SECONDS = int(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '10'))
+# A key's claim while its request runs; renewed every third of this until the handler returns,
+# so it only bounds how long a crashed worker's keys stay blocked
+IDEMPOTENCY_CLAIM_SECONDS = int(os.getenv('IDEMPOTENCY_CLAIM_SECONDS', '30'))
+
+# Withdrawal fee schedule (core.fees): each tier applies from its 'from' amount in KSh up to
+# the next tier, charging 'percent' clamped to optional 'min_fee'/'max_fee'. Override with a
+# JSON list in WITHDRAWAL_FEE_TIERS.
+WITHDRAWAL_FEE_TIERS = json.loads(os.getenv('WITHDRAWAL_FEE_TIERS', 'null')) or [
+    {'from': '0', 'percent': '0'},
+    {'from': '1', 'percent': '5', 'min_fee': '5', 'max_fee': '50'},
+    {'from': '1000.01', 'percent': '10'},
+]
+WITHDRAWAL_QUOTE_MAX_AMOUNTS = int(os.getenv('WITHDRAWAL_QUOTE_MAX_AMOUNTS', '100'))
+
+# Most product units one cart purchase (/api/wallets/purchase-cart/) may buy
+CART_MAX_UNITS = int(os.getenv('CART_MAX_UNITS', '100'))
+
+# Background task queue in the database (core.tasks, `manage.py run_tasks`). Failed tasks retry
+# with exponential backoff from TASK_RETRY_BASE_SECONDS; tasks still running TASK_LEASE_SECONDS
+# after they were claimed are taken to have lost their worker and requeued, so the lease must
+# outlive the slowest handler. Set TASK_WORKER=True when `run_tasks` runs as its own service;
+# without it, each committed enqueue runs up to TASK_INLINE_BATCH due tasks in the web process.
+TASK_WORKER = os.getenv('TASK_WORKER', 'False') == 'True'
+TASK_INLINE_BATCH = int(os.getenv('TASK_INLINE_BATCH', '5'))
+TASK_MAX_ATTEMPTS = int(os.getenv('TASK_MAX_ATTEMPTS', '5'))
+TASK_RETRY_BASE_SECONDS = int(os.getenv('TASK_RETRY_BASE_SECONDS', '10'))
+TASK_RETRY_MAX_SECONDS = int(os.getenv('TASK_RETRY_MAX_SECONDS', '3600'))
+TASK_LEASE_SECONDS = int(os.getenv('TASK_LEASE_SECONDS', '300'))
+
+# Admin changelists (core.paginators): above ADMIN_ESTIMATED_COUNT_THRESHOLD rows the page
+# count comes from the planner's estimate instead of COUNT(*); smaller filtered counts are
+# cached for ADMIN_COUNT_CACHE_SECONDS
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(os.getenv('ADMIN_ESTIMATED_COUNT_THRESHOLD', '100000'))
+ADMIN_COUNT_CACHE_SECONDS = int(os.getenv('ADMIN_COUNT_CACHE_SECONDS', '60'))
+
+# Server-sent status stream (/api/status-stream/); clients reconnect after STATUS_STREAM_MAX_SECONDS
+STATUS_STREAM_MAX_SECONDS = int(os.getenv('STATUS_STREAM_MAX_SECONDS', '300'))
+STATUS_STREAM_HEARTBEAT_SECONDS = int(os.getenv('STATUS_STREAM_HEARTBEAT_SECONDS', '15'))
+STATUS_STREAM_RECHECK_SECONDS = int(os.getenv('STATUS_STREAM_RECHECK_SECONDS', '60'))
+# Each open stream holds a worker thread (gunicorn.conf.py runs gthread workers). Past
+# STATUS_STREAM_MAX_PER_PROCESS streams, clients get a snapshot and reconnect after
+# STATUS_STREAM_POLL_SECONDS instead, leaving the other threads to ordinary requests.
+STATUS_STREAM_MAX_PER_PROCESS = int(os.getenv('STATUS_STREAM_MAX_PER_PROCESS', '4'))
+STATUS_STREAM_POLL_SECONDS = int(os.getenv('STATUS_STREAM_POLL_SECONDS', '10'))
+
+# Logging: records are queued on the request thread and formatted/written by a background
+# listener (core.log). LOG_SAMPLING keeps a fraction of INFO lines per logger, e.g.
+# "core.views=0.1,core.idempotency=0.5"; warnings and errors are always kept.
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'core.log.JSONFormatter'},
+        'text': {'format': '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'},
+    },
+    'filters': {
+        'request_id': {'()': 'core.log.RequestIDFilter'},
+        'sampling': {'()': 'core.log.SamplingFilter', 'rates': os.getenv('LOG_SAMPLING', '')},
+    },
+    'handlers': {
+        'background': {
+            'class': 'core.log.BackgroundStreamHandler',
+            'formatter': os.getenv('LOG_FORMAT', 'json'),
+            'filters': ['request_id', 'sampling'],
+        },
+    },
+    'root': {'handlers': ['background'], 'level': 'WARNING'},
+    'loggers': {
+        'core': {'level': LOG_LEVEL},
+        'django': {'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO')},
+    },
 }
 
 # Internationalization
@@ -1,4 +1,4 @@
-from django.contrib import admin
+from django.conf import settings
 from django.http import HttpResponse
 from django.urls import path, include
 
@@ -7,6 +7,10 @@ def home(request):
     
 urlpatterns = [
   path('', home, name= 'home'),
-    path('admin/', admin.site.urls),
     path('', include('core.urls')), 
-]
\ No newline at end of file
+]
+
+# API-only processes never import the admin
+if not settings.API_ONLY:
+    from django.contrib import admin
+    urlpatterns.insert(1, path('admin/', admin.site.urls))
\ No newline at end of file
@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smartinvesthub.settings')
 
 application = get_wsgi_application()
+
+if settings.WSGI_WARM_UP:
+    from core.warmup import warm_up
+    warm_up()